@@ -0,0 +1 @@
+# Lets pytest import the `core`, `data` and `ui` packages from the repository root.
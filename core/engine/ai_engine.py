@@ -1,15 +1,32 @@
+import json
 import math
+import multiprocessing
+import os
 import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
 
 from config import BOARD_COLS, BOARD_ROWS
 from core.engine.board import Board
-from core.engine.types import Side, PieceType, Move
-from core.engine.constants import AI_SIDE
+from core.engine.types import Side, PieceType, Move, PIECES, MOVE_SQUARES_MASK, SIDE_INDEX
+from core.engine.constants import AI_SIDE, REPETITION_LIMIT
 from core.engine.evaluation import (
     evaluate_board,
     evaluate_piece_positional,  # exported for potential future move ordering tweaks
     PIECE_VALUES,
 )
+from core.engine.transposition import (
+    DEFAULT_SIZE_MB,
+    EXACT,
+    LOWER,
+    UPPER,
+    TranspositionTable,
+)
+from core.engine.opening_book import get_opening_book
+from core.engine.see import static_exchange
+from core.engine.tablebase import get_tablebases
+from core.engine.zobrist import SIDE_TO_MOVE_KEY
 
 AI_LEVELS = [
     {
@@ -20,6 +37,7 @@ AI_LEVELS = [
         "randomness": 0.9,    
         "eval_noise": 80,       
         "avatar_path": "ai1.jpg",
+        "book_plies": 0,
         "elo": 800,
     },
     {
@@ -30,6 +48,7 @@ AI_LEVELS = [
         "randomness": 0.5,
         "eval_noise": 50,
         "avatar_path": "ai2.jpg",
+        "book_plies": 0,
         "elo": 1000,
     },
     {
@@ -40,6 +59,7 @@ AI_LEVELS = [
         "randomness": 0.25,
         "eval_noise": 30,
         "avatar_path": "ai3.jpg",
+        "book_plies": 4,
         "elo": 1200,
     },
     {
@@ -47,31 +67,73 @@ AI_LEVELS = [
         "avatar_char": "4",
         "color": (220, 180, 120),
         "depth": 3,
+        "time_ms": 2000,
+        "quiescence": True,
         "randomness": 0.1,
         "eval_noise": 15,
         "avatar_path": "ai4.jpg",
+        "book_plies": 8,
         "elo": 1400,
     },
     {
         "name": "Level 5 - Doanh Chính",
         "avatar_char": "5",
         "color": (220, 120, 120),
-        "depth": 3,
+        "depth": 4,
+        "time_ms": 3000,
+        "quiescence": True,
         "randomness": 0.0,
         "eval_noise": 5,
         "avatar_path": "ai5.jpg",
+        "tablebase": True,
+        "book_plies": 12,
         "elo": 1650,
     },
     {
         "name": "Level 6 - Quân Sư của Lưu Bị",
         "avatar_char": "6",
         "color": (255, 80, 80),
-        "depth": 4,             
+        "depth": 6,
+        "time_ms": 5000,
+        "quiescence": True,
         "randomness": 0.0,
         "eval_noise": 0,
+        "workers": 0,
         "avatar_path": "ai6.jpg",
+        "tablebase": True,
+        "book_plies": 16,
         "elo": 1850,
     },
+    {
+        "name": "Level 7 - Tư Mã Ý",
+        "avatar_char": "7",
+        "color": (190, 90, 200),
+        "depth": 7,
+        "time_ms": 5000,
+        "quiescence": True,
+        "null_move": True,
+        "lmr": True,
+        "randomness": 0.0,
+        "eval_noise": 0,
+        "tablebase": True,
+        "book_plies": 20,
+        "elo": 2000,
+    },
+    {
+        "name": "Level 8 - Tôn Tử",
+        "avatar_char": "8",
+        "color": (90, 60, 160),
+        "depth": 8,
+        "time_ms": 5000,
+        "quiescence": True,
+        "null_move": True,
+        "lmr": True,
+        "randomness": 0.0,
+        "eval_noise": 0,
+        "tablebase": True,
+        "book_plies": 20,
+        "elo": 2150,
+    },
 ]
 """AI engine: search, move generation, and level configuration.
 
@@ -80,151 +142,1255 @@ monolithic responsibilities and enable future improvements (e.g. phased
 evaluation, caching) without touching search code.
 """
 
+# Measured ratings of the levels, ``{"<level number>": elo, ...}``, written
+# by ``python -m core.engine.tournament --calibrate --write-elo``. Where
+# present they replace the "elo" values of `AI_LEVELS` above.
+AI_ELO_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "ai_elo.json"
+)
+
+
+def load_level_elo(path: str = AI_ELO_PATH):
+    """Apply the ratings stored at `path` to `AI_LEVELS`; a missing or unreadable file changes nothing."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            ratings = json.load(f)
+    except (OSError, ValueError):
+        return
+    if not isinstance(ratings, dict):
+        return
+    for level, cfg in enumerate(AI_LEVELS, 1):
+        elo = ratings.get(str(level))
+        if isinstance(elo, (int, float)):
+            cfg["elo"] = int(round(elo))
+
+
+load_level_elo()
+
+
+MATE_SCORE = 100000
+# Score of a repetition in which the opponent checked on every move (they
+# lose under the Asian rules); an ordinary repetition is a draw (0).
+PERPETUAL_CHECK_SCORE = MATE_SCORE // 2
+# Tablebase wins score just below a mate found by the search, less the
+# plies to mate, so shorter wins are preferred.
+TABLEBASE_WIN_SCORE = MATE_SCORE - 1
+# Quiescence search: hard ply cap and the margin added to a capture's value
+# before it is dropped as unable to raise the score above alpha.
+QUIESCENCE_MAX_PLY = 8
+DELTA_MARGIN = 200
+
+
+# Nodes searched between two checks of the search limits.
+CHECK_INTERVAL = 256
+# Plies covered by the killer-move table.
+MAX_PLY = 64
+# Move ordering tiers in `negamax_search`: winning and even captures, then
+# killer moves, then quiet moves by history score, then losing captures.
+CAPTURE_TIER = 1 << 41
+KILLER_TIER = 1 << 40
+# Half-width of the aspiration window iterative deepening opens around the
+# previous iteration's score, from this depth on.
+ASPIRATION_WINDOW = 50
+ASPIRATION_MIN_DEPTH = 3
+# Null-move pruning: depth reduction of the null-move search, the depth
+# from which it is tried, and the rooks, horses and cannons the side to
+# move must still have (with fewer, zugzwang makes passing unsafe).
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_MIN_PIECES = 2
+# Late-move reductions: quiet moves from this index in the ordering are
+# searched one ply shallower (two from `LMR_DEEP_INDEX`) when at least
+# `LMR_MIN_DEPTH` plies are left, and re-searched if they beat alpha.
+LMR_MIN_DEPTH = 3
+LMR_MIN_INDEX = 4
+LMR_DEEP_INDEX = 12
+# When set, every `choose_ai_move` call collects a `SearchStats` and
+# appends it to this file as one JSON line.
+SEARCH_LOG_PATH = os.environ.get("XIANGQI_SEARCH_LOG")
+
+
+class SearchStopped(Exception):
+    """Raised inside the search when one of its `SearchLimits` fires."""
+
+
+class SearchCounters:
+    """Results of the most recent `choose_ai_move` call.
+
+    Node counts, the depth reached, the score of the best move from the
+    searching side's view, and the principal variation: the line (a list
+    of `Move`) the search expects, starting with the best move.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.depth = 0
+        self.score = None
+        self.pv = []
+
+
+search_counters = SearchCounters()
+
+
+class SearchStats:
+    """How one `choose_ai_move` call went, collected only when asked for.
+
+    Pass an instance as ``choose_ai_move(..., stats=...)``; it reaches the
+    search through `SearchContext.stats`, and a search without one keeps
+    none of these counts. Holds where the move came from (`source`:
+    "book", "tablebase", "random" or "search"), the time taken in seconds,
+    the node counts, depth and score, transposition-table probes and hits,
+    beta cutoffs and how many of them the first move searched caused, and
+    `iterations`: ``(depth, nodes, seconds)`` for each completed depth,
+    nodes counting quiescence nodes too. `as_dict` gives all of it, with
+    the derived rates, as plain JSON-ready values.
+    """
+
+    def __init__(self):
+        self.source = None
+        self.time = 0.0
+        self.nodes = 0
+        self.qnodes = 0
+        self.depth = 0
+        self.score = None
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.iterations = []
+        self._iteration_start = time.perf_counter()
+        self._iteration_nodes = 0
+
+    def counts(self):
+        """``(tt_probes, tt_hits, cutoffs, first_move_cutoffs)``."""
+        return self.tt_probes, self.tt_hits, self.cutoffs, self.first_move_cutoffs
+
+    def add_counts(self, counts):
+        """Add the `counts` of another search (a parallel root task) to these."""
+        tt_probes, tt_hits, cutoffs, first_move_cutoffs = counts
+        self.tt_probes += tt_probes
+        self.tt_hits += tt_hits
+        self.cutoffs += cutoffs
+        self.first_move_cutoffs += first_move_cutoffs
+
+    def begin_search(self, start: float):
+        """Time the first iteration from `start`, the start of the search."""
+        self._iteration_start = start
+        self._iteration_nodes = 0
+
+    def record_iteration(self, depth: int, nodes: int):
+        """Log a completed search to `depth`, `nodes` in total so far: what it took since the previous one."""
+        now = time.perf_counter()
+        self.iterations.append((depth, nodes - self._iteration_nodes, now - self._iteration_start))
+        self._iteration_start = now
+        self._iteration_nodes = nodes
+
+    @property
+    def nps(self) -> int:
+        """Search and quiescence nodes per second."""
+        return int((self.nodes + self.qnodes) / self.time) if self.time > 0 else 0
+
+    @property
+    def tt_hit_rate(self) -> float:
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        """Share of beta cutoffs caused by the first move searched: how good the move ordering is."""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def branching_factor(self) -> float:
+        """Effective branching factor: node growth from the previous depth to the last one.
+
+        With a single completed depth, the depth-th root of its node count.
+        """
+        iterations = self.iterations
+        if len(iterations) >= 2 and iterations[-2][1]:
+            return iterations[-1][1] / iterations[-2][1]
+        if iterations and iterations[-1][0] > 0 and iterations[-1][1]:
+            return iterations[-1][1] ** (1.0 / iterations[-1][0])
+        return 0.0
+
+    def as_dict(self):
+        return {
+            "source": self.source,
+            "depth": self.depth,
+            "score": self.score,
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "time_ms": round(self.time * 1000.0, 1),
+            "nps": self.nps,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_hit_rate": round(self.tt_hit_rate, 4),
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": round(self.first_move_cutoff_rate, 4),
+            "branching_factor": round(self.branching_factor, 2),
+            "iterations": [
+                {"depth": depth, "nodes": nodes, "time_ms": round(seconds * 1000.0, 1)}
+                for depth, nodes, seconds in self.iterations
+            ],
+        }
+
+
+class SearchLimits:
+    """What may end a search early.
+
+    - time_ms: time budget; the first iteration of iterative deepening
+      (depth 1) always completes, so there is always a move to play
+    - max_nodes: node budget (search + quiescence nodes), with the same
+      depth-1 guarantee
+    - stop_flag: any object with ``is_set()`` (e.g. `threading.Event`,
+      `multiprocessing.Event`); honoured at once, even during depth 1
+
+    When a limit fires, `choose_ai_move` returns the best move found so far.
+    """
+
+    def __init__(self, time_ms: float = None, max_nodes: int = None, stop_flag=None):
+        self.time_ms = time_ms
+        self.max_nodes = max_nodes
+        self.stop_flag = stop_flag
+
+    @classmethod
+    def from_level(cls, level_cfg, stop_flag=None) -> "SearchLimits":
+        return cls(level_cfg.get("time_ms"), level_cfg.get("max_nodes"), stop_flag)
+
+
+class SearchContext:
+    """State shared by every node of one search.
+
+    Carries the transposition table and options (quiescence, null-move
+    pruning, late-move reductions, endgame tablebases), counts nodes and
+    checks the limits every `CHECK_INTERVAL` nodes. Time and node limits
+    only apply while `armed` is set (iterative deepening arms them once
+    depth 1 is done); the stop flag always applies.
+
+    Also holds what the search learns about move ordering, fed by cutoffs
+    in `negamax_search`: two killer moves per ply and a butterfly history
+    table, both indexed by the from/to bits of packed moves. `pv` is the
+    triangular principal-variation table: ``pv[ply]`` is the best line
+    found from that ply, as a tuple of packed moves.
+
+    `stats` is an optional `SearchStats` the search feeds with its
+    transposition-table probes, cutoffs and completed depths; None (the
+    default) keeps no such counts.
+    """
+
+    def __init__(self, limits: SearchLimits = None, tt: TranspositionTable = None,
+                 quiescence: bool = False, null_move: bool = False, lmr: bool = False,
+                 tablebases: bool = False, on_depth=None, stats: SearchStats = None):
+        self.limits = limits or SearchLimits()
+        self.tt = tt
+        self.quiescence = quiescence
+        self.null_move = null_move
+        self.lmr = lmr
+        self.tablebases = get_tablebases() if tablebases else None
+        # Called as on_depth(depth, score, pv, nodes) after each completed
+        # iteration of iterative deepening.
+        self.on_depth = on_depth
+        self.start = time.perf_counter()
+        self.deadline = None if self.limits.time_ms is None else self.start + self.limits.time_ms / 1000.0
+        self.nodes = 0
+        self.qnodes = 0
+        self.stats = stats
+        if stats is not None:
+            stats.begin_search(self.start)
+        self.countdown = CHECK_INTERVAL
+        self.armed = True
+        self.stopped = False
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [0] * (MOVE_SQUARES_MASK + 1)
+        self.pv = [()] * (MAX_PLY + 2)
+        # Index in `Board.position_history` of the root position (set by
+        # `_score_root_move`): later positions are on the current line.
+        self.root_index = 0
+        # Repetitions scored so far; a node whose subtree scored one does
+        # not store its path-dependent score in the transposition table.
+        self.repetitions = 0
+
+    def should_stop(self) -> bool:
+        limits = self.limits
+        if limits.stop_flag is not None and limits.stop_flag.is_set():
+            return True
+        if not self.armed:
+            return False
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return True
+        return limits.max_nodes is not None and self.nodes + self.qnodes >= limits.max_nodes
+
+    def record_cutoff(self, move: int, depth: int, ply: int):
+        """Remember a quiet move that caused a cutoff at `ply` with `depth` left."""
+        squares = move & MOVE_SQUARES_MASK
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != squares:
+                killers[1] = killers[0]
+                killers[0] = squares
+        self.history[squares] += depth * depth
+
+    def counts(self):
+        """``(nodes, qnodes, stats)``, stats being `SearchStats.counts` or None."""
+        stats = None if self.stats is None else self.stats.counts()
+        return self.nodes, self.qnodes, stats
+
+    def add_counts(self, counts):
+        """Add the `counts` of another search (a parallel root task) to these."""
+        nodes, qnodes, stats = counts
+        self.nodes += nodes
+        self.qnodes += qnodes
+        if stats is not None and self.stats is not None:
+            self.stats.add_counts(stats)
+
+    def record_iteration(self, depth: int):
+        """Log a completed search to `depth` in `stats`, if any."""
+        if self.stats is not None:
+            self.stats.record_iteration(depth, self.nodes + self.qnodes)
+
+    def checkpoint(self):
+        """Called every `CHECK_INTERVAL` nodes; raise `SearchStopped` if a limit fired."""
+        self.countdown = CHECK_INTERVAL
+        if self.should_stop():
+            self.stopped = True
+            raise SearchStopped()
+
+_transposition_table = None
+
+
+def get_transposition_table(size_mb=None) -> TranspositionTable:
+    """Return the table shared by all searches, creating it on first use.
+
+    The table is kept between calls to `choose_ai_move` so each move of a
+    game starts from the results of the previous searches; call `clear()` on
+    it when a new game starts. Passing `size_mb` reallocates it with that
+    budget if it differs from the current one.
+    """
+    global _transposition_table
+    if _transposition_table is None:
+        _transposition_table = TranspositionTable(size_mb or DEFAULT_SIZE_MB)
+    elif size_mb is not None and size_mb != _transposition_table.size_mb:
+        _transposition_table.resize(size_mb)
+    return _transposition_table
+
+
+def _position_key(board: Board, side: Side) -> int:
+    # The board's key assumes `board.side_to_move`; searches may be started
+    # for either side, so correct the side-to-move component if needed.
+    if board.side_to_move == side:
+        return board.zobrist_key
+    return board.zobrist_key ^ SIDE_TO_MOVE_KEY
+
+
+def _put_first(moves, move_code: int):
+    for i, move in enumerate(moves):
+        if move & MOVE_SQUARES_MASK == move_code:
+            if i:
+                moves.insert(0, moves.pop(i))
+            return
+
 
 def generate_all_legal_moves(board: Board, side: Side):
-    moves = []
-    for r in range(BOARD_ROWS):
-        for c in range(BOARD_COLS):
-            p = board.get_piece(c, r)
-            if p is None or p.side != side:
-                continue
-            legal = board.generate_legal_moves(c, r, side)
-            for nc, nr in legal:
-                captured = board.get_piece(nc, nr)
-                mv = Move((c, r), (nc, nr), p, captured)
-                moves.append(mv)
-    return moves
+    """Every legal move of `side` as packed ints (see `types.pack_move`)."""
+    return board.generate_packed_moves(side)
 
 
-def _move_sort_key(mv: Move, ai_side: Side) -> int:
-    score = 0
+def generate_legal_captures(board: Board, side: Side):
+    """Like `generate_all_legal_moves`, restricted to captures."""
+    return board.generate_packed_moves(side, captures_only=True)
 
-    if mv.captured is not None:
-        cap_val = PIECE_VALUES.get(mv.captured.ptype, 0)
-        own_val = PIECE_VALUES.get(mv.piece.ptype, 0)
-        score += 10 * cap_val - own_val
 
-    from_c, from_r = mv.from_pos
-    to_c, to_r = mv.to_pos
+# Material value per piece code, for capture ordering and delta pruning.
+_VALUE_BY_CODE = [PIECE_VALUES[p.ptype] if p is not None else 0 for p in PIECES]
 
-    if mv.piece.ptype == PieceType.SOLDIER:
-        if mv.piece.side == Side.RED:
-            if to_r < from_r:
-                score += 8
-        else:
-            if to_r > from_r:
-                score += 8
 
-    if mv.piece.ptype in (PieceType.ROOK, PieceType.CANNON, PieceType.HORSE):
-        score += max(0, 6 - abs(4 - to_c))
+def _build_ordering_tables():
+    # Captures: most valuable victim first, cheapest attacker as tie-break.
+    # Indexed by (moving code | captured code << 4), i.e. bits 14-21 of a move.
+    capture = [0] * 256
+    for moved in range(16):
+        for victim in range(1, 16):
+            capture[moved | (victim << 4)] = 10 * _VALUE_BY_CODE[victim] - _VALUE_BY_CODE[moved]
+
+    # Quiet bonuses per moving piece, indexed by (from_sq | to_sq << 7):
+    # soldiers stepping forward (a change of row) and rooks, cannons and
+    # horses heading for the central files.
+    no_bonus = [0] * (MOVE_SQUARES_MASK + 1)
+    soldier = list(no_bonus)
+    central = list(no_bonus)
+    for from_sq in range(BOARD_COLS * BOARD_ROWS):
+        for to_sq in range(BOARD_COLS * BOARD_ROWS):
+            index = from_sq | (to_sq << 7)
+            if from_sq // BOARD_COLS != to_sq // BOARD_COLS:
+                soldier[index] = 8
+            central[index] = max(0, 6 - abs(4 - to_sq % BOARD_COLS))
+    steps = [no_bonus] * 16
+    for p in PIECES:
+        if p is None:
+            continue
+        if p.ptype == PieceType.SOLDIER:
+            steps[p.code] = soldier
+        elif p.ptype in (PieceType.ROOK, PieceType.CANNON, PieceType.HORSE):
+            steps[p.code] = central
+    return capture, steps
+
+
+_CAPTURE_ORDER, _STEP_ORDER = _build_ordering_tables()
+
+
+def _order_key(move: int) -> int:
+    """Sort key of a packed move; higher is searched first."""
+    return _CAPTURE_ORDER[(move >> 14) & 0xFF] + _STEP_ORDER[(move >> 14) & 0xF][move & MOVE_SQUARES_MASK]
+
+
+def _order_moves(board: Board, moves, ctx, ply: int):
+    """Sort `moves` for an interior node: MVV-LVA captures, killers, then history.
+
+    Captures of a cheaper piece go first only if `static_exchange` shows
+    they do not lose material; losing captures come last, least losing first.
+    """
+    if ply < MAX_PLY:
+        killer1, killer2 = ctx.killers[ply]
+    else:
+        killer1 = killer2 = -1
+    history = ctx.history
+
+    def key(move):
+        squares = move & MOVE_SQUARES_MASK
+        static = _STEP_ORDER[(move >> 14) & 0xF][squares]
+        if move >> 18:
+            if _VALUE_BY_CODE[move >> 18] < _VALUE_BY_CODE[(move >> 14) & 0xF]:
+                exchange = static_exchange(board, move)
+                if exchange < 0:
+                    return exchange
+            return CAPTURE_TIER + _CAPTURE_ORDER[(move >> 14) & 0xFF] + static
+        if squares == killer1:
+            return KILLER_TIER + 1
+        if squares == killer2:
+            return KILLER_TIER
+        return history[squares] + static
+
+    moves.sort(key=key, reverse=True)
+
+
+_MAJOR_TYPES = (PieceType.ROOK, PieceType.HORSE, PieceType.CANNON)
+
+
+def _can_pass(board: Board, side: Side) -> bool:
+    """Whether `side` keeps enough rooks, horses and cannons for a null move to be safe."""
+    grid = board.grid
+    count = 0
+    for sq in board.piece_squares[SIDE_INDEX[side]]:
+        if grid[sq // BOARD_COLS][sq % BOARD_COLS].ptype in _MAJOR_TYPES:
+            count += 1
+            if count >= NULL_MOVE_MIN_PIECES:
+                return True
+    return False
+
+
+def _is_repetition(board: Board, ctx: SearchContext) -> bool:
+    """Whether the current position ends the line as a repetition.
+
+    It does once it reaches the game's `REPETITION_LIMIT`, or when its
+    previous occurrence is on the line searched from the root: repeating
+    then can be forced again, so the game history is not needed.
+    """
+    count = board.repetition_count()
+    if count >= REPETITION_LIMIT:
+        return True
+    if count < 2:
+        return False
+    history = board.position_history
+    key = history[-1]
+    for index in range(len(history) - 2, ctx.root_index - 1, -1):
+        if history[index] == key:
+            return True
+    return False
+
+
+def _repetition_score(board: Board, side: Side) -> int:
+    """Score for `side` to move of a position that has just repeated."""
+    checker = board.perpetual_checker()
+    if checker is None:
+        return 0
+    return -PERPETUAL_CHECK_SCORE if checker == side else PERPETUAL_CHECK_SCORE
+
+
+def quiescence_search(board: Board,
+                      side: Side,
+                      alpha: float,
+                      beta: float,
+                      ply: int,
+                      ctx: SearchContext) -> float:
+    """Resolve pending captures below the nominal search depth.
+
+    Negamax like `negamax_search`: the score is from the view of `side`,
+    the side to move. It may "stand pat" on the static evaluation or try a
+    capture; captures that cannot lift the score past alpha even with
+    `DELTA_MARGIN` to spare are skipped (delta pruning), and so are
+    captures that lose material according to `static_exchange`. In check
+    there is no standing pat, so all evasions are searched instead.
+    Recursion stops at `QUIESCENCE_MAX_PLY`.
+    """
+    ctx.qnodes += 1
+    ctx.countdown -= 1
+    if ctx.countdown <= 0:
+        ctx.checkpoint()
+
+    if ply < QUIESCENCE_MAX_PLY and board.is_in_check(side):
+        moves = generate_all_legal_moves(board, side)
+        if not moves:
+            return -MATE_SCORE
+        stand_pat = None
+        best = -math.inf
+    else:
+        stand_pat = evaluate_board(board, side)
+        if ply >= QUIESCENCE_MAX_PLY or stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        moves = generate_legal_captures(board, side)
+        best = stand_pat
+
+    moves.sort(key=_order_key, reverse=True)
+    next_side = Side.RED if side == Side.BLACK else Side.BLACK
+
+    for move in moves:
+        if stand_pat is not None:
+            victim = _VALUE_BY_CODE[move >> 18]
+            if stand_pat + victim + DELTA_MARGIN <= alpha:
+                continue
+            if victim < _VALUE_BY_CODE[(move >> 14) & 0xF] and static_exchange(board, move) < 0:
+                continue
+
+        board.apply_packed_move(move)
+        try:
+            score = -quiescence_search(board, next_side, -beta, -alpha, ply + 1, ctx)
+        finally:
+            board.undo_packed_move(move)
+
+        if score > best:
+            best = score
+            if score > alpha:
+                if score >= beta:
+                    break
+                alpha = score
+    return best
 
-    if mv.piece.side == ai_side:
-        score += 3
 
-    return score
+def _tablebase_score(result: int, dtm: int) -> int:
+    """Search score of a tablebase result for the side to move."""
+    return result * (TABLEBASE_WIN_SCORE - dtm)
 
 
-def minimax_search(board: Board,
+def negamax_search(board: Board,
                    depth: int,
-                   ai_side: Side,
-                   current_side: Side,
+                   side: Side,
                    alpha: float,
-                   beta: float) -> float:
+                   beta: float,
+                   ctx: SearchContext,
+                   ply: int = 1,
+                   null_ok: bool = True) -> float:
+    """Principal variation search; the score is from the view of `side`, the side to move.
+
+    The first (best-ordered) move is searched with the full window and the
+    others with a null window around alpha, re-searched only when they
+    fail high. Nodes with an open window (``beta - alpha > 1``) are PV
+    nodes: they take no transposition-table cutoffs, so `ctx.pv` holds the
+    whole line below them.
+
+    A position that repeats (`_is_repetition`) ends the line: a draw, or a
+    win for the side whose opponent checked all the way round
+    (`_repetition_score`). Such scores depend on the path, so no node
+    above one stores its score in the transposition table.
+
+    With `ctx.null_move`, other nodes first let the opponent move twice in
+    a row at reduced depth and cut off if that still fails high (not in
+    check, not right after another null move, and not without the pieces
+    `_can_pass` asks for). With `ctx.lmr`, late quiet moves that do not
+    give check are first searched at reduced depth. With `ctx.tablebases`,
+    positions the tables cover return their exact result right away.
+    """
+    ctx.nodes += 1
+    ctx.countdown -= 1
+    if ctx.countdown <= 0:
+        ctx.checkpoint()
+    pv = ctx.pv
+    pv[ply] = ()
+    # Keys only match the game history while no null move is pending on the line.
+    if board.side_to_move is side and _is_repetition(board, ctx):
+        ctx.repetitions += 1
+        return _repetition_score(board, side)
+    tablebases = ctx.tablebases
+    if (tablebases is not None
+            and len(board.piece_squares[0]) + len(board.piece_squares[1]) <= tablebases.max_pieces):
+        found = tablebases.probe(board, side)
+        if found is not None:
+            return _tablebase_score(*found)
     if depth == 0:
-        return evaluate_board(board, ai_side)
+        if ctx.quiescence:
+            return quiescence_search(board, side, alpha, beta, 0, ctx)
+        return evaluate_board(board, side)
+    tt = ctx.tt
+    stats = ctx.stats
+    pv_node = beta - alpha > 1
+
+    tt_move = 0
+    if tt is not None:
+        key = _position_key(board, side)
+        entry = tt.probe(key)
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        if entry is not None:
+            tt_depth, tt_bound, tt_score, tt_move = entry
+            if tt_depth >= depth and not pv_node:
+                if tt_bound == EXACT:
+                    return tt_score
+                if tt_bound == LOWER and tt_score >= beta:
+                    return tt_score
+                if tt_bound == UPPER and tt_score <= alpha:
+                    return tt_score
+
+    next_side = Side.RED if side == Side.BLACK else Side.BLACK
+    in_check = None
+    if (ctx.null_move and null_ok and not pv_node and depth >= NULL_MOVE_MIN_DEPTH
+            and evaluate_board(board, side) >= beta):
+        in_check = board.is_in_check(side)
+        if not in_check and _can_pass(board, side):
+            # Passing needs no board change: the search is told whose turn it is.
+            score = -negamax_search(board, depth - 1 - NULL_MOVE_REDUCTION, next_side,
+                                    -beta, -beta + 1, ctx, ply + 1, False)
+            if score >= beta:
+                # A mate found after passing proves nothing about this position.
+                return beta if score >= MATE_SCORE else score
 
-    moves = generate_all_legal_moves(board, current_side)
+    moves = generate_all_legal_moves(board, side)
     if not moves:
-        if board.is_in_check(current_side):
-            return -100000 if current_side == ai_side else 100000
-        else:
-            return 0
+        return -MATE_SCORE if board.is_in_check(side) else 0
 
-    moves.sort(key=lambda mv: _move_sort_key(mv, ai_side), reverse=True)
+    _order_moves(board, moves, ctx, ply)
+    if tt_move:
+        _put_first(moves, tt_move)
 
-    if current_side == ai_side:
-        best = -math.inf
-        for mv in moves:
-            from_c, from_r = mv.from_pos
-            to_c, to_r = mv.to_pos
-            captured = board._apply_temp_move(from_c, from_r, to_c, to_r)
+    reduce = ctx.lmr and depth >= LMR_MIN_DEPTH
+    if reduce:
+        if in_check is None:
+            in_check = board.is_in_check(side)
+        reduce = not in_check
 
-            next_side = Side.RED if current_side == Side.BLACK else Side.BLACK
-            score = minimax_search(board, depth - 1, ai_side, next_side, alpha, beta)
+    alpha_orig = alpha
+    repetitions = ctx.repetitions
+    best = -math.inf
+    best_move = 0
 
-            board._undo_temp_move(from_c, from_r, to_c, to_r, captured)
+    for index, move in enumerate(moves):
+        board.apply_packed_move(move)
+        try:
+            if best_move == 0:
+                score = -negamax_search(board, depth - 1, next_side, -beta, -alpha, ctx, ply + 1)
+            else:
+                score = None
+                if (reduce and index >= LMR_MIN_INDEX and not move >> 18
+                        and not board.is_in_check(next_side)):
+                    r = 2 if index >= LMR_DEEP_INDEX and depth > LMR_MIN_DEPTH else 1
+                    score = -negamax_search(board, depth - 1 - r, next_side, -alpha - 1, -alpha, ctx, ply + 1)
+                if score is None or score > alpha:
+                    score = -negamax_search(board, depth - 1, next_side, -alpha - 1, -alpha, ctx, ply + 1)
+                if alpha < score < beta:
+                    score = -negamax_search(board, depth - 1, next_side, -beta, -alpha, ctx, ply + 1)
+        finally:
+            board.undo_packed_move(move)
 
-            if score > best:
-                best = score
+        if score > best:
+            best = score
+            best_move = move
             if score > alpha:
+                if score >= beta:
+                    if stats is not None:
+                        stats.cutoffs += 1
+                        stats.first_move_cutoffs += index == 0
+                    if not move >> 18:
+                        ctx.record_cutoff(move, depth, ply)
+                    break
                 alpha = score
-            if beta <= alpha:
-                break
-        return best
+                pv[ply] = (move,) + pv[ply + 1]
+
+    if tt is not None and ctx.repetitions == repetitions:
+        if best <= alpha_orig:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        tt.store(key, depth, best, bound, best_move & MOVE_SQUARES_MASK)
+    return best
+
+
+def _score_root_move(board: Board, move: int, depth: int, side: Side, ctx: SearchContext,
+                     alpha: float = -math.inf, beta: float = math.inf):
+    """Search one packed root move of `side` to `depth` within (alpha, beta); return its score.
+
+    The line expected after `move` is left in ``ctx.pv[1]``.
+    """
+    next_side = Side.RED if side == Side.BLACK else Side.BLACK
+    ctx.root_index = len(board.position_history) - 1
+    board.apply_packed_move(move)
+    try:
+        if depth <= 1:
+            ctx.pv[1] = ()
+            if ctx.quiescence:
+                return -quiescence_search(board, next_side, -beta, -alpha, 0, ctx)
+            return evaluate_board(board, side)
+        return -negamax_search(board, depth - 1, next_side, -beta, -alpha, ctx)
+    finally:
+        board.undo_packed_move(move)
+
+
+def _score_root_moves(board: Board, moves, depth: int, side: Side, ctx: SearchContext,
+                      margin: float = 0, alpha: float = -math.inf, beta: float = math.inf):
+    """Search the packed root moves in order to `depth`; return ``[(score, move), ...]``.
+
+    The first move gets the window (alpha, beta). Every later move only has
+    to show whether it comes within `margin` of the best score so far, so
+    it is searched with a null window there and re-searched for an exact
+    score only if it does; other scores are upper bounds. `margin` 0 keeps
+    exact scores for moves that beat the best one, enough to pick a single
+    best move; `choose_ai_move` widens it when ties or evaluation noise
+    may make a weaker move the choice.
+
+    The line of the best move is left in ``ctx.pv[0]``. If a limit fires,
+    `ctx.stopped` is set and only the moves finished so far are returned.
+    """
+    scored = []
+    best = -math.inf
+    for move in moves:
+        try:
+            if not scored or depth <= 1:
+                score = _score_root_move(board, move, depth, side, ctx, alpha, beta)
+            else:
+                floor = best - margin
+                score = _score_root_move(board, move, depth, side, ctx, floor, floor + 1)
+                if floor < score < beta:
+                    score = _score_root_move(board, move, depth, side, ctx, floor, beta)
+        except SearchStopped:
+            break
+        scored.append((score, move))
+        if score > best:
+            best = score
+            ctx.pv[0] = (move,) + ctx.pv[1]
+    return scored
+
+
+# ----------------------------------------------------------------------
+# Parallel root search
+# ----------------------------------------------------------------------
+# With a level's `workers` setting, the root is split: the first move is
+# searched here and sets the floor, ``score - margin``, for every other
+# move. Those are then searched independently of each other and of
+# anything searched before: each with a cleared table of its own
+# (`_split_table`) and fresh move-ordering state, against the same floor.
+# Their scores therefore only depend on the position, so the result is
+# the same however many processes share the work. With more than one,
+# the moves go to a process pool (threads would serialize on the GIL);
+# each task rebuilds the position from `Board.to_bytes()` and the moves
+# that led to it (for repetition checks).
+
+# Size of the table each split root move is searched with.
+SPLIT_TT_MB = 2
+
+_root_pool = None
+_root_pool_workers = 0
+# Shared with the pool processes: the id of the batch of tasks they may
+# work on. Changing it stops every running task of the previous batch.
+_root_batch = None
+_root_batch_id = 0
+# Set in each pool process by `_init_root_worker`.
+_worker_batch = None
+# Table of the split root move being searched in this process.
+_split_tt = None
+
+
+class _BatchStopFlag:
+    """Stop flag of a pool task: set once its batch is no longer current."""
+
+    def __init__(self, shared, batch_id: int):
+        self.shared = shared
+        self.batch_id = batch_id
+
+    def is_set(self) -> bool:
+        return self.shared.value != self.batch_id
+
+
+def resolve_workers(workers) -> int:
+    """Number of search processes for a level's ``workers`` setting (0 = one per CPU core)."""
+    if workers is None:
+        return 1
+    if workers == 0:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def split_workers(workers) -> int:
+    """Processes for the split root search of a level's ``workers`` setting; 0 for none.
+
+    Without the setting, the root is searched the serial way, one move
+    after the other with a shared table, which needs the fewest nodes.
+    ``workers`` 0 splits over one process per CPU core, and also searches
+    the serial way on a single core, where splitting cannot pay off; any
+    other count splits over that many processes, 1 searching the split
+    moves in this one.
+    """
+    if workers is None:
+        return 0
+    count = resolve_workers(workers)
+    return 0 if workers == 0 and count == 1 else count
+
+
+def _init_root_worker(batch):
+    global _worker_batch
+    _worker_batch = batch
+
+    # A pool whose owner is killed would otherwise keep its processes
+    # searching; leave together with the parent.
+    def watch():
+        multiprocessing.parent_process().join()
+        os._exit(0)
+
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+def get_root_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the process pool shared by parallel searches, resizing it if needed."""
+    global _root_pool, _root_pool_workers, _root_batch
+    if _root_pool is not None and _root_pool_workers != workers:
+        shutdown_root_pool()
+    if _root_pool is None:
+        # "spawn" keeps pygame state of the main process out of the workers.
+        context = multiprocessing.get_context("spawn")
+        _root_batch = context.Value("q", 0, lock=False)
+        _root_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_root_worker,
+            initargs=(_root_batch,),
+        )
+        _root_pool_workers = workers
+    return _root_pool
+
+
+def shutdown_root_pool():
+    """Stop the pool processes once their current task is done."""
+    global _root_pool, _root_pool_workers
+    if _root_pool is not None:
+        _root_batch.value = 0
+        _root_pool.shutdown(wait=False, cancel_futures=True)
+        _root_pool = None
+        _root_pool_workers = 0
+
+
+def _split_table() -> TranspositionTable:
+    """This process's table for split root moves, cleared."""
+    global _split_tt
+    if _split_tt is None:
+        _split_tt = TranspositionTable(SPLIT_TT_MB)
+    else:
+        _split_tt.clear()
+    return _split_tt
+
+
+def _score_split_move(board: Board, move: int, depth: int, side: Side, limits: SearchLimits,
+                      options, floor: float, beta: float):
+    """Search a later root move of a split root; return ``(score, pv, counts)``.
+
+    Like a later root move in `_score_root_moves`: with a null window at
+    `floor` and again up to `beta` only if it comes above, but in a fresh
+    `SearchContext` with a cleared `_split_table`. `options` are the
+    search switches of the parent's context (quiescence, null_move, lmr,
+    tablebases) and whether it collects `SearchStats`. Raises
+    `SearchStopped` if a limit fires.
+    """
+    quiescence, null_move, lmr, tablebases, collect_stats = options
+    ctx = SearchContext(limits, _split_table(), quiescence, null_move, lmr, tablebases,
+                        stats=SearchStats() if collect_stats else None)
+    score = _score_root_move(board, move, depth, side, ctx, floor, floor + 1)
+    if floor < score < beta:
+        score = _score_root_move(board, move, depth, side, ctx, floor, beta)
+    return score, (move,) + ctx.pv[1], ctx.counts()
+
+
+def _search_root_move_task(board_cls, position: bytes, history, move: int, depth: int, side: Side,
+                           options, batch_id: int, wall_deadline, max_nodes, floor: float, beta: float):
+    """Pool task: `_score_split_move`, with a None score if stopped."""
+    board = board_cls.from_bytes(position)
+    board.load_history(history)
+    # Deadlines travel as wall-clock time; perf_counter is not comparable across processes.
+    time_ms = None if wall_deadline is None else max(0.0, wall_deadline - time.time()) * 1000.0
+    limits = SearchLimits(time_ms, max_nodes, _BatchStopFlag(_worker_batch, batch_id))
+    try:
+        return _score_split_move(board, move, depth, side, limits, options, floor, beta)
+    except SearchStopped:
+        return None, (move,), (0, 0, None)
+
+
+def _remaining_limits(ctx: SearchContext):
+    """``(time_ms, max_nodes)`` left of the armed limits of `ctx`."""
+    if not ctx.armed:
+        return None, None
+    time_ms = None
+    max_nodes = None
+    if ctx.deadline is not None:
+        time_ms = max(0.0, ctx.deadline - time.perf_counter()) * 1000.0
+    if ctx.limits.max_nodes is not None:
+        max_nodes = max(0, ctx.limits.max_nodes - ctx.nodes - ctx.qnodes)
+    return time_ms, max_nodes
+
+
+def _pool_split_results(board: Board, moves, depth: int, side: Side, ctx: SearchContext,
+                        workers: int, options, floor: float, beta: float):
+    """Yield ``(score, pv, counts)`` of `moves` in order, searched by the pool.
+
+    Stops early, cancelling the rest, once a limit of `ctx` fires.
+    """
+    global _root_batch_id
+    pool = get_root_pool(workers)
+    _root_batch_id += 1
+    batch_id = _root_batch_id
+    _root_batch.value = batch_id
+
+    position = board.to_bytes()
+    history = board.played_moves
+    time_ms, max_nodes = _remaining_limits(ctx)
+    wall_deadline = None if time_ms is None else time.time() + time_ms / 1000.0
+    futures = [
+        pool.submit(_search_root_move_task, type(board), position, history, move, depth, side,
+                    options, batch_id, wall_deadline, max_nodes, floor, beta)
+        for move in moves
+    ]
+    try:
+        # Collected in submission order; the limits are polled while waiting.
+        for future in futures:
+            while not ctx.stopped:
+                try:
+                    result = future.result(timeout=0.02)
+                    break
+                except FuturesTimeout:
+                    if ctx.should_stop():
+                        ctx.stopped = True
+            if ctx.stopped:
+                return
+            yield result
+    finally:
+        if ctx.stopped:
+            _root_batch.value = 0
+            for future in futures:
+                future.cancel()
+
+
+def _local_split_results(board: Board, moves, depth: int, side: Side, ctx: SearchContext,
+                         options, floor: float, beta: float):
+    """Yield ``(score, pv, counts)`` of `moves` in order, searched in this process."""
+    for move in moves:
+        time_ms, max_nodes = _remaining_limits(ctx)
+        limits = SearchLimits(time_ms, max_nodes, ctx.limits.stop_flag)
+        try:
+            yield _score_split_move(board, move, depth, side, limits, options, floor, beta)
+        except SearchStopped:
+            ctx.stopped = True
+            return
+
+
+def _score_root_moves_split(board: Board, moves, depth: int, side: Side, ctx: SearchContext,
+                            workers: int, margin: float = 0, alpha: float = -math.inf,
+                            beta: float = math.inf):
+    """Like `_score_root_moves`, with the moves after the first one searched split.
+
+    The first move is searched here with the window (alpha, beta); every
+    other one is searched with `_score_split_move` against the floor its
+    score sets, by `workers` processes. Scores below the floor are upper
+    bounds as in the serial search.
+    """
+    scored = _score_root_moves(board, moves[:1], depth, side, ctx, margin, alpha, beta)
+    if ctx.stopped or not scored or len(moves) == 1:
+        return scored
+    best = scored[0][0]
+    floor = best - margin
+    moves = moves[1:]
+    options = (ctx.quiescence, ctx.null_move, ctx.lmr, ctx.tablebases is not None,
+               ctx.stats is not None)
+    if workers > 1:
+        results = _pool_split_results(board, moves, depth, side, ctx, workers, options, floor, beta)
     else:
-        best = math.inf
-        for mv in moves:
-            from_c, from_r = mv.from_pos
-            to_c, to_r = mv.to_pos
-            captured = board._apply_temp_move(from_c, from_r, to_c, to_r)
-
-            next_side = Side.RED if current_side == Side.BLACK else Side.BLACK
-            score = minimax_search(board, depth - 1, ai_side, next_side, alpha, beta)
-
-            board._undo_temp_move(from_c, from_r, to_c, to_r, captured)
-
-            if score < best:
-                best = score
-            if score < beta:
-                beta = score
-            if beta <= alpha:
+        results = _local_split_results(board, moves, depth, side, ctx, options, floor, beta)
+    for move, (score, pv, counts) in zip(moves, results):
+        ctx.add_counts(counts)
+        if score is None:
+            ctx.stopped = True
+            break
+        scored.append((score, move))
+        if score > best:
+            best = score
+            ctx.pv[0] = pv
+        if ctx.should_stop():
+            ctx.stopped = True
+            break
+    results.close()
+    return scored
+
+
+def _search_root(board: Board, moves, depth: int, side: Side, ctx: SearchContext, workers: int = 0,
+                 margin: float = 0, alpha: float = -math.inf, beta: float = math.inf):
+    """Search the root with `_score_root_moves`, or split over `workers` processes if not 0."""
+    if workers and depth > 1:
+        return _score_root_moves_split(board, moves, depth, side, ctx, workers, margin, alpha, beta)
+    return _score_root_moves(board, moves, depth, side, ctx, margin, alpha, beta)
+
+
+def iterative_deepening(board: Board, moves, side: Side, max_depth: int, ctx: SearchContext,
+                        workers: int = 0, margin: float = 0):
+    """Search depth 1, 2, ... until `max_depth` or until a limit of `ctx` fires.
+
+    Each iteration searches the root moves best-first according to the
+    previous one. From `ASPIRATION_MIN_DEPTH` on, it starts with a window
+    of `ASPIRATION_WINDOW` around the previous score and opens the side
+    that the result falls outside of. Returns ``(depth, [(score, move), ...])``
+    for the last completed depth, with its line in ``ctx.pv[0]``. If an
+    iteration is interrupted after finishing some moves (the first being
+    the previous best), those deeper results are returned instead.
+    """
+    scored = []
+    completed_depth = 0
+    best_line = ()
+    budget = None if ctx.limits.time_ms is None else ctx.limits.time_ms / 1000.0
+    for depth in range(1, max_depth + 1):
+        # Depth 1 always completes unless stopped from outside.
+        ctx.armed = completed_depth > 0
+        alpha, beta = -math.inf, math.inf
+        if depth >= ASPIRATION_MIN_DEPTH and scored:
+            alpha = scored[0][0] - ASPIRATION_WINDOW
+            beta = scored[0][0] + ASPIRATION_WINDOW
+        while True:
+            result = _search_root(board, moves, depth, side, ctx, workers, margin, alpha, beta)
+            if ctx.stopped or not result:
+                break
+            best = max(score for score, _ in result)
+            if best <= alpha:
+                alpha = -math.inf
+            elif best >= beta:
+                beta = math.inf
+            else:
                 break
-        return best
+        result.sort(key=lambda item: item[0], reverse=True)
+        if ctx.stopped:
+            if result:
+                scored = result
+            else:
+                ctx.pv[0] = best_line
+            break
+        completed_depth = depth
+        scored = result
+        best_line = ctx.pv[0]
+        moves = [move for _, move in scored]
+        ctx.record_iteration(depth)
+        if ctx.on_depth is not None:
+            ctx.on_depth(depth, scored[0][0], best_line, ctx.nodes + ctx.qnodes)
+        if abs(scored[0][0]) >= MATE_SCORE:
+            break
+        # The next iteration costs several times this one; don't start it
+        # when it has little chance of finishing inside the budget.
+        if budget is not None and time.perf_counter() - ctx.start >= budget / 2:
+            break
+    return completed_depth, scored
 
 
-def choose_ai_move(board: Board, level_cfg, side: Side):
+def _book_move(board: Board, moves, side: Side):
+    """A weighted-random book move among the legal `moves`, or None."""
+    book = get_opening_book()
+    if book is None:
+        return None
+    squares = book.choose(board, side)
+    for move in moves:
+        if move & MOVE_SQUARES_MASK == squares:
+            return Move.from_packed(move)
+    return None
+
+
+def _tablebase_move(board: Board, moves, side: Side):
+    """The tablebases' best move among the legal `moves`, or None if they don't cover the position."""
+    tablebases = get_tablebases()
+    if tablebases is None or tablebases.probe(board, side) is None:
+        return None
+    found = tablebases.best_move(board, moves, side)
+    if found is None:
+        return None
+    move, result, dtm = found
+    search_counters.score = _tablebase_score(result, dtm)
+    search_counters.pv = [Move.from_packed(move)]
+    return Move.from_packed(move)
+
+
+def choose_ai_move(board: Board, level_cfg, side: Side, tt: TranspositionTable = None,
+                   limits: SearchLimits = None, on_depth=None, stats: SearchStats = None):
     """
     Chọn nước đi cho AI với cấu hình level_cfg.
-    - depth: độ sâu tìm kiếm minimax
+    - depth: độ sâu tìm kiếm (độ sâu tối đa nếu có time_ms / max_nodes)
+    - time_ms: ngân sách thời gian (ms); nếu có thì tìm kiếm sâu dần 1, 2, 3...
+      và trả về kết quả của lượt sâu nhất đã hoàn thành
+    - max_nodes: giới hạn số nút, dùng như time_ms
+    - quiescence: tìm tiếp các nước ăn quân ở nút lá (tránh hiệu ứng đường chân trời)
+    - null_move: cắt tỉa nước trống (null-move pruning); tắt khi bị chiếu
+      và khi tàn cuộc ít quân
+    - lmr: tìm nông hơn các nước yên lặng xếp cuối (late-move reductions)
+    - workers: chia các nước gốc cho bấy nhiêu tiến trình tìm kiếm song song
+      (`split_workers`; 0 = một tiến trình cho mỗi lõi CPU, tuần tự nếu máy chỉ
+      có một lõi); không có thì tìm tuần tự
+    - tablebase: dùng bảng tàn cuộc (`tablebase.py`): thế cờ có trong bảng
+      được đi ngay nước tối ưu, và trong lúc tìm kiếm các thế đó có điểm chính xác
+    - book_plies: dùng sách khai cuộc (`opening_book.py`) trong bấy nhiêu nửa
+      nước đầu ván; nước trong sách được chọn ngẫu nhiên theo trọng số
     - randomness: xác suất chơi hẳn một nước random
     - eval_noise: thêm nhiễu vào đánh giá để level thấp chơi ngu hơn
+    - tt: bảng chuyển vị; mặc định dùng bảng chung `get_transposition_table()`
+    - limits: `SearchLimits` thay cho time_ms / max_nodes của level, ví dụ để
+      thêm cờ dừng (stop_flag); khi bị dừng, trả về nước tốt nhất tìm được
+    - on_depth: hàm gọi sau mỗi độ sâu hoàn thành, on_depth(depth, score, pv,
+      nodes) với pv là chuỗi nước nén; khi có on_depth luôn tìm sâu dần
+    - stats: một `SearchStats` để thu thập thống kê tìm kiếm; mặc định None
+      thì tìm kiếm không đếm gì thêm
+
+    Bên trong tìm kiếm dùng nước đi dạng số nguyên nén (`types.pack_move`);
+    kết quả trả về vẫn là một `Move`. Khi randomness và eval_noise đều bằng 0,
+    các nước bằng điểm được chọn theo thứ tự cố định nên kết quả là tất định
+    (với độ sâu cố định); khi chia các nước gốc, nước đi và điểm như nhau với
+    mọi số tiến trình.
+
+    Tìm kiếm là negamax PVS; sau mỗi lần gọi, `search_counters` giữ độ sâu,
+    điểm và biến chính (pv: chuỗi nước dự kiến, bắt đầu bằng nước tốt nhất).
+    Khi có stats, nó nhận thêm thống kê tìm kiếm (nguồn nước đi, thời gian,
+    NPS, tỉ lệ trúng bảng chuyển vị, tỉ lệ cắt ở nước đầu, hệ số rẽ nhánh,
+    thời gian từng độ sâu). Nếu đặt biến môi trường
+    XIANGQI_SEARCH_LOG=<đường dẫn>, mỗi lần gọi đều thu thập thống kê và ghi
+    thêm một dòng JSON (`SearchStats.as_dict`) vào tệp đó.
     """
+    search_counters.reset()
+    if stats is None and SEARCH_LOG_PATH:
+        stats = SearchStats()
+    if stats is None:
+        return _choose_ai_move(board, level_cfg, side, tt, limits, on_depth, None)
+    start = time.perf_counter()
+    try:
+        return _choose_ai_move(board, level_cfg, side, tt, limits, on_depth, stats)
+    finally:
+        stats.time = time.perf_counter() - start
+        if SEARCH_LOG_PATH and stats.source is not None:
+            _append_search_log(SEARCH_LOG_PATH, level_cfg, stats)
+
+
+def _append_search_log(path: str, level_cfg, stats: SearchStats):
+    record = {"time": round(time.time(), 3), "level": level_cfg.get("name")}
+    record.update(stats.as_dict())
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass
+
+
+def _choose_ai_move(board: Board, level_cfg, side: Side, tt: TranspositionTable,
+                    limits: SearchLimits, on_depth, stats: SearchStats):
+    """`choose_ai_move` without the timing and logging around it."""
     moves = generate_all_legal_moves(board, side)
     if not moves:
         return None
 
-    moves.sort(key=lambda mv: _move_sort_key(mv, side), reverse=True)
+    moves.sort(key=_order_key, reverse=True)
+
+    if tt is None:
+        tt = get_transposition_table()
+    tt.new_search()
+
+    book_plies = level_cfg.get("book_plies", 0)
+    if book_plies and len(board.played_moves) < book_plies:
+        book_move = _book_move(board, moves, side)
+        if book_move is not None:
+            if stats is not None:
+                stats.source = "book"
+            search_counters.pv = [book_move]
+            return book_move
+
+    if level_cfg.get("tablebase", False):
+        tb_move = _tablebase_move(board, moves, side)
+        if tb_move is not None:
+            if stats is not None:
+                stats.source = "tablebase"
+                stats.score = search_counters.score
+            return tb_move
 
     depth = level_cfg["depth"]
+    quiescence = level_cfg.get("quiescence", False)
     randomness = level_cfg["randomness"]
     eval_noise = level_cfg.get("eval_noise", 0.0)
+    workers = split_workers(level_cfg.get("workers"))
+    if limits is None:
+        limits = SearchLimits.from_level(level_cfg)
 
     if randomness > 0 and random.random() < randomness:
-        return random.choice(moves)
+        if stats is not None:
+            stats.source = "random"
+        return Move.from_packed(random.choice(moves))
 
-    best_score = -math.inf
-    best_moves = []
+    # Root moves need exact scores only where they can still be picked:
+    # above the best one, or within reach of it through ties and noise.
+    margin = 0 if randomness == 0 and eval_noise == 0 else 2 * eval_noise + 1
 
-    for mv in moves:
-        from_c, from_r = mv.from_pos
-        to_c, to_r = mv.to_pos
-        captured = board._apply_temp_move(from_c, from_r, to_c, to_r)
-
-        if depth <= 1:
-            score = evaluate_board(board, side)
+    ctx = SearchContext(limits, tt, quiescence,
+                        level_cfg.get("null_move", False), level_cfg.get("lmr", False),
+                        level_cfg.get("tablebase", False), on_depth, stats)
+    if stats is not None:
+        stats.source = "search"
+    try:
+        if limits.time_ms or limits.max_nodes or on_depth is not None:
+            depth, scored = iterative_deepening(board, moves, side, depth, ctx, workers, margin)
         else:
-            next_side = Side.RED if side == Side.BLACK else Side.BLACK
-            score = minimax_search(board, depth - 1, side, next_side, -math.inf, math.inf)
+            scored = _search_root(board, moves, depth, side, ctx, workers, margin)
+            if not ctx.stopped:
+                ctx.record_iteration(depth)
+    finally:
+        search_counters.nodes = ctx.nodes
+        search_counters.qnodes = ctx.qnodes
+        if stats is not None:
+            stats.nodes = ctx.nodes
+            stats.qnodes = ctx.qnodes
+
+    if not scored:
+        # Stopped before any root move was searched: fall back to move ordering.
+        return Move.from_packed(moves[0])
 
-        board._undo_temp_move(from_c, from_r, to_c, to_r, captured)
+    search_counters.depth = depth
+    search_counters.score = max(score for score, _ in scored)
+    search_counters.pv = [Move.from_packed(move) for move in ctx.pv[0]]
+    if stats is not None:
+        stats.depth = depth
+        stats.score = search_counters.score
+
+    best_score = -math.inf
+    best_moves = []
 
+    for score, move in scored:
         if eval_noise > 0:
             score += random.uniform(-eval_noise, eval_noise)
 
         if score > best_score + 1e-6:
             best_score = score
-            best_moves = [mv]
+            best_moves = [move]
         elif abs(score - best_score) <= 1e-6:
-            best_moves.append(mv)
+            best_moves.append(move)
 
-    return random.choice(best_moves) if best_moves else random.choice(moves)
+    if randomness == 0 and eval_noise == 0:
+        # Deterministic tie-break: the first of the best moves in root order.
+        return Move.from_packed(best_moves[0])
+    return Move.from_packed(random.choice(best_moves))
@@ -0,0 +1,221 @@
+"""Run the AI search in a persistent child process.
+
+The search is pure Python and holds the GIL for its whole duration, so
+running it on a thread makes the 60 FPS render loop stutter. `AIWorker`
+keeps one worker process alive for the whole session instead:
+
+* the process is started (and warmed up with a tiny search) when the app
+  launches, so the first AI move pays no spawn or import latency;
+* a request sends the position as `Board.to_bytes()` (46 bytes), the
+  packed moves that led to it (for repetition detection) and the level
+  configuration over a pipe, and the reply is the chosen
+  ``(from_pos, to_pos)`` plus the principal variation behind it and, if
+  the request asked for them, the search statistics
+  (`SearchStats.as_dict`);
+* the worker keeps its transposition table between the moves of a game;
+  `new_game()` clears it.
+
+`cancel()` stops the search in flight through a shared value holding the
+highest cancelled request id, which the search polls as its
+`SearchLimits.stop_flag`; the worker then stays warm for the next
+request. Replies to abandoned requests are dropped by request id.
+
+This module does not import pygame.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import signal
+
+from core.engine.ai_engine import (
+    SearchLimits,
+    SearchStats,
+    choose_ai_move,
+    get_transposition_table,
+    search_counters,
+    shutdown_root_pool,
+)
+from core.engine.bitboard import BitboardBoard
+from core.engine.types import Side
+
+
+class _CancelFlag:
+    """Stop flag of one request: set once the parent cancels it."""
+
+    def __init__(self, cancelled_id, request_id: int):
+        self.cancelled_id = cancelled_id
+        self.request_id = request_id
+
+    def is_set(self) -> bool:
+        return self.cancelled_id.value >= self.request_id
+
+
+def _worker_main(conn, cancelled_id):
+    # Ctrl+C is handled by the parent; it shuts the worker down itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Warm up: imports, move-generation tables and one shallow search.
+    choose_ai_move(BitboardBoard(), {"depth": 1, "randomness": 0.0}, Side.RED)
+    get_transposition_table().clear()
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        kind = message[0]
+        if kind == "quit":
+            shutdown_root_pool()
+            return
+        if kind == "new_game":
+            get_transposition_table().clear()
+        elif kind == "search":
+            _, request_id, position, history, level_cfg, side, want_stats = message
+            try:
+                board = BitboardBoard.from_bytes(position)
+                board.load_history(history)
+                limits = SearchLimits.from_level(level_cfg, _CancelFlag(cancelled_id, request_id))
+                search_stats = SearchStats() if want_stats else None
+                mv = choose_ai_move(board, level_cfg, side, limits=limits, stats=search_stats)
+                result = (mv.from_pos, mv.to_pos) if mv is not None else None
+                pv = [(m.from_pos, m.to_pos) for m in search_counters.pv] if mv is not None else []
+                stats = search_stats.as_dict() if search_stats is not None else {}
+            except Exception:
+                result = None
+                pv = []
+                stats = {}
+            try:
+                conn.send(("move", request_id, result, pv, stats))
+            except (EOFError, OSError):
+                return
+
+
+class AIWorker:
+    """Parent-side handle of the AI worker process.
+
+    All methods are non-blocking except `shutdown`; poll for the result of
+    `request_move` from the main loop with `poll`.
+    """
+
+    def __init__(self):
+        # "spawn" gives the worker a clean interpreter instead of a fork of
+        # the pygame process (display and audio handles included).
+        self._ctx = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._next_id = 0
+        # Highest cancelled request id, shared with the worker.
+        self._cancelled_id = self._ctx.Value("q", 0, lock=False)
+        # (request id, message) of the search in flight, kept for resubmission.
+        self._pending = None
+        # Principal variation of the last finished search, as (from_pos, to_pos) pairs.
+        self.last_pv = []
+        # Search statistics of the last finished search that asked for them
+        # (`SearchStats.as_dict`), else {}.
+        self.last_stats = {}
+
+    def start(self):
+        """Start the worker process if it is not running yet."""
+        if self._process is not None and self._process.is_alive():
+            return
+        parent_conn, child_conn = self._ctx.Pipe()
+        # Not a daemon: parallel levels start a process pool from the worker,
+        # which daemonic processes may not do. The worker still exits with
+        # the app, as its pipe reports EOF once the parent is gone.
+        self._process = self._ctx.Process(
+            target=_worker_main, args=(child_conn, self._cancelled_id), name="xiangqi-ai", daemon=False
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+    def _stop_process(self):
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join(timeout=1.0)
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def _restart(self):
+        self._stop_process()
+        self.start()
+
+    def _send(self, message):
+        try:
+            self._conn.send(message)
+        except (EOFError, OSError):
+            # The worker died; start a new one and try once more.
+            self._restart()
+            self._conn.send(message)
+
+    @property
+    def busy(self) -> bool:
+        return self._pending is not None
+
+    def request_move(self, board, level_cfg, side: Side, stats: bool = False) -> int:
+        """Start searching a move for `side` on `board`; return the request id.
+
+        With `stats`, the search collects its statistics for `last_stats`.
+
+        Any search still in flight is cancelled first; the new one starts as
+        soon as the worker has unwound it.
+        """
+        self.cancel()
+        self.start()
+        self._next_id += 1
+        message = ("search", self._next_id, board.to_bytes(), list(board.played_moves), dict(level_cfg), side, stats)
+        self._pending = (self._next_id, message)
+        self._send(message)
+        return self._next_id
+
+    def poll(self):
+        """Return ``(request_id, move)`` once the search in flight is done, else None.
+
+        `move` is ``(from_pos, to_pos)``, or None when the side has no legal move.
+        The line the search expects after it is then in `last_pv`, and how
+        the search went in `last_stats`.
+        """
+        if self._pending is None:
+            return None
+        request_id, message = self._pending
+        try:
+            while self._conn.poll():
+                reply = self._conn.recv()
+                if reply[0] == "move" and reply[1] == request_id:
+                    self._pending = None
+                    self.last_pv = reply[3]
+                    self.last_stats = reply[4]
+                    return request_id, reply[2]
+        except (EOFError, OSError):
+            # The worker died mid-search: resubmit to a fresh one.
+            self._restart()
+            self._send(message)
+        return None
+
+    def cancel(self):
+        """Stop the search in flight, if any, and drop its result."""
+        if self._pending is None:
+            return
+        self._cancelled_id.value = self._pending[0]
+        self._pending = None
+
+    def new_game(self):
+        """Drop the search results kept from the previous game."""
+        self.start()
+        self._send(("new_game",))
+
+    def shutdown(self):
+        """Stop the worker process (blocks for at most about a second)."""
+        if self._process is None:
+            return
+        self._pending = None
+        try:
+            self._conn.send(("quit",))
+        except (EOFError, OSError):
+            pass
+        self._process.join(timeout=1.0)
+        self._stop_process()
@@ -0,0 +1,128 @@
+"""Search benchmark comparing board backends.
+
+Runs the real `choose_ai_move` search at a fixed depth on a small set of
+positions and reports nodes, time and nodes/sec for each backend::
+
+    python -m core.engine.benchmark --depth 3
+
+Nodes are the positions visited by the search (`search_counters.nodes`
+plus quiescence nodes), so the count does not depend on how many make /
+unmake probes move generation needs for legality.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from core.engine.ai_engine import choose_ai_move, search_counters
+from core.engine.bitboard import BitboardBoard
+from core.engine.board import Board
+from core.engine.transposition import TranspositionTable
+from core.engine.types import Side, Move
+
+
+BACKENDS = {
+    "board": Board,
+    "bitboard": BitboardBoard,
+}
+
+# Positions are given as move sequences from the initial setup
+# (red on bottom), as ((from_col, from_row), (to_col, to_row)) pairs.
+BENCHMARK_POSITIONS = {
+    "start": [],
+    "central-cannon": [
+        ((7, 7), (4, 7)), ((7, 0), (6, 2)),
+        ((7, 9), (6, 7)), ((8, 0), (7, 0)),
+        ((8, 9), (7, 9)), ((1, 0), (2, 2)),
+    ],
+    "open-files": [
+        ((1, 7), (4, 7)), ((1, 2), (4, 2)),
+        ((1, 9), (2, 7)), ((1, 0), (2, 2)),
+        ((0, 9), (1, 9)), ((0, 0), (1, 0)),
+        ((1, 9), (1, 5)), ((1, 0), (1, 4)),
+        ((6, 6), (6, 5)), ((2, 3), (2, 4)),
+    ],
+}
+
+
+def build_position(board_cls, moves):
+    """Return a new board of `board_cls` after playing `moves`, and the side to move."""
+    board = board_cls()
+    side = Side.RED
+    for from_pos, to_pos in moves:
+        if to_pos not in board.generate_legal_moves(*from_pos, side):
+            raise ValueError(f"illegal benchmark move {from_pos} -> {to_pos}")
+        board.move_piece(Move(from_pos, to_pos, board.get_piece(*from_pos), board.get_piece(*to_pos)))
+        side = Side.BLACK if side == Side.RED else Side.RED
+    return board, side
+
+
+def run_benchmark(backend_names, depth, positions=None, quiescence=False, workers=None,
+                  null_move=False, lmr=False):
+    """Search every position with every backend; return a list of result dicts."""
+    positions = positions or BENCHMARK_POSITIONS
+    level_cfg = {"depth": depth, "randomness": 0.0, "eval_noise": 0, "quiescence": quiescence,
+                 "workers": workers, "null_move": null_move, "lmr": lmr}
+    results = []
+    for name in backend_names:
+        board_cls = BACKENDS[name]
+        for pos_name, moves in positions.items():
+            board, side = build_position(board_cls, moves)
+            # A fresh table per run keeps backends from warming each other up.
+            tt = TranspositionTable()
+            random.seed(0)
+            start = time.perf_counter()
+            move = choose_ai_move(board, level_cfg, side, tt=tt)
+            elapsed = time.perf_counter() - start
+            nodes = search_counters.nodes + search_counters.qnodes
+            results.append({
+                "backend": name,
+                "position": pos_name,
+                "depth": depth,
+                "nodes": nodes,
+                "seconds": elapsed,
+                "nps": nodes / elapsed if elapsed > 0 else 0.0,
+                "move": move,
+                "tt_hit_rate": tt.stats()["hit_rate"],
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark AI search speed per board backend.")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--backend", choices=sorted(BACKENDS) + ["all"], default="all")
+    parser.add_argument("--quiescence", action="store_true", help="extend leaves with the capture search")
+    parser.add_argument("--workers", type=int,
+                        help="split the root search over this many processes (0 = one per CPU core)")
+    parser.add_argument("--null-move", action="store_true", help="enable null-move pruning")
+    parser.add_argument("--lmr", action="store_true", help="enable late-move reductions")
+    args = parser.parse_args(argv)
+
+    names = list(BACKENDS) if args.backend == "all" else [args.backend]
+    results = run_benchmark(names, args.depth, quiescence=args.quiescence, workers=args.workers,
+                            null_move=args.null_move, lmr=args.lmr)
+
+    print(f"{'backend':<10} {'position':<16} {'nodes':>10} {'seconds':>9} {'nodes/sec':>11} {'tt hit%':>8}")
+    totals = {}
+    for res in results:
+        print(f"{res['backend']:<10} {res['position']:<16} {res['nodes']:>10} "
+              f"{res['seconds']:>9.2f} {res['nps']:>11.0f} {100 * res['tt_hit_rate']:>7.1f}%")
+        nodes, seconds = totals.get(res["backend"], (0, 0.0))
+        totals[res["backend"]] = (nodes + res["nodes"], seconds + res["seconds"])
+
+    print()
+    base_nps = None
+    for name in names:
+        nodes, seconds = totals[name]
+        nps = nodes / seconds if seconds > 0 else 0.0
+        if base_nps is None:
+            base_nps = nps
+        speedup = nps / base_nps if base_nps else 0.0
+        print(f"{name:<10} total {nodes:>10} nodes {seconds:>8.2f}s {nps:>11.0f} nodes/sec  x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
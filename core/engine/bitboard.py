@@ -0,0 +1,447 @@
+"""Bitboard board backend for Xiangqi.
+
+`BitboardBoard` is a drop-in replacement for `Board`: it keeps the same
+public API (`grid`, `get_piece`, `generate_legal_moves`, `is_in_check`,
+`move_piece`/`undo_move`, `_apply_temp_move`/`_undo_temp_move`) so the AI
+search and the desktop UI can use either backend unchanged.
+
+Internally every square gets an index ``sq = row * 9 + col`` and the
+position is held as:
+
+* one 90-bit integer bitboard per (side, piece type),
+* one occupancy bitboard per side,
+* a 9-bit occupancy mask per row and a 10-bit mask per column, used to look
+  up rook/cannon moves in precomputed slide tables,
+* a flat list of piece codes mirroring `grid` for O(1) square lookups.
+
+Leaper moves (horse, elephant, advisor, general, soldier) come from
+precomputed attack tables, and `is_in_check` looks outward from the general
+using reverse attack tables instead of generating every enemy move.
+"""
+
+from config import BOARD_COLS, BOARD_ROWS
+from .board import Board
+from .types import Side, Piece, SIDE_INDEX
+
+
+NUM_SQUARES = BOARD_COLS * BOARD_ROWS
+
+# Piece type codes, matching `Piece.code & 7`.
+GENERAL, ADVISOR, ELEPHANT, HORSE, ROOK, CANNON, SOLDIER = range(1, 8)
+SIDES_BY_INDEX = (Side.RED, Side.BLACK)
+
+SQ_BIT = [1 << sq for sq in range(NUM_SQUARES)]
+SQ_COORDS = [(sq % BOARD_COLS, sq // BOARD_COLS) for sq in range(NUM_SQUARES)]
+
+
+def square_of(col: int, row: int) -> int:
+    return row * BOARD_COLS + col
+
+
+def piece_code(piece: Piece) -> int:
+    """Return the integer code of `piece` (0 for an empty square)."""
+    if piece is None:
+        return 0
+    return piece.code
+
+
+def _inside(col, row):
+    return 0 <= col < BOARD_COLS and 0 <= row < BOARD_ROWS
+
+
+def _in_palace(col, row, bottom):
+    min_row, max_row = (7, 9) if bottom else (0, 2)
+    return 3 <= col <= 5 and min_row <= row <= max_row
+
+
+def _build_step_table(deltas, allowed):
+    """Targets reachable in one step, as a bitmask per (orientation, square)."""
+    table = ([0] * NUM_SQUARES, [0] * NUM_SQUARES)
+    for bottom in (0, 1):
+        for sq in range(NUM_SQUARES):
+            col, row = SQ_COORDS[sq]
+            mask = 0
+            for dc, dr in deltas(bottom, row):
+                nc, nr = col + dc, row + dr
+                if _inside(nc, nr) and allowed(nc, nr, bottom):
+                    mask |= SQ_BIT[square_of(nc, nr)]
+            table[bottom][sq] = mask
+    return table
+
+
+def _general_deltas(bottom, row):
+    return ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def _advisor_deltas(bottom, row):
+    return ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def _soldier_deltas(bottom, row):
+    forward = -1 if bottom else 1
+    crossed = row <= 4 if bottom else row >= 5
+    if crossed:
+        return ((0, forward), (-1, 0), (1, 0))
+    return ((0, forward),)
+
+
+GENERAL_TARGETS = _build_step_table(_general_deltas, _in_palace)
+ADVISOR_TARGETS = _build_step_table(_advisor_deltas, _in_palace)
+SOLDIER_TARGETS = _build_step_table(_soldier_deltas, lambda c, r, b: True)
+
+
+def _build_elephant_table():
+    table = ([()] * NUM_SQUARES, [()] * NUM_SQUARES)
+    for bottom in (0, 1):
+        for sq in range(NUM_SQUARES):
+            col, row = SQ_COORDS[sq]
+            entries = []
+            for dc, dr in ((2, 2), (2, -2), (-2, 2), (-2, -2)):
+                nc, nr = col + dc, row + dr
+                if not _inside(nc, nr):
+                    continue
+                if not (nr >= 5 if bottom else nr <= 4):
+                    continue
+                entries.append((square_of(nc, nr), square_of(col + dc // 2, row + dr // 2)))
+            table[bottom][sq] = tuple(entries)
+    return table
+
+
+def _build_horse_table():
+    table = [()] * NUM_SQUARES
+    for sq in range(NUM_SQUARES):
+        col, row = SQ_COORDS[sq]
+        entries = []
+        for dc, dr, lc, lr in (
+            (1, 2, 0, 1), (-1, 2, 0, 1), (1, -2, 0, -1), (-1, -2, 0, -1),
+            (2, 1, 1, 0), (2, -1, 1, 0), (-2, 1, -1, 0), (-2, -1, -1, 0),
+        ):
+            nc, nr = col + dc, row + dr
+            if _inside(nc, nr):
+                entries.append((square_of(nc, nr), square_of(col + lc, row + lr)))
+        table[sq] = tuple(entries)
+    return table
+
+
+ELEPHANT_TARGETS = _build_elephant_table()
+HORSE_TARGETS = _build_horse_table()
+
+
+def _invert_mask_table(table):
+    inverse = ([0] * NUM_SQUARES, [0] * NUM_SQUARES)
+    for bottom in (0, 1):
+        for sq in range(NUM_SQUARES):
+            mask = table[bottom][sq]
+            while mask:
+                low = mask & -mask
+                inverse[bottom][low.bit_length() - 1] |= SQ_BIT[sq]
+                mask ^= low
+    return inverse
+
+
+def _invert_blockable_table(entries_for):
+    inverse = [[] for _ in range(NUM_SQUARES)]
+    for sq in range(NUM_SQUARES):
+        for target, block in entries_for(sq):
+            inverse[target].append((sq, block))
+    return [tuple(e) for e in inverse]
+
+
+# Reverse tables: which squares a piece could attack `sq` from.
+GENERAL_ATTACKERS = _invert_mask_table(GENERAL_TARGETS)
+ADVISOR_ATTACKERS = _invert_mask_table(ADVISOR_TARGETS)
+SOLDIER_ATTACKERS = _invert_mask_table(SOLDIER_TARGETS)
+HORSE_ATTACKERS = _invert_blockable_table(lambda sq: HORSE_TARGETS[sq])
+ELEPHANT_ATTACKERS = (
+    _invert_blockable_table(lambda sq: ELEPHANT_TARGETS[0][sq]),
+    _invert_blockable_table(lambda sq: ELEPHANT_TARGETS[1][sq]),
+)
+
+
+def _build_slide_table(length):
+    """Slide moves along one line of `length` points.
+
+    ``table[pos][occ]`` is ``(quiet, first_hits, second_hits)`` where `quiet`
+    lists the empty points a rook/cannon can move to, `first_hits` the first
+    occupied point in each direction (rook captures) and `second_hits` the
+    point beyond a screen (cannon captures).
+    """
+    table = []
+    for pos in range(length):
+        per_occ = []
+        for occ in range(1 << length):
+            quiet = []
+            first = []
+            second = []
+            for step in (1, -1):
+                p = pos + step
+                while 0 <= p < length and not (occ >> p) & 1:
+                    quiet.append(p)
+                    p += step
+                if 0 <= p < length:
+                    first.append(p)
+                    p += step
+                    while 0 <= p < length and not (occ >> p) & 1:
+                        p += step
+                    if 0 <= p < length:
+                        second.append(p)
+            per_occ.append((tuple(quiet), tuple(first), tuple(second)))
+        table.append(per_occ)
+    return table
+
+
+RANK_SLIDES = _build_slide_table(BOARD_COLS)
+FILE_SLIDES = _build_slide_table(BOARD_ROWS)
+
+
+class BitboardBoard(Board):
+    """`Board` backed by integer bitboards and precomputed attack tables.
+
+    `grid` is still kept up to date so UI code and `get_piece` keep working,
+    but move generation and check detection only read the bitboards and the
+    flat `codes` list. Code that edits `grid` directly must call
+    `sync_from_grid()` afterwards.
+    """
+
+    def sync_from_grid(self):
+        """Rebuild all bitboard (and base incremental) state from `grid`."""
+        self.codes = [0] * NUM_SQUARES
+        self.bitboards = [0] * 16
+        self.occupancy = [0, 0]
+        self.rank_occ = [0] * BOARD_ROWS
+        self.file_occ = [0] * BOARD_COLS
+        self.bottom_flags = (
+            1 if self.red_on_bottom else 0,
+            0 if self.red_on_bottom else 1,
+        )
+        for r in range(BOARD_ROWS):
+            for c in range(BOARD_COLS):
+                code = piece_code(self.grid[r][c])
+                if not code:
+                    continue
+                sq = square_of(c, r)
+                self.codes[sq] = code
+                self.bitboards[code] |= SQ_BIT[sq]
+                self.occupancy[code >> 3] |= SQ_BIT[sq]
+                self.rank_occ[r] |= 1 << c
+                self.file_occ[c] |= 1 << r
+        super().sync_from_grid()
+
+    # ------------------------------------------------------------------
+    # Make / unmake
+    # ------------------------------------------------------------------
+    def _apply_temp_move(self, from_c, from_r, to_c, to_r):
+        grid = self.grid
+        piece = grid[from_r][from_c]
+        captured = grid[to_r][to_c]
+        grid[from_r][from_c] = None
+        grid[to_r][to_c] = piece
+
+        codes = self.codes
+        f = from_r * BOARD_COLS + from_c
+        t = to_r * BOARD_COLS + to_c
+        code = codes[f]
+        cap = codes[t]
+        codes[f] = 0
+        codes[t] = code
+
+        move_bits = SQ_BIT[f] | SQ_BIT[t]
+        self.bitboards[code] ^= move_bits
+        self.occupancy[code >> 3] ^= move_bits
+        self.rank_occ[from_r] &= ~(1 << from_c)
+        self.file_occ[from_c] &= ~(1 << from_r)
+        if cap:
+            self.bitboards[cap] ^= SQ_BIT[t]
+            self.occupancy[cap >> 3] ^= SQ_BIT[t]
+        else:
+            self.rank_occ[to_r] |= 1 << to_c
+            self.file_occ[to_c] |= 1 << to_r
+        self._record_move(piece, captured, f, t)
+        return captured
+
+    def _undo_temp_move(self, from_c, from_r, to_c, to_r, captured):
+        grid = self.grid
+        piece = grid[to_r][to_c]
+        grid[from_r][from_c] = piece
+        grid[to_r][to_c] = captured
+
+        codes = self.codes
+        f = from_r * BOARD_COLS + from_c
+        t = to_r * BOARD_COLS + to_c
+        code = codes[t]
+        codes[f] = code
+
+        move_bits = SQ_BIT[f] | SQ_BIT[t]
+        self.bitboards[code] ^= move_bits
+        self.occupancy[code >> 3] ^= move_bits
+        self.rank_occ[from_r] |= 1 << from_c
+        self.file_occ[from_c] |= 1 << from_r
+        if captured is not None:
+            cap = captured.code
+            codes[t] = cap
+            self.bitboards[cap] ^= SQ_BIT[t]
+            self.occupancy[cap >> 3] ^= SQ_BIT[t]
+        else:
+            codes[t] = 0
+            self.rank_occ[to_r] &= ~(1 << to_c)
+            self.file_occ[to_c] &= ~(1 << to_r)
+        self._record_undo(piece, captured, f, t)
+
+    def move_piece(self, move):
+        from_c, from_r = move.from_pos
+        to_c, to_r = move.to_pos
+        self._apply_temp_move(from_c, from_r, to_c, to_r)
+        self._push_history(move.pack())
+
+    def undo_move(self, move):
+        self._pop_history()
+        from_c, from_r = move.from_pos
+        to_c, to_r = move.to_pos
+        self._undo_temp_move(from_c, from_r, to_c, to_r, move.captured)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def is_in_check(self, side: Side) -> bool:
+        s = SIDE_INDEX[side]
+        bitboards = self.bitboards
+        gen_bb = bitboards[(s << 3) | GENERAL]
+        if not gen_bb:
+            return False
+        g = (gen_bb & -gen_bb).bit_length() - 1
+        gc, gr = SQ_COORDS[g]
+        e = (s ^ 1) << 3
+        codes = self.codes
+
+        # Rooks and cannons on the general's rank.
+        _, first, second = RANK_SLIDES[gc][self.rank_occ[gr]]
+        row_base = gr * BOARD_COLS
+        for c in first:
+            if codes[row_base + c] == e | ROOK:
+                return True
+        for c in second:
+            if codes[row_base + c] == e | CANNON:
+                return True
+
+        # Rooks, cannons and the flying general on the general's file.
+        _, first, second = FILE_SLIDES[gr][self.file_occ[gc]]
+        for r in first:
+            code = codes[r * BOARD_COLS + gc]
+            if code == e | ROOK or code == e | GENERAL:
+                return True
+        for r in second:
+            if codes[r * BOARD_COLS + gc] == e | CANNON:
+                return True
+
+        horses = bitboards[e | HORSE]
+        if horses:
+            for attacker, leg in HORSE_ATTACKERS[g]:
+                if horses & SQ_BIT[attacker] and not codes[leg]:
+                    return True
+
+        enemy_bottom = self.bottom_flags[s ^ 1]
+        if bitboards[e | SOLDIER] & SOLDIER_ATTACKERS[enemy_bottom][g]:
+            return True
+        if bitboards[e | ADVISOR] & ADVISOR_ATTACKERS[enemy_bottom][g]:
+            return True
+        elephants = bitboards[e | ELEPHANT]
+        if elephants:
+            for attacker, eye in ELEPHANT_ATTACKERS[enemy_bottom][g]:
+                if elephants & SQ_BIT[attacker] and not codes[eye]:
+                    return True
+        return False
+
+    def least_valuable_attacker(self, sq: int, by_side: Side) -> int:
+        s = SIDE_INDEX[by_side]
+        e = s << 3
+        bitboards = self.bitboards
+        codes = self.codes
+        bottom = self.bottom_flags[s]
+
+        attackers = bitboards[e | SOLDIER] & SOLDIER_ATTACKERS[bottom][sq]
+        if not attackers:
+            attackers = bitboards[e | ADVISOR] & ADVISOR_ATTACKERS[bottom][sq]
+        if attackers:
+            return (attackers & -attackers).bit_length() - 1
+        elephants = bitboards[e | ELEPHANT]
+        if elephants:
+            for attacker, eye in ELEPHANT_ATTACKERS[bottom][sq]:
+                if elephants & SQ_BIT[attacker] and not codes[eye]:
+                    return attacker
+        horses = bitboards[e | HORSE]
+        if horses:
+            for attacker, leg in HORSE_ATTACKERS[sq]:
+                if horses & SQ_BIT[attacker] and not codes[leg]:
+                    return attacker
+
+        col, row = SQ_COORDS[sq]
+        _, first_r, second_r = RANK_SLIDES[col][self.rank_occ[row]]
+        _, first_f, second_f = FILE_SLIDES[row][self.file_occ[col]]
+        row_base = row * BOARD_COLS
+        for c in second_r:
+            if codes[row_base + c] == e | CANNON:
+                return row_base + c
+        for r in second_f:
+            if codes[r * BOARD_COLS + col] == e | CANNON:
+                return r * BOARD_COLS + col
+        for c in first_r:
+            if codes[row_base + c] == e | ROOK:
+                return row_base + c
+        for r in first_f:
+            if codes[r * BOARD_COLS + col] == e | ROOK:
+                return r * BOARD_COLS + col
+
+        attackers = bitboards[e | GENERAL] & GENERAL_ATTACKERS[bottom][sq]
+        if attackers:
+            return (attackers & -attackers).bit_length() - 1
+        return -1
+
+    def generate_moves_for_square(self, col, row):
+        sq = square_of(col, row)
+        code = self.codes[sq]
+        if not code:
+            return []
+        kind = code & 7
+        s = code >> 3
+        own = self.occupancy[s]
+
+        if kind == ROOK or kind == CANNON:
+            codes = self.codes
+            quiet_r, first_r, second_r = RANK_SLIDES[col][self.rank_occ[row]]
+            quiet_f, first_f, second_f = FILE_SLIDES[row][self.file_occ[col]]
+            moves = [(c, row) for c in quiet_r]
+            moves.extend((col, r) for r in quiet_f)
+            hits_r, hits_f = (first_r, first_f) if kind == ROOK else (second_r, second_f)
+            row_base = row * BOARD_COLS
+            for c in hits_r:
+                target = codes[row_base + c]
+                if target >> 3 != s:
+                    moves.append((c, row))
+            for r in hits_f:
+                target = codes[r * BOARD_COLS + col]
+                if target >> 3 != s:
+                    moves.append((col, r))
+            return moves
+
+        if kind == HORSE or kind == ELEPHANT:
+            codes = self.codes
+            table = HORSE_TARGETS if kind == HORSE else ELEPHANT_TARGETS[self.bottom_flags[s]]
+            return [
+                SQ_COORDS[target]
+                for target, block in table[sq]
+                if not codes[block] and not own & SQ_BIT[target]
+            ]
+
+        if kind == GENERAL:
+            mask = GENERAL_TARGETS[self.bottom_flags[s]][sq]
+        elif kind == ADVISOR:
+            mask = ADVISOR_TARGETS[self.bottom_flags[s]][sq]
+        else:
+            mask = SOLDIER_TARGETS[self.bottom_flags[s]][sq]
+        mask &= ~own
+        moves = []
+        while mask:
+            low = mask & -mask
+            moves.append(SQ_COORDS[low.bit_length() - 1])
+            mask ^= low
+        return moves
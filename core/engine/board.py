@@ -1,14 +1,72 @@
+import os
+
 from config import BOARD_COLS, BOARD_ROWS
-from .types import Side, PieceType, Piece
+from .types import Side, PieceType, Piece, Move, PIECES
+from .zobrist import PIECE_KEYS, SIDE_TO_MOVE_KEY, compute_hash
+from .evaluation import PIECE_SQUARE_TABLES, compute_pst_score, evaluate_board_full
+
+# Enum members bound once at import: attribute lookups on an Enum class are
+# comparatively slow, and these are read on every make/unmake and check test.
+_RED, _BLACK = Side.RED, Side.BLACK
+_GENERAL = PieceType.GENERAL
+_ADVISOR = PieceType.ADVISOR
+_ELEPHANT = PieceType.ELEPHANT
+_HORSE = PieceType.HORSE
+_ROOK = PieceType.ROOK
+_CANNON = PieceType.CANNON
+_SOLDIER = PieceType.SOLDIER
+
+# (col, row) of every square index, for decoding packed moves.
+_SQ_COORDS = tuple((sq % BOARD_COLS, sq // BOARD_COLS) for sq in range(BOARD_COLS * BOARD_ROWS))
+
+START_FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1"
+# FEN letter of every piece code (red in capitals), and the piece of every
+# letter; "e" / "h" are accepted as the WXF spellings of elephant and horse.
+_FEN_LETTERS = {
+    _GENERAL: "k", _ADVISOR: "a", _ELEPHANT: "b", _HORSE: "n",
+    _ROOK: "r", _CANNON: "c", _SOLDIER: "p",
+}
+_FEN_CHAR_BY_CODE = [
+    None if p is None else (_FEN_LETTERS[p.ptype].upper() if p.side is _RED else _FEN_LETTERS[p.ptype])
+    for p in PIECES
+]
+_PIECE_BY_FEN_CHAR = {ch: PIECES[code] for code, ch in enumerate(_FEN_CHAR_BY_CODE) if ch is not None}
+for _alias, _letter in (("e", "b"), ("h", "n")):
+    _PIECE_BY_FEN_CHAR[_alias] = _PIECE_BY_FEN_CHAR[_letter]
+    _PIECE_BY_FEN_CHAR[_alias.upper()] = _PIECE_BY_FEN_CHAR[_letter.upper()]
+
 
 class Board:
+    # When enabled, every make/unmake checks the incrementally maintained
+    # Zobrist key / evaluation against a full recompute (slow; for debugging only).
+    debug_hash = os.environ.get("XIANGQI_DEBUG_HASH") == "1"
+    debug_eval = os.environ.get("XIANGQI_DEBUG_EVAL") == "1"
+
     def __init__(self, red_on_bottom: bool = True):
         self.red_on_bottom = red_on_bottom
         self.grid = []
+        self.side_to_move = Side.RED
+        self.zobrist_key = 0
+        # Material + positional score from red's point of view.
+        self.pst_score = 0
+        # (col, row) of each side's general, or None once captured.
+        self.general_pos = {Side.RED: None, Side.BLACK: None}
+        # Occupied squares (row * BOARD_COLS + col) per side, indexed by
+        # `piece.code >> 3` (0 = red, 1 = black).
+        self.piece_squares = (set(), set())
+        # Zobrist keys of the positions since the last `sync_from_grid`
+        # (current one last), the packed moves between them, and how often
+        # each key occurs, for O(1) repetition checks. Kept by `move_piece`
+        # / `undo_move` and `apply_packed_move` / `undo_packed_move`.
+        self.position_history = []
+        self.played_moves = []
+        self._key_counts = {}
+        self.start_halfmove_clock = 0
+        self.start_move_number = 1
         self.setup_initial()
 
     def _is_bottom_side(self, side: Side) -> bool:
-        return (side == Side.RED and self.red_on_bottom) or (side == Side.BLACK and not self.red_on_bottom)
+        return (side is _RED) == self.red_on_bottom
 
     def _palace_rows(self, side: Side):
         # Bottom palace rows are 7-9, top are 0-2.
@@ -63,6 +121,106 @@ class Board:
         place_army(top_side, is_bottom=False)
         place_army(bottom_side, is_bottom=True)
 
+        self.side_to_move = Side.RED
+        self.sync_from_grid()
+
+    def sync_from_grid(self):
+        """Rebuild all incrementally maintained state from `grid`.
+
+        Call after editing `grid` or `side_to_move` directly; make/unmake
+        keep this state up to date on their own.
+        """
+        self.rehash()
+        self.pst_score = compute_pst_score(self.grid)
+        self._scan_generals()
+        self.piece_squares = (set(), set())
+        for r in range(BOARD_ROWS):
+            for c in range(BOARD_COLS):
+                p = self.grid[r][c]
+                if p is not None:
+                    self.piece_squares[p.code >> 3].add(r * BOARD_COLS + c)
+        self.position_history = [self.zobrist_key]
+        self.played_moves = []
+        self._key_counts = {self.zobrist_key: 1}
+        # Halfmove clock and full-move number of the position
+        # `played_moves` starts from.
+        self.start_halfmove_clock = 0
+        self.start_move_number = 1
+
+    def rehash(self):
+        """Recompute `zobrist_key` from `grid` and `side_to_move`.
+
+        Needed after editing `grid` or `side_to_move` directly; make/unmake
+        keep the key up to date on their own.
+        """
+        self.zobrist_key = compute_hash(self)
+
+    def verify_hash(self):
+        expected = compute_hash(self)
+        if self.zobrist_key != expected:
+            raise AssertionError(
+                f"Zobrist key drift: incremental {self.zobrist_key:#018x}, recomputed {expected:#018x}"
+            )
+
+    def verify_evaluation(self):
+        expected = evaluate_board_full(self, Side.RED)
+        if self.pst_score != expected:
+            raise AssertionError(
+                f"Evaluation drift: incremental {self.pst_score}, recomputed {expected}"
+            )
+
+    def _record_move(self, piece, captured, from_sq, to_sq):
+        """Update incremental state after `piece` moved from_sq -> to_sq."""
+        keys = PIECE_KEYS[piece.code]
+        key = self.zobrist_key ^ keys[from_sq] ^ keys[to_sq] ^ SIDE_TO_MOVE_KEY
+        table = PIECE_SQUARE_TABLES[piece.code]
+        score = self.pst_score + table[to_sq] - table[from_sq]
+        if captured is not None:
+            key ^= PIECE_KEYS[captured.code][to_sq]
+            score -= PIECE_SQUARE_TABLES[captured.code][to_sq]
+        self.zobrist_key = key
+        self.pst_score = score
+        self.side_to_move = _BLACK if self.side_to_move is _RED else _RED
+        own = self.piece_squares[piece.code >> 3]
+        own.discard(from_sq)
+        own.add(to_sq)
+        if captured is not None:
+            self.piece_squares[captured.code >> 3].discard(to_sq)
+        if piece.ptype is _GENERAL:
+            self.general_pos[piece.side] = (to_sq % BOARD_COLS, to_sq // BOARD_COLS)
+        if captured is not None and captured.ptype is _GENERAL:
+            self.general_pos[captured.side] = None
+        if self.debug_hash:
+            self.verify_hash()
+        if self.debug_eval:
+            self.verify_evaluation()
+
+    def _record_undo(self, piece, captured, from_sq, to_sq):
+        """Update incremental state after undoing `piece`'s move from_sq -> to_sq."""
+        keys = PIECE_KEYS[piece.code]
+        key = self.zobrist_key ^ keys[from_sq] ^ keys[to_sq] ^ SIDE_TO_MOVE_KEY
+        table = PIECE_SQUARE_TABLES[piece.code]
+        score = self.pst_score - table[to_sq] + table[from_sq]
+        if captured is not None:
+            key ^= PIECE_KEYS[captured.code][to_sq]
+            score += PIECE_SQUARE_TABLES[captured.code][to_sq]
+        self.zobrist_key = key
+        self.pst_score = score
+        self.side_to_move = _BLACK if self.side_to_move is _RED else _RED
+        own = self.piece_squares[piece.code >> 3]
+        own.discard(to_sq)
+        own.add(from_sq)
+        if captured is not None:
+            self.piece_squares[captured.code >> 3].add(to_sq)
+        if piece.ptype is _GENERAL:
+            self.general_pos[piece.side] = (from_sq % BOARD_COLS, from_sq // BOARD_COLS)
+        if captured is not None and captured.ptype is _GENERAL:
+            self.general_pos[captured.side] = (to_sq % BOARD_COLS, to_sq // BOARD_COLS)
+        if self.debug_hash:
+            self.verify_hash()
+        if self.debug_eval:
+            self.verify_evaluation()
+
     def inside_board(self, col, row):
         return 0 <= col < BOARD_COLS and 0 <= row < BOARD_ROWS
 
@@ -76,84 +234,316 @@ class Board:
         to_c, to_r = move.to_pos
         self.grid[from_r][from_c] = None
         self.grid[to_r][to_c] = move.piece
+        self._record_move(move.piece, move.captured,
+                          from_r * BOARD_COLS + from_c, to_r * BOARD_COLS + to_c)
+        self._push_history(move.pack())
 
     def undo_move(self, move):
+        self._pop_history()
         from_c, from_r = move.from_pos
         to_c, to_r = move.to_pos
         self.grid[from_r][from_c] = move.piece
         self.grid[to_r][to_c] = move.captured
+        self._record_undo(move.piece, move.captured,
+                          from_r * BOARD_COLS + from_c, to_r * BOARD_COLS + to_c)
+
+    # ------------------------------------------------------------------
+    # Position history
+    # ------------------------------------------------------------------
+    def _push_history(self, move: int):
+        key = self.zobrist_key
+        self.position_history.append(key)
+        self.played_moves.append(move)
+        counts = self._key_counts
+        counts[key] = counts.get(key, 0) + 1
+
+    def _pop_history(self):
+        key = self.position_history.pop()
+        self.played_moves.pop()
+        counts = self._key_counts
+        count = counts[key] - 1
+        if count:
+            counts[key] = count
+        else:
+            del counts[key]
+
+    def repetition_count(self) -> int:
+        """How many times the current position has occurred, this time included (O(1))."""
+        return self._key_counts.get(self.zobrist_key, 0)
+
+    def perpetual_checker(self):
+        """Return the side that checked with every move since the current position last occurred.
+
+        None if the position has not occurred before, or if both sides or
+        neither did. The cycle is walked back with unmake to see which
+        moves gave check, then replayed.
+        """
+        history = self.position_history
+        start = len(history) - 2
+        while start >= 0 and history[start] != history[-1]:
+            start -= 1
+        if start < 0:
+            return None
+        checked_always = [True, True]
+        undone = []
+        try:
+            for move in reversed(self.played_moves[start:]):
+                mover = (move >> 17) & 1
+                if checked_always[mover] and not self.is_in_check(_BLACK if mover == 0 else _RED):
+                    checked_always[mover] = False
+                self.undo_packed_move(move)
+                undone.append(move)
+        finally:
+            for move in reversed(undone):
+                self.apply_packed_move(move)
+        red, black = checked_always
+        if red != black:
+            return _RED if red else _BLACK
+        return None
+
+    def load_history(self, moves):
+        """Set the history to `moves`, the packed moves that led to the current position.
+
+        Used after `from_bytes`, which only carries the position itself.
+        """
+        for move in reversed(moves):
+            from_c, from_r = _SQ_COORDS[move & 0x7F]
+            to_c, to_r = _SQ_COORDS[(move >> 7) & 0x7F]
+            self._undo_temp_move(from_c, from_r, to_c, to_r, PIECES[(move >> 18) & 0xF])
+        self.position_history = [self.zobrist_key]
+        self.played_moves = []
+        self._key_counts = {self.zobrist_key: 1}
+        for move in moves:
+            self.apply_packed_move(move)
 
     def _apply_temp_move(self, from_c, from_r, to_c, to_r):
         piece = self.get_piece(from_c, from_r)
         captured = self.get_piece(to_c, to_r)
         self.grid[from_r][from_c] = None
         self.grid[to_r][to_c] = piece
+        self._record_move(piece, captured,
+                          from_r * BOARD_COLS + from_c, to_r * BOARD_COLS + to_c)
         return captured
 
     def _undo_temp_move(self, from_c, from_r, to_c, to_r, captured):
         piece = self.get_piece(to_c, to_r)
         self.grid[to_r][to_c] = captured
         self.grid[from_r][from_c] = piece
+        self._record_undo(piece, captured,
+                          from_r * BOARD_COLS + from_c, to_r * BOARD_COLS + to_c)
 
     def find_general(self, side: Side):
+        return self.general_pos.get(side)
+
+    def _scan_generals(self):
+        self.general_pos = {Side.RED: None, Side.BLACK: None}
         for r in range(BOARD_ROWS):
             for c in range(BOARD_COLS):
                 p = self.grid[r][c]
-                if p is not None and p.side == side and p.ptype == PieceType.GENERAL:
-                    return c, r
-        return None
+                if p is not None and p.ptype == PieceType.GENERAL and self.general_pos[p.side] is None:
+                    self.general_pos[p.side] = (c, r)
+
+    # Horse attackers of a square, as (attacker offset, leg offset). The leg
+    # sits next to the horse, i.e. diagonally next to the attacked square.
+    _HORSE_ATTACKS = (
+        ((1, 2), (1, 1)), ((-1, 2), (-1, 1)), ((1, -2), (1, -1)), ((-1, -2), (-1, -1)),
+        ((2, 1), (1, 1)), ((2, -1), (1, -1)), ((-2, 1), (-1, 1)), ((-2, -1), (-1, -1)),
+    )
+    _DIAGONALS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+    def is_square_attacked(self, col, row, by_side: Side) -> bool:
+        """Return True if a piece of `by_side` could move onto (col, row).
+
+        Looks outward from the square instead of generating every enemy
+        move: rook/cannon rays, horse positions (with their legs), soldiers,
+        advisors and elephants. The enemy general only counts along an open
+        file (the flying-general rule), as needed for check detection.
+        """
+        grid = self.grid
+
+        for dc, dr in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            c, r = col + dc, row + dr
+            while 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS and grid[r][c] is None:
+                c += dc
+                r += dr
+            if not (0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS):
+                continue
+            p = grid[r][c]
+            if p.side is by_side:
+                if p.ptype is _ROOK or (p.ptype is _GENERAL and dc == 0):
+                    return True
+            # Past the screen, the next piece may be a cannon.
+            c += dc
+            r += dr
+            while 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS and grid[r][c] is None:
+                c += dc
+                r += dr
+            if 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS:
+                p = grid[r][c]
+                if p.side is by_side and p.ptype is _CANNON:
+                    return True
+
+        for (ac, ar), (lc, lr) in self._HORSE_ATTACKS:
+            c, r = col + ac, row + ar
+            if 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS:
+                p = grid[r][c]
+                if (p is not None and p.side is by_side and p.ptype is _HORSE
+                        and grid[row + lr][col + lc] is None):
+                    return True
+
+        forward = self._soldier_forward(by_side)
+        r = row - forward
+        if 0 <= r < BOARD_ROWS:
+            p = grid[r][col]
+            if p is not None and p.side is by_side and p.ptype is _SOLDIER:
+                return True
+        if self._soldier_crossed_river(by_side, row):
+            for c in (col - 1, col + 1):
+                if 0 <= c < BOARD_COLS:
+                    p = grid[row][c]
+                    if p is not None and p.side is by_side and p.ptype is _SOLDIER:
+                        return True
+
+        min_row, max_row = self._palace_rows(by_side)
+        if 3 <= col <= 5 and min_row <= row <= max_row:
+            for dc, dr in self._DIAGONALS:
+                c, r = col + dc, row + dr
+                if 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS:
+                    p = grid[r][c]
+                    if p is not None and p.side is by_side and p.ptype is _ADVISOR:
+                        return True
+
+        if self._elephant_stays_home(by_side, row):
+            for dc, dr in self._DIAGONALS:
+                c, r = col + 2 * dc, row + 2 * dr
+                if 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS:
+                    p = grid[r][c]
+                    if (p is not None and p.side is by_side and p.ptype is _ELEPHANT
+                            and grid[row + dr][col + dc] is None):
+                        return True
+        return False
 
     def is_in_check(self, side: Side) -> bool:
-        gen_pos = self.find_general(side)
+        gen_pos = self.general_pos.get(side)
         if gen_pos is None:
             return False
-        gx, gy = gen_pos
-
-        enemy = Side.RED if side == Side.BLACK else Side.BLACK
-
-        enemy_gen_pos = self.find_general(enemy)
-        if enemy_gen_pos is not None:
-            ex, ey = enemy_gen_pos
-            if ex == gx:
-                step = 1 if gy < ey else -1
-                blocked = False
-                for r in range(gy + step, ey, step):
-                    if self.get_piece(gx, r) is not None:
-                        blocked = True
-                        break
-                if not blocked:
-                    return True
+        enemy = _RED if side is _BLACK else _BLACK
+        return self.is_square_attacked(gen_pos[0], gen_pos[1], enemy)
 
-        for r in range(BOARD_ROWS):
-            for c in range(BOARD_COLS):
-                p = self.grid[r][c]
-                if p is None or p.side != enemy:
-                    continue
-                if p.ptype == PieceType.GENERAL:
-                    continue
-                moves = self.generate_moves_for_square(c, r)
-                if (gx, gy) in moves:
-                    return True
-        return False
+    def least_valuable_attacker(self, sq: int, by_side: Side) -> int:
+        """Return the square of the cheapest piece of `by_side` that can capture on `sq`, or -1.
+
+        Squares are ``row * BOARD_COLS + col``. Pieces are tried in order of
+        value: soldier, advisor, elephant, horse, cannon, rook, general;
+        among pieces of one type, the lowest square for leapers and the first
+        ray in right, left, down, up order for cannons and rooks.
+
+        Unlike `is_square_attacked`, the general attacks the squares next to
+        it in its palace, not along open files. Pins are ignored: this is
+        the attack query of static exchange evaluation (`see.py`).
+        """
+        grid = self.grid
+        col, row = _SQ_COORDS[sq]
+
+        found = []
+        r = row - self._soldier_forward(by_side)
+        if 0 <= r < BOARD_ROWS:
+            p = grid[r][col]
+            if p is not None and p.side is by_side and p.ptype is _SOLDIER:
+                found.append(r * BOARD_COLS + col)
+        if self._soldier_crossed_river(by_side, row):
+            for c in (col - 1, col + 1):
+                if 0 <= c < BOARD_COLS:
+                    p = grid[row][c]
+                    if p is not None and p.side is by_side and p.ptype is _SOLDIER:
+                        found.append(row * BOARD_COLS + c)
+        if found:
+            return min(found)
+
+        min_row, max_row = self._palace_rows(by_side)
+        in_palace = 3 <= col <= 5 and min_row <= row <= max_row
+        if in_palace:
+            for dc, dr in self._DIAGONALS:
+                c, r = col + dc, row + dr
+                if 3 <= c <= 5 and min_row <= r <= max_row:
+                    p = grid[r][c]
+                    if p is not None and p.side is by_side and p.ptype is _ADVISOR:
+                        found.append(r * BOARD_COLS + c)
+            if found:
+                return min(found)
+
+        if self._elephant_stays_home(by_side, row):
+            for dc, dr in self._DIAGONALS:
+                c, r = col + 2 * dc, row + 2 * dr
+                if 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS:
+                    p = grid[r][c]
+                    if (p is not None and p.side is by_side and p.ptype is _ELEPHANT
+                            and grid[row + dr][col + dc] is None):
+                        found.append(r * BOARD_COLS + c)
+            if found:
+                return min(found)
+
+        for (ac, ar), (lc, lr) in self._HORSE_ATTACKS:
+            c, r = col + ac, row + ar
+            if 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS:
+                p = grid[r][c]
+                if (p is not None and p.side is by_side and p.ptype is _HORSE
+                        and grid[row + lr][col + lc] is None):
+                    found.append(r * BOARD_COLS + c)
+        if found:
+            return min(found)
+
+        rook = -1
+        for dc, dr in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            c, r = col + dc, row + dr
+            while 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS and grid[r][c] is None:
+                c += dc
+                r += dr
+            if not (0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS):
+                continue
+            p = grid[r][c]
+            if rook < 0 and p.side is by_side and p.ptype is _ROOK:
+                rook = r * BOARD_COLS + c
+            c += dc
+            r += dr
+            while 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS and grid[r][c] is None:
+                c += dc
+                r += dr
+            if 0 <= c < BOARD_COLS and 0 <= r < BOARD_ROWS:
+                p = grid[r][c]
+                if p.side is by_side and p.ptype is _CANNON:
+                    return r * BOARD_COLS + c
+        if rook >= 0:
+            return rook
+
+        if in_palace:
+            for dc, dr in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                c, r = col + dc, row + dr
+                if 3 <= c <= 5 and min_row <= r <= max_row:
+                    p = grid[r][c]
+                    if p is not None and p.side is by_side and p.ptype is _GENERAL:
+                        return r * BOARD_COLS + c
+        return -1
 
     def generate_moves_for_square(self, col, row):
         piece = self.get_piece(col, row)
         if piece is None:
             return []
 
-        if piece.ptype == PieceType.GENERAL:
+        ptype = piece.ptype
+        if ptype is _GENERAL:
             return self._gen_general_moves(col, row, piece)
-        if piece.ptype == PieceType.ADVISOR:
+        if ptype is _ADVISOR:
             return self._gen_advisor_moves(col, row, piece)
-        if piece.ptype == PieceType.ELEPHANT:
+        if ptype is _ELEPHANT:
             return self._gen_elephant_moves(col, row, piece)
-        if piece.ptype == PieceType.HORSE:
+        if ptype is _HORSE:
             return self._gen_horse_moves(col, row, piece)
-        if piece.ptype == PieceType.ROOK:
+        if ptype is _ROOK:
             return self._gen_rook_moves(col, row, piece)
-        if piece.ptype == PieceType.CANNON:
+        if ptype is _CANNON:
             return self._gen_cannon_moves(col, row, piece)
-        if piece.ptype == PieceType.SOLDIER:
+        if ptype is _SOLDIER:
             return self._gen_soldier_moves(col, row, piece)
         return []
 
@@ -171,17 +561,119 @@ class Board:
             self._undo_temp_move(col, row, nc, nr, captured)
         return legal
 
+    def _iter_legal_moves(self, side: Side, captures_only: bool = False):
+        """Yield every legal move of `side` as a packed int (see `types.pack_move`).
+
+        Works from `piece_squares` and decides once per call which moves can
+        possibly expose the general; only those get the make / `is_in_check`
+        / unmake test:
+
+        * every move while in check, and every general move;
+        * moves of pieces on the general's rank or file (rook, cannon and
+          flying-general lines) or diagonally next to it (horse legs and
+          elephant eyes), i.e. the candidates for being pinned;
+        * moves onto the general's rank or file, which may give an enemy
+          cannon its screen.
+
+        Any other move leaves every attack line to the general unchanged.
+        """
+        grid = self.grid
+        gen_pos = self.general_pos.get(side)
+        if gen_pos is None:
+            # Without a general nothing can be exposed (see `is_in_check`).
+            gc = gr = -9
+            in_check = False
+        else:
+            gc, gr = gen_pos
+            in_check = self.is_in_check(side)
+
+        for sq in sorted(self.piece_squares[0 if side is _RED else 1]):
+            c, r = _SQ_COORDS[sq]
+            piece = grid[r][c]
+            base = sq | (piece.code << 14)
+            test_all = (in_check or piece.ptype is _GENERAL or c == gc or r == gr
+                        or (abs(c - gc) == 1 and abs(r - gr) == 1))
+            for nc, nr in self.generate_moves_for_square(c, r):
+                captured = grid[nr][nc]
+                if captured is None:
+                    if captures_only:
+                        continue
+                    move = base | ((nr * BOARD_COLS + nc) << 7)
+                else:
+                    move = base | ((nr * BOARD_COLS + nc) << 7) | (captured.code << 18)
+                if test_all or nc == gc or nr == gr:
+                    self._apply_temp_move(c, r, nc, nr)
+                    exposed = self.is_in_check(side)
+                    self._undo_temp_move(c, r, nc, nr, captured)
+                    if exposed:
+                        continue
+                yield move
+
+    def generate_packed_moves(self, side: Side, captures_only: bool = False):
+        """Return every legal move of `side` as packed ints (only captures if `captures_only`).
+
+        This is the search path: no `Move` objects are created. Play the
+        moves with `apply_packed_move` / `undo_packed_move`.
+        """
+        return list(self._iter_legal_moves(side, captures_only))
+
+    def generate_all_legal_moves(self, side: Side, captures_only: bool = False):
+        """Return every legal `Move` of `side` (only captures if `captures_only`)."""
+        return [Move.from_packed(move) for move in self._iter_legal_moves(side, captures_only)]
+
     def has_any_legal_move(self, side: Side) -> bool:
-        for r in range(BOARD_ROWS):
-            for c in range(BOARD_COLS):
-                p = self.grid[r][c]
-                if p is None or p.side != side:
-                    continue
-                moves = self.generate_legal_moves(c, r, side)
-                if moves:
-                    return True
+        for _ in self._iter_legal_moves(side):
+            return True
         return False
 
+    def apply_packed_move(self, move: int):
+        """Make a packed move produced by `generate_packed_moves`."""
+        from_c, from_r = _SQ_COORDS[move & 0x7F]
+        to_c, to_r = _SQ_COORDS[(move >> 7) & 0x7F]
+        self._apply_temp_move(from_c, from_r, to_c, to_r)
+        self._push_history(move)
+
+    def undo_packed_move(self, move: int):
+        """Take back a packed move made with `apply_packed_move`."""
+        self._pop_history()
+        from_c, from_r = _SQ_COORDS[move & 0x7F]
+        to_c, to_r = _SQ_COORDS[(move >> 7) & 0x7F]
+        self._undo_temp_move(from_c, from_r, to_c, to_r, PIECES[(move >> 18) & 0xF])
+
+    def perft(self, depth: int, side: Side = None) -> int:
+        """Count the leaf positions of the legal move tree `depth` plies deep.
+
+        `side` defaults to `side_to_move`. Used to check move generation
+        against known counts (see `core.engine.perft`).
+        """
+        if side is None:
+            side = self.side_to_move
+        if depth <= 0:
+            return 1
+        moves = self.generate_packed_moves(side)
+        if depth == 1:
+            return len(moves)
+        next_side = _BLACK if side is _RED else _RED
+        total = 0
+        for move in moves:
+            self.apply_packed_move(move)
+            total += self.perft(depth - 1, next_side)
+            self.undo_packed_move(move)
+        return total
+
+    def divide(self, depth: int, side: Side = None):
+        """Return ``{(from_pos, to_pos): perft(depth - 1)}`` for every root move."""
+        if side is None:
+            side = self.side_to_move
+        next_side = _BLACK if side is _RED else _RED
+        counts = {}
+        for move in self.generate_packed_moves(side):
+            self.apply_packed_move(move)
+            from_to = (_SQ_COORDS[move & 0x7F], _SQ_COORDS[(move >> 7) & 0x7F])
+            counts[from_to] = self.perft(depth - 1, next_side)
+            self.undo_packed_move(move)
+        return counts
+
     def _gen_general_moves(self, col, row, piece):
         moves = []
         min_row, max_row = self._palace_rows(piece.side)
@@ -316,6 +808,124 @@ class Board:
         self.red_on_bottom = red_on_bottom
         self.setup_initial()
 
+    def to_bytes(self) -> bytes:
+        """Serialize the position into 46 bytes (e.g. to hand it to another process).
+
+        Byte 0 holds flags (bit 0: red on bottom, bit 1: black to move); the
+        rest are the 90 piece codes, two 4-bit codes per byte in square order.
+        """
+        codes = [p.code if p is not None else 0 for row in self.grid for p in row]
+        flags = (1 if self.red_on_bottom else 0) | (2 if self.side_to_move is _BLACK else 0)
+        return bytes([flags]) + bytes(
+            (codes[i] << 4) | codes[i + 1] for i in range(0, len(codes), 2)
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Build a board of this class from `to_bytes` output."""
+        flags = data[0]
+        board = cls(red_on_bottom=bool(flags & 1))
+        codes = []
+        for byte in data[1:]:
+            codes.append(byte >> 4)
+            codes.append(byte & 0xF)
+        board.grid = [
+            [PIECES[code] for code in codes[r * BOARD_COLS:(r + 1) * BOARD_COLS]]
+            for r in range(BOARD_ROWS)
+        ]
+        board.side_to_move = _BLACK if flags & 2 else _RED
+        board.sync_from_grid()
+        return board
+
+    def to_fen(self) -> str:
+        """Return the position as Xiangqi FEN.
+
+        Ranks run from black's back rank to red's, files from red's left,
+        red pieces in capitals, whichever way `red_on_bottom` turns the
+        board, so the same position always gives the same text. The
+        halfmove clock counts the plies since the last capture in
+        `played_moves`, plus `start_halfmove_clock` if there is none; the
+        move number is `start_move_number` plus the moves of black in
+        `played_moves`. Both start values are the FEN's after `set_fen`,
+        0 and 1 after `sync_from_grid`.
+        """
+        chars = _FEN_CHAR_BY_CODE
+        flip = not self.red_on_bottom
+        ranks = []
+        for rank in range(BOARD_ROWS):
+            row = self.grid[BOARD_ROWS - 1 - rank] if flip else self.grid[rank]
+            text = []
+            empty = 0
+            for p in (reversed(row) if flip else row):
+                if p is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text.append(str(empty))
+                    empty = 0
+                text.append(chars[p.code])
+            if empty:
+                text.append(str(empty))
+            ranks.append("".join(text))
+        quiet = 0
+        for move in reversed(self.played_moves):
+            if move >> 18:
+                break
+            quiet += 1
+        else:
+            quiet += self.start_halfmove_clock
+        # Bit 17 of a packed move is the mover's side: 1 for black.
+        move_number = self.start_move_number + sum((move >> 17) & 1 for move in self.played_moves)
+        side = "b" if self.side_to_move is _BLACK else "w"
+        return f"{'/'.join(ranks)} {side} - - {quiet} {move_number}"
+
+    def set_fen(self, fen: str):
+        """Set up the position of a Xiangqi FEN (see `to_fen`), keeping `red_on_bottom`.
+
+        The placement, side to move, halfmove clock and move number are
+        read; raises ValueError on malformed text.
+        """
+        fields = fen.split()
+        ranks = fields[0].split("/") if fields else []
+        if len(ranks) != BOARD_ROWS:
+            raise ValueError(f"FEN needs {BOARD_ROWS} ranks: {fen!r}")
+        if len(fields) > 1 and fields[1] not in ("w", "r", "b"):
+            raise ValueError(f"bad side to move in FEN: {fen!r}")
+        if len(fields) > 4 and not fields[4].isdigit():
+            raise ValueError(f"bad halfmove clock in FEN: {fen!r}")
+        if len(fields) > 5 and not (fields[5].isdigit() and int(fields[5]) > 0):
+            raise ValueError(f"bad move number in FEN: {fen!r}")
+        pieces = _PIECE_BY_FEN_CHAR
+        grid = []
+        for text in ranks:
+            row = []
+            for ch in text:
+                if ch.isdigit():
+                    row.extend([None] * int(ch))
+                elif ch in pieces:
+                    row.append(pieces[ch])
+                else:
+                    raise ValueError(f"bad piece {ch!r} in FEN: {fen!r}")
+            if len(row) != BOARD_COLS:
+                raise ValueError(f"FEN rank {text!r} does not have {BOARD_COLS} files")
+            grid.append(row)
+        if not self.red_on_bottom:
+            grid = [row[::-1] for row in reversed(grid)]
+        self.grid = grid
+        self.side_to_move = _BLACK if len(fields) > 1 and fields[1] == "b" else _RED
+        self.sync_from_grid()
+        if len(fields) > 4:
+            self.start_halfmove_clock = int(fields[4])
+        if len(fields) > 5:
+            self.start_move_number = int(fields[5])
+
+    @classmethod
+    def from_fen(cls, fen: str, red_on_bottom: bool = True):
+        """Build a board of this class from Xiangqi FEN."""
+        board = cls(red_on_bottom=red_on_bottom)
+        board.set_fen(fen)
+        return board
+
     def is_insufficient_material(self) -> bool:
         """Return True if neither side has mating material.
 
@@ -2,3 +2,7 @@ from core.engine.types import Side
 
 AI_SIDE = Side.BLACK
 HUMAN_SIDE = Side.RED
+
+# A position occurring this many times ends the game: a loss for the side
+# that checked with every move of the repetition, otherwise a draw.
+REPETITION_LIMIT = 3
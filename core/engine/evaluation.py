@@ -6,7 +6,14 @@ Separates heuristic scoring from the search implementation to keep
 Exports:
     PIECE_VALUES: Base material values.
     evaluate_piece_positional(piece, col, row): Positional bonus.
+    PIECE_SQUARE_TABLES: Material + positional value per piece code and square.
     evaluate_board(board, side): Signed evaluation from `side` perspective.
+    evaluate_board_full(board, side): Same, computed by scanning the board.
+
+`PIECE_SQUARE_TABLES` is precomputed from `PIECE_VALUES` and
+`evaluate_piece_positional`, so `Board` can keep a running score that is
+updated on every make/unmake and `evaluate_board` becomes a constant-time
+lookup.
 """
 
 from __future__ import annotations
@@ -14,7 +21,7 @@ from __future__ import annotations
 from typing import Dict
 
 from config import BOARD_COLS, BOARD_ROWS
-from .types import Side, PieceType, Piece  # noqa: F401 (Piece used for typing clarity)
+from .types import Side, PieceType, Piece, PIECE_TYPE_ORDER
 
 
 PIECE_VALUES: Dict[PieceType, int] = {
@@ -82,11 +89,53 @@ def evaluate_piece_positional(p, c: int, r: int) -> int:
     return bonus
 
 
+def _build_piece_square_tables():
+    """Per piece code, `PIECE_VALUES + evaluate_piece_positional` for every square.
+
+    Values are signed from red's point of view (black tables are negated)
+    so a position's score is simply the sum over its pieces.
+    """
+    tables = [None] * 16
+    for side, sign in ((Side.RED, 1), (Side.BLACK, -1)):
+        for ptype in PIECE_TYPE_ORDER:
+            piece = Piece(side, ptype)
+            base = PIECE_VALUES.get(ptype, 0)
+            tables[piece.code] = tuple(
+                sign * (base + evaluate_piece_positional(piece, sq % BOARD_COLS, sq // BOARD_COLS))
+                for sq in range(BOARD_COLS * BOARD_ROWS)
+            )
+    return tables
+
+
+PIECE_SQUARE_TABLES = _build_piece_square_tables()
+
+
+def compute_pst_score(grid) -> int:
+    """Sum of `PIECE_SQUARE_TABLES` over `grid`, from red's point of view."""
+    score = 0
+    for r in range(BOARD_ROWS):
+        row = grid[r]
+        for c in range(BOARD_COLS):
+            p = row[c]
+            if p is not None:
+                score += PIECE_SQUARE_TABLES[p.code][r * BOARD_COLS + c]
+    return score
+
+
 def evaluate_board(board, side: Side) -> int:
     """Evaluate `board` from perspective of `side`.
 
     Positive values favor `side`; negative values favor the opponent.
-    Combines material and positional heuristics.
+    Reads the score `Board` maintains incrementally, so this is O(1).
+    """
+    return board.pst_score if side == Side.RED else -board.pst_score
+
+
+def evaluate_board_full(board, side: Side) -> int:
+    """Evaluate `board` from perspective of `side` by scanning every square.
+
+    Combines material and positional heuristics; used as the reference for
+    the incremental score (see `Board.verify_evaluation`).
     """
     score = 0
     for r in range(BOARD_ROWS):
@@ -0,0 +1,258 @@
+"""Opening book: weighted book moves per position, in a compact binary file.
+
+File format (little endian)::
+
+    header   4s magic b"XQBK", H version, 2 pad bytes, I record count
+    records  Q position key, H move (from_sq | to_sq << 7), H weight
+
+Records are sorted by (key, move), so the moves of a position are found by
+binary search over the memory-mapped file without loading it. Keys are the
+Zobrist keys of `zobrist.py` (stable across runs) and, like the moves,
+always describe the position with red on the bottom: a board set up with
+``red_on_bottom=False`` is rotated by 180 degrees on lookup.
+
+The book is compiled from game records::
+
+    python -m core.engine.opening_book build data/openings -o data/opening_book.bin
+
+A record file holds one game per line as ICCS moves (``h2e2`` or
+``H2-E2``: files a-i from red's left, ranks 0-9 from red's side),
+optionally ending with the result ``1-0``, ``0-1`` or ``1/2-1/2``; ``#``
+starts a comment. Each move played in the first `--max-ply` plies adds 2
+to its weight if its side went on to win, 0 if it lost and 1 otherwise.
+``python -m core.engine.opening_book probe [ICCS moves...]`` lists the
+book moves after a sequence of moves.
+"""
+
+from __future__ import annotations
+
+import argparse
+import mmap
+import os
+import random
+import struct
+
+from config import BOARD_COLS, BOARD_ROWS
+from .board import Board
+from .types import Side, Move, MOVE_SQUARES_MASK
+from .zobrist import PIECE_KEYS, SIDE_TO_MOVE_KEY
+
+
+BOOK_MAGIC = b"XQBK"
+BOOK_VERSION = 1
+DEFAULT_BOOK_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "opening_book.bin"
+)
+DEFAULT_MAX_PLY = 24
+
+_HEADER = struct.Struct("<4sH2xI")
+_RECORD = struct.Struct("<QHH")
+_KEY = struct.Struct("<Q")
+_LAST_SQ = BOARD_COLS * BOARD_ROWS - 1
+_RESULT_WEIGHTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}
+
+
+def book_key(board: Board, side: Side) -> int:
+    """Key of `board` with `side` to move, as seen with red on the bottom."""
+    if board.red_on_bottom:
+        key = board.zobrist_key
+        if board.side_to_move is not side:
+            key ^= SIDE_TO_MOVE_KEY
+        return key
+    key = 0
+    grid = board.grid
+    for squares in board.piece_squares:
+        for sq in squares:
+            key ^= PIECE_KEYS[grid[sq // BOARD_COLS][sq % BOARD_COLS].code][_LAST_SQ - sq]
+    if side is Side.BLACK:
+        key ^= SIDE_TO_MOVE_KEY
+    return key
+
+
+def _rotate(move: int) -> int:
+    """Turn the from/to bits of a move by 180 degrees."""
+    return (_LAST_SQ - (move & 0x7F)) | ((_LAST_SQ - ((move >> 7) & 0x7F)) << 7)
+
+
+class OpeningBook:
+    """Read-only view of a book file, memory-mapped."""
+
+    def __init__(self, path: str = DEFAULT_BOOK_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not an opening book (version {BOOK_VERSION})")
+        if len(self._map) != _HEADER.size + count * _RECORD.size:
+            self._map.close()
+            raise ValueError(f"{path} is truncated")
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+    def entries(self, key: int):
+        """Return ``[(move, weight), ...]`` stored for `key` (canonical orientation)."""
+        data = self._map
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _KEY.unpack_from(data, _HEADER.size + mid * _RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        for index in range(lo, self.count):
+            entry_key, move, weight = _RECORD.unpack_from(data, _HEADER.size + index * _RECORD.size)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+        return found
+
+    def probe(self, board: Board, side: Side):
+        """Book moves of `side` on `board` as ``[(from/to bits, weight), ...]`` in board orientation."""
+        found = self.entries(book_key(board, side))
+        if not board.red_on_bottom:
+            found = [(_rotate(move), weight) for move, weight in found]
+        return found
+
+    def choose(self, board: Board, side: Side, rng=random) -> int:
+        """Pick a book move (from/to bits) at random by weight; 0 if the position is not in the book."""
+        found = [(move, weight) for move, weight in self.probe(board, side) if weight > 0]
+        if not found:
+            return 0
+        pick = rng.uniform(0, sum(weight for _, weight in found))
+        for move, weight in found:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return found[-1][0]
+
+
+_opening_book = None
+_opening_book_loaded = False
+
+
+def get_opening_book():
+    """Return the book at `DEFAULT_BOOK_PATH`, opened on first use, or None if there is none."""
+    global _opening_book, _opening_book_loaded
+    if not _opening_book_loaded:
+        _opening_book_loaded = True
+        try:
+            _opening_book = OpeningBook(DEFAULT_BOOK_PATH)
+        except (OSError, ValueError):
+            _opening_book = None
+    return _opening_book
+
+
+# ----------------------------------------------------------------------
+# Builder
+# ----------------------------------------------------------------------
+def parse_iccs(token: str):
+    """Return ``((from_col, from_row), (to_col, to_row))`` of an ICCS move, red on the bottom."""
+    text = token.replace("-", "").lower()
+    if len(text) != 4 or not ("a" <= text[0] <= "i" and "a" <= text[2] <= "i"
+                              and text[1].isdigit() and text[3].isdigit()):
+        raise ValueError(f"not an ICCS move: {token!r}")
+    return ((ord(text[0]) - ord("a"), 9 - int(text[1])),
+            (ord(text[2]) - ord("a"), 9 - int(text[3])))
+
+
+def read_games(directory: str):
+    """Yield ``(source, [ICCS moves], result or None)`` for every game in the files of `directory`."""
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                tokens = line.split("#", 1)[0].split()
+                if not tokens:
+                    continue
+                result = tokens.pop() if tokens[-1] in _RESULT_WEIGHTS else None
+                yield f"{name}:{line_no}", tokens, result
+
+
+def build_book(directory: str, output: str = DEFAULT_BOOK_PATH, max_ply: int = DEFAULT_MAX_PLY):
+    """Compile the games in `directory` into a book file; return ``(games, positions, records)``.
+
+    Games stop contributing at their first illegal or unreadable move,
+    which is reported.
+    """
+    weights = {}
+    games = 0
+    for source, tokens, result in read_games(directory):
+        games += 1
+        red_weight, black_weight = _RESULT_WEIGHTS.get(result, (1, 1))
+        board = Board()
+        side = Side.RED
+        for token in tokens[:max_ply]:
+            try:
+                from_pos, to_pos = parse_iccs(token)
+            except ValueError as exc:
+                print(f"{source}: {exc}")
+                break
+            if to_pos not in board.generate_legal_moves(*from_pos, side):
+                print(f"{source}: illegal move {token}")
+                break
+            move = Move(from_pos, to_pos, board.get_piece(*from_pos), board.get_piece(*to_pos))
+            entry = (book_key(board, side), move.pack() & MOVE_SQUARES_MASK)
+            weights[entry] = weights.get(entry, 0) + (red_weight if side is Side.RED else black_weight)
+            board.move_piece(move)
+            side = Side.BLACK if side is Side.RED else Side.RED
+
+    records = sorted((key, move, min(weight, 0xFFFF)) for (key, move), weight in weights.items() if weight > 0)
+    with open(output, "wb") as f:
+        f.write(_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(records)))
+        for record in records:
+            f.write(_RECORD.pack(*record))
+    return games, len({key for key, _, _ in records}), len(records)
+
+
+def format_iccs(move: int) -> str:
+    """ICCS text (e.g. ``h2e2``) of the from/to bits of a move, red on the bottom."""
+    from_sq, to_sq = move & 0x7F, (move >> 7) & 0x7F
+    return "".join(
+        f"{chr(ord('a') + sq % BOARD_COLS)}{9 - sq // BOARD_COLS}" for sq in (from_sq, to_sq)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect the opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a directory of game records")
+    build.add_argument("directory")
+    build.add_argument("-o", "--output", default=DEFAULT_BOOK_PATH)
+    build.add_argument("--max-ply", type=int, default=DEFAULT_MAX_PLY,
+                       help="plies per game that enter the book")
+    probe = commands.add_parser("probe", help="list the book moves after some ICCS moves")
+    probe.add_argument("moves", nargs="*")
+    probe.add_argument("--book", default=DEFAULT_BOOK_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        games, positions, records = build_book(args.directory, args.output, args.max_ply)
+        print(f"{games} games -> {positions} positions, {records} moves in {args.output}")
+        return
+
+    book = OpeningBook(args.book)
+    board = Board()
+    side = Side.RED
+    for token in args.moves:
+        from_pos, to_pos = parse_iccs(token)
+        board.move_piece(Move(from_pos, to_pos, board.get_piece(*from_pos), board.get_piece(*to_pos)))
+        side = Side.BLACK if side is Side.RED else Side.RED
+    entries = sorted(book.probe(board, side), key=lambda item: item[1], reverse=True)
+    if not entries:
+        print("position not in book")
+    for move, weight in entries:
+        print(f"{format_iccs(move)}  {weight}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Perft: exhaustive move-generation counts for correctness and speed.
+
+`perft(depth)` counts the leaves of the legal move tree; any change to move
+generation, make/unmake or check detection that alters a count is a bug.
+Known counts live in `data/perft_reference.json`::
+
+    python -m core.engine.perft                   # check all positions to depth 3
+    python -m core.engine.perft --depth 4 --position start
+    python -m core.engine.perft --divide --position open-files --depth 2
+    python -m core.engine.perft --write-reference --depth 4
+    python -m core.engine.perft --fen "3k5/9/9/9/9/9/9/9/9/R3K4 w" --depth 3
+
+The start position counts (44, 1920, 79666, 3290240) match the published
+Xiangqi perft values.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from core.engine.benchmark import BACKENDS, BENCHMARK_POSITIONS, build_position
+
+REFERENCE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data",
+    "perft_reference.json",
+)
+
+# Same move-sequence format as the benchmark positions, plus positions that
+# stress checks, cannon screens and rooks deep in the enemy camp.
+# "cannon-check" leaves black in check through a cannon screen.
+PERFT_POSITIONS = dict(BENCHMARK_POSITIONS)
+PERFT_POSITIONS.update({
+    "cannon-check": [
+        ((7, 7), (4, 7)), ((7, 2), (4, 2)),
+        ((4, 7), (4, 3)),
+    ],
+    "rook-raid": [
+        ((0, 6), (0, 5)), ((8, 3), (8, 4)),
+        ((0, 9), (0, 8)), ((8, 0), (8, 1)),
+        ((0, 8), (3, 8)), ((8, 1), (5, 1)),
+        ((3, 8), (3, 3)), ((5, 1), (5, 6)),
+        ((3, 3), (2, 3)),
+    ],
+})
+
+
+def load_reference(path=REFERENCE_PATH):
+    """Return ``{position: [count at depth 1, depth 2, ...]}`` (empty if missing)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["positions"]
+
+
+def write_reference(counts, path=REFERENCE_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"positions": counts}, f, indent=2)
+        f.write("\n")
+
+
+def run_perft(board_cls, moves, depth):
+    """Return ``(nodes, seconds)`` for perft(`depth`) on the given position."""
+    board, side = build_position(board_cls, moves)
+    start = time.perf_counter()
+    nodes = board.perft(depth, side)
+    return nodes, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count move-generation leaves and check them against the reference.")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--backend", choices=sorted(BACKENDS) + ["all"], default="all")
+    parser.add_argument("--position", choices=sorted(PERFT_POSITIONS), action="append",
+                        help="position to run (repeatable, default: all)")
+    parser.add_argument("--fen", action="append",
+                        help="run this FEN position instead (repeatable; not checked against the reference)")
+    parser.add_argument("--divide", action="store_true", help="print the count below every root move")
+    parser.add_argument("--write-reference", action="store_true",
+                        help="store counts for depths 1..DEPTH instead of checking them")
+    args = parser.parse_args(argv)
+
+    names = list(BACKENDS) if args.backend == "all" else [args.backend]
+
+    if args.fen:
+        print(f"{'backend':<10} {'depth':>5} {'nodes':>10} {'seconds':>9}  fen")
+        for name in names:
+            for fen in args.fen:
+                board = BACKENDS[name].from_fen(fen)
+                start = time.perf_counter()
+                nodes = board.perft(args.depth)
+                print(f"{name:<10} {args.depth:>5} {nodes:>10} {time.perf_counter() - start:>9.2f}  {fen}")
+        return 0
+    positions = args.position or list(PERFT_POSITIONS)
+
+    if args.divide:
+        for pos_name in positions:
+            board, side = build_position(BACKENDS[names[0]], PERFT_POSITIONS[pos_name])
+            counts = board.divide(args.depth, side)
+            print(f"{pos_name} depth {args.depth}")
+            for (from_pos, to_pos), nodes in sorted(counts.items()):
+                print(f"  {from_pos} -> {to_pos}: {nodes}")
+            print(f"  total: {sum(counts.values())}")
+        return 0
+
+    if args.write_reference:
+        reference = load_reference()
+        for pos_name in positions:
+            board, side = build_position(BACKENDS[names[0]], PERFT_POSITIONS[pos_name])
+            reference[pos_name] = [board.perft(d, side) for d in range(1, args.depth + 1)]
+            print(f"{pos_name}: {reference[pos_name]}")
+        write_reference(reference)
+        return 0
+
+    reference = load_reference()
+    failed = False
+    print(f"{'backend':<10} {'position':<16} {'depth':>5} {'nodes':>10} {'seconds':>9} {'nodes/sec':>11}  result")
+    for name in names:
+        for pos_name in positions:
+            nodes, seconds = run_perft(BACKENDS[name], PERFT_POSITIONS[pos_name], args.depth)
+            expected = reference.get(pos_name, [])
+            if args.depth > len(expected):
+                result = "no reference"
+            elif nodes == expected[args.depth - 1]:
+                result = "ok"
+            else:
+                result = f"MISMATCH (expected {expected[args.depth - 1]})"
+                failed = True
+            nps = nodes / seconds if seconds > 0 else 0.0
+            print(f"{name:<10} {pos_name:<16} {args.depth:>5} {nodes:>10} {seconds:>9.2f} {nps:>11.0f}  {result}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,491 @@
+"""Endgame tablebases: exact results for positions with little material.
+
+A table covers one material signature, named like ``KRvKAA``: the strong
+side's pieces, ``v``, the weak side's pieces, in FEN letters (K general,
+R rook, N horse, C cannon, P soldier, A advisor, B elephant). It stores, for
+every placement of those pieces and either side to move, whether the side
+to move wins, draws or loses and in how many plies the game ends in mate.
+
+Tables are built by retrograde analysis::
+
+    python -m core.engine.tablebase generate              # the default set
+    python -m core.engine.tablebase generate KRvKAA KNPvK
+
+Every legal position gets its moves generated once: captures lead into
+smaller tables (built first when missing) or to insufficient material, the
+other moves to positions of the same table. Starting from the checkmates,
+the results are then propagated backwards one ply at a time, so each
+position is settled with its shortest win or longest loss. Positions never
+settled are draws. As in the search, only checkmate wins: a side without
+legal moves that is not in check draws. Repetition rules are ignored.
+
+File format: header (4s magic b"XQTB", H version, 2 pad bytes, 16s name,
+I size) and one byte per position index: 0 for a draw (or an illegal
+placement), otherwise the distance to mate in plies plus one; odd
+distances are wins for the side to move, even ones losses. Positions are
+indexed with the strong side at the bottom of the board as red; a board
+with the strong side on top, or black strong, is rotated / recoloured on
+lookup. Each piece only ranges over the squares it can reach (palace,
+elephant points, the soldier's forward squares), so ``KRvKAA`` needs
+365 KB.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from config import BOARD_COLS, BOARD_ROWS
+from .board import Board
+from .types import Side, PieceType, Piece, SIDE_INDEX
+
+DEFAULT_TABLEBASE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "tablebases"
+)
+DEFAULT_TABLES = ("KRvK", "KRvKA", "KRvKB", "KRvKAA", "KCAvK", "KNPvK")
+TB_MAGIC = b"XQTB"
+TB_VERSION = 1
+TB_SUFFIX = ".xtb"
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+_HEADER = struct.Struct("<4sH2x16sI")
+_SIDES = (Side.RED, Side.BLACK)
+_LAST_SQ = BOARD_COLS * BOARD_ROWS - 1
+_LETTERS = {
+    PieceType.ROOK: "R", PieceType.HORSE: "N", PieceType.CANNON: "C",
+    PieceType.SOLDIER: "P", PieceType.ADVISOR: "A", PieceType.ELEPHANT: "B",
+}
+_LETTER_ORDER = "RNCPAB"
+_TYPES = {letter: ptype for ptype, letter in _LETTERS.items()}
+_ATTACKERS = "RNCP"
+
+
+def _side_name(pieces) -> str:
+    """Name of one side's material, e.g. "KRAA", from ``{ptype: [squares]}``; None without a general."""
+    if PieceType.GENERAL not in pieces:
+        return None
+    letters = [_LETTERS[ptype] * len(squares) for ptype, squares in pieces.items()
+               if ptype is not PieceType.GENERAL]
+    return "K" + "".join(sorted("".join(letters), key=_LETTER_ORDER.index))
+
+
+def _reachable_squares(side: Side, ptype: PieceType):
+    """Squares a piece of `side` can ever stand on, with red at the bottom."""
+    board = Board()
+    side_idx = SIDE_INDEX[side]
+    starts = [sq for sq in board.piece_squares[side_idx]
+              if board.grid[sq // BOARD_COLS][sq % BOARD_COLS].ptype is ptype]
+    piece = Piece(side, ptype)
+    board.grid = [[None] * BOARD_COLS for _ in range(BOARD_ROWS)]
+    seen = set(starts)
+    todo = list(starts)
+    while todo:
+        sq = todo.pop()
+        c, r = sq % BOARD_COLS, sq // BOARD_COLS
+        board.grid[r][c] = piece
+        for nc, nr in board.generate_moves_for_square(c, r):
+            target = nr * BOARD_COLS + nc
+            if target not in seen:
+                seen.add(target)
+                todo.append(target)
+        board.grid[r][c] = None
+    return tuple(sorted(seen))
+
+
+_DOMAINS = {}
+
+
+def _domain(side_idx: int, ptype: PieceType):
+    key = (side_idx, ptype)
+    if key not in _DOMAINS:
+        _DOMAINS[key] = _reachable_squares(_SIDES[side_idx], ptype)
+    return _DOMAINS[key]
+
+
+class TableLayout:
+    """How the positions of one material signature are numbered.
+
+    Pieces are ordered red general, black general, then the strong and the
+    weak side's pieces in name order; each contributes its index within
+    its domain as one digit of a mixed-radix number, and the side to move
+    (0 = strong) is the last bit. Identical pieces are listed with their
+    squares in ascending order, so only one of their permutations is used.
+    """
+
+    def __init__(self, name: str):
+        strong, sep, weak = name.partition("v")
+        if (not sep or not strong.startswith("K") or not weak.startswith("K")
+                or any(letter not in _TYPES for letter in strong[1:] + weak[1:])):
+            raise ValueError(f"bad table name {name!r} (expected e.g. 'KRvKAA')")
+        self.name = "K" + "".join(sorted(strong[1:], key=_LETTER_ORDER.index)) \
+            + "vK" + "".join(sorted(weak[1:], key=_LETTER_ORDER.index))
+        self.strong_name = self.name.split("v")[0]
+        self.weak_name = self.name.split("v")[1]
+        # (side index, piece type, first slot, count) per group of identical pieces.
+        self.groups = [(0, PieceType.GENERAL, 0, 1), (1, PieceType.GENERAL, 1, 1)]
+        slot = 2
+        for side_idx, letters in ((0, self.strong_name[1:]), (1, self.weak_name[1:])):
+            for letter in _LETTER_ORDER:
+                count = letters.count(letter)
+                if count:
+                    self.groups.append((side_idx, _TYPES[letter], slot, count))
+                    slot += count
+        self.slots = [(side_idx, ptype) for side_idx, ptype, _, count in self.groups for _ in range(count)]
+        self.domains = [_domain(side_idx, ptype) for side_idx, ptype in self.slots]
+        self.slot_index = [{sq: i for i, sq in enumerate(domain)} for domain in self.domains]
+        self.size = math.prod(len(domain) for domain in self.domains) * 2
+
+    def index(self, squares, stm: int) -> int:
+        """Index of the pieces on `squares` (slot order), -1 if a piece is off its domain."""
+        index = 0
+        for slot_index, sq in zip(self.slot_index, squares):
+            i = slot_index.get(sq)
+            if i is None:
+                return -1
+            index = index * len(slot_index) + i
+        return index * 2 + stm
+
+    def squares(self, index: int):
+        """Inverse of `index`: ``(squares, stm)``."""
+        stm = index & 1
+        index >>= 1
+        squares = [0] * len(self.domains)
+        for slot in range(len(self.domains) - 1, -1, -1):
+            domain = self.domains[slot]
+            index, i = divmod(index, len(domain))
+            squares[slot] = domain[i]
+        return squares, stm
+
+    def sub_tables(self):
+        """Names of the signatures one capture away that still have mating material."""
+        names = set()
+        for side_idx, part in ((0, self.strong_name), (1, self.weak_name)):
+            for letter in set(part[1:]):
+                rest = part.replace(letter, "", 1)
+                strong, weak = (rest, self.weak_name) if side_idx == 0 else (self.strong_name, rest)
+                if not any(letter in _ATTACKERS for letter in strong + weak):
+                    continue
+                if not any(letter in _ATTACKERS for letter in strong):
+                    strong, weak = weak, strong
+                names.add(f"{strong}v{weak}")
+        return sorted(names)
+
+
+class Tablebase:
+    """One table file, memory-mapped."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, name, size = _HEADER.unpack_from(self._map, 0)
+        if magic != TB_MAGIC or version != TB_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a tablebase (version {TB_VERSION})")
+        self.layout = TableLayout(name.rstrip(b"\0").decode("ascii"))
+        if size != self.layout.size or len(self._map) != _HEADER.size + size:
+            self._map.close()
+            raise ValueError(f"{path} does not match its signature")
+        self.name = self.layout.name
+
+    def value(self, index: int) -> int:
+        return self._map[_HEADER.size + index]
+
+    def close(self):
+        self._map.close()
+
+
+def decode_value(value: int):
+    """``(result, plies to mate)`` of a stored byte, from the side to move's view."""
+    if value == 0:
+        return DRAW, 0
+    dtm = value - 1
+    return (WIN if dtm & 1 else LOSS), dtm
+
+
+class Tablebases:
+    """The tables of a directory, probed by material signature."""
+
+    def __init__(self, directory: str = DEFAULT_TABLEBASE_DIR):
+        self.directory = directory
+        self.tables = {}
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(TB_SUFFIX):
+                    self.add(Tablebase(os.path.join(directory, name)))
+
+    def add(self, table):
+        self.tables[table.name] = table
+
+    @property
+    def max_pieces(self) -> int:
+        """Most pieces (generals included) on the board in any table; 0 without tables."""
+        return max((len(table.layout.slots) for table in self.tables.values()), default=0)
+
+    def _locate(self, board: Board, side: Side):
+        """``(table, index)`` of `board` with `side` to move, or None if no table has it."""
+        grid = board.grid
+        by_side = ({}, {})
+        for side_idx in (0, 1):
+            found = by_side[side_idx]
+            for sq in board.piece_squares[side_idx]:
+                found.setdefault(grid[sq // BOARD_COLS][sq % BOARD_COLS].ptype, []).append(sq)
+        red, black = _side_name(by_side[0]), _side_name(by_side[1])
+        if red is None or black is None:
+            return None
+        strong = 0
+        table = self.tables.get(f"{red}v{black}")
+        if table is None:
+            strong = 1
+            table = self.tables.get(f"{black}v{red}")
+            if table is None:
+                return None
+        flip = (strong == 0) != board.red_on_bottom
+        squares = []
+        for side_idx, ptype, _, _ in table.layout.groups:
+            group = by_side[side_idx ^ strong][ptype]
+            if flip:
+                group = [_LAST_SQ - sq for sq in group]
+            squares.extend(sorted(group))
+        stm = 0 if SIDE_INDEX[side] == strong else 1
+        return table, table.layout.index(squares, stm)
+
+    def probe(self, board: Board, side: Side):
+        """``(result, plies to mate)`` for `side` to move on `board`, or None if no table covers it."""
+        found = self._locate(board, side)
+        if found is None or found[1] < 0:
+            return None
+        table, index = found
+        return decode_value(table.value(index))
+
+    def best_move(self, board: Board, moves, side: Side):
+        """The best of the packed `moves` by the tables: ``(move, result, plies to mate)``.
+
+        Wins as fast and loses as slowly as possible. Returns None unless
+        every move leads into a table or to insufficient material.
+        """
+        other = Side.BLACK if side is Side.RED else Side.RED
+        best = None
+        best_key = None
+        for move in moves:
+            board.apply_packed_move(move)
+            try:
+                found = self.probe(board, other)
+                if found is None and board.is_insufficient_material():
+                    found = (DRAW, 0)
+            finally:
+                board.undo_packed_move(move)
+            if found is None:
+                return None
+            result, dtm = -found[0], found[1] + 1
+            key = (result, -dtm if result == WIN else dtm)
+            if best_key is None or key > best_key:
+                best, best_key = (move, result, dtm if result != DRAW else 0), key
+        return best
+
+
+_tablebases = None
+_tablebases_loaded = False
+
+
+def get_tablebases():
+    """Return the tables in `DEFAULT_TABLEBASE_DIR`, loaded on first use, or None if there are none."""
+    global _tablebases, _tablebases_loaded
+    if not _tablebases_loaded:
+        _tablebases_loaded = True
+        try:
+            tablebases = Tablebases(DEFAULT_TABLEBASE_DIR)
+        except (OSError, ValueError):
+            tablebases = None
+        _tablebases = tablebases if tablebases is not None and tablebases.tables else None
+    return _tablebases
+
+
+# ----------------------------------------------------------------------
+# Generator
+# ----------------------------------------------------------------------
+class _MemoryTable:
+    """A freshly generated table, usable by `Tablebases` before it is written."""
+
+    def __init__(self, layout: TableLayout, values: bytearray):
+        self.layout = layout
+        self.name = layout.name
+        self.values = values
+
+    def value(self, index: int) -> int:
+        return self.values[index]
+
+
+def _place(board: Board, layout: TableLayout, squares):
+    """Put the pieces of `layout` on `squares` of an empty board.
+
+    Only the grid, `piece_squares` and `general_pos` are set, which is all
+    move generation reads; the hash and evaluation are left stale.
+    """
+    grid = board.grid
+    board.piece_squares = (set(), set())
+    for (side_idx, ptype), sq in zip(layout.slots, squares):
+        grid[sq // BOARD_COLS][sq % BOARD_COLS] = Piece(_SIDES[side_idx], ptype)
+        board.piece_squares[side_idx].add(sq)
+    board.general_pos = {
+        Side.RED: (squares[0] % BOARD_COLS, squares[0] // BOARD_COLS),
+        Side.BLACK: (squares[1] % BOARD_COLS, squares[1] // BOARD_COLS),
+    }
+
+
+def generate_table(name: str, tablebases: Tablebases) -> bytearray:
+    """Run the retrograde analysis for `name` and return its values.
+
+    `tablebases` must already hold the tables of `TableLayout.sub_tables`.
+    """
+    layout = TableLayout(name)
+    size = layout.size
+    values = bytearray(size)
+    # Per position: children not yet known to be won for the opponent.
+    remaining = array("H", bytes(2 * size))
+    parents, children = array("I"), array("I")
+    # settled[d]: positions whose result is mate in d plies; external[d]:
+    # (position, child result) for captures into other tables.
+    settled = {0: []}
+    external = {}
+    identical = [(first, first + count) for _, _, first, count in layout.groups if count > 1]
+
+    board = Board()
+    board.grid = [[None] * BOARD_COLS for _ in range(BOARD_ROWS)]
+    for placement in range(0, size, 2):
+        squares, _ = layout.squares(placement)
+        if len(set(squares)) != len(squares) or any(
+                squares[i] >= squares[i + 1] for first, end in identical for i in range(first, end - 1)):
+            continue
+        _place(board, layout, squares)
+        slot_of = {sq: slot for slot, sq in enumerate(squares)}
+        for stm in (0, 1):
+            side, other = _SIDES[stm], _SIDES[stm ^ 1]
+            if board.is_in_check(other):
+                continue
+            index = placement | stm
+            moves = board.generate_packed_moves(side)
+            if not moves:
+                if board.is_in_check(side):
+                    values[index] = 1
+                    settled[0].append(index)
+                continue
+            remaining[index] = len(moves)
+            for move in moves:
+                if move >> 18:
+                    board.apply_packed_move(move)
+                    try:
+                        found = tablebases.probe(board, other)
+                        if found is None:
+                            if not board.is_insufficient_material():
+                                raise ValueError(f"{layout.name} needs the tables {layout.sub_tables()}")
+                            found = (DRAW, 0)
+                    finally:
+                        board.undo_packed_move(move)
+                    if found[0] != DRAW:
+                        external.setdefault(found[1], []).append((index, found[0]))
+                    continue
+                child = list(squares)
+                child[slot_of[move & 0x7F]] = (move >> 7) & 0x7F
+                for first, end in identical:
+                    child[first:end] = sorted(child[first:end])
+                parents.append(index)
+                children.append(layout.index(child, stm ^ 1))
+        for sq in squares:
+            board.grid[sq // BOARD_COLS][sq % BOARD_COLS] = None
+
+    # Predecessor lists, grouped by child: preds[starts[c]:starts[c + 1]].
+    starts = array("I", bytes(4 * (size + 1)))
+    for child in children:
+        starts[child + 1] += 1
+    for i in range(size):
+        starts[i + 1] += starts[i]
+    fill = array("I", starts)
+    preds = array("I", bytes(4 * len(children)))
+    for parent, child in zip(parents, children):
+        preds[fill[child]] = parent
+        fill[child] += 1
+    del parents, children, fill
+
+    # Positions settled at distance d are lost if d is even and won if odd;
+    # their predecessors are settled at d + 1.
+    dtm = 0
+    while settled or external:
+        child_result = WIN if dtm & 1 else LOSS
+        events = [(parent, child_result)
+                  for child in settled.pop(dtm, ()) for parent in preds[starts[child]:starts[child + 1]]]
+        events.extend(external.pop(dtm, ()))
+        newly = []
+        for parent, child_result in events:
+            if values[parent]:
+                continue
+            if child_result == WIN:
+                remaining[parent] -= 1
+                if remaining[parent]:
+                    continue
+            if dtm + 2 > 255:
+                raise ValueError(f"{layout.name}: mate distance exceeds the file format")
+            values[parent] = dtm + 2
+            newly.append(parent)
+        if newly:
+            settled[dtm + 1] = newly
+        dtm += 1
+    return values
+
+
+def write_table(path: str, layout: TableLayout, values: bytearray):
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(TB_MAGIC, TB_VERSION, layout.name.encode("ascii"), layout.size))
+        f.write(values)
+
+
+def generate(names, directory: str = DEFAULT_TABLEBASE_DIR, log=print):
+    """Build the tables `names` (and any smaller ones they need) that `directory` lacks."""
+    os.makedirs(directory, exist_ok=True)
+    tablebases = Tablebases(directory)
+
+    def build(name):
+        layout = TableLayout(name)
+        if layout.name in tablebases.tables:
+            return
+        for sub in layout.sub_tables():
+            strong, weak = sub.split("v")
+            if f"{weak}v{strong}" not in tablebases.tables:
+                build(sub)
+        start = time.perf_counter()
+        values = generate_table(layout.name, tablebases)
+        write_table(os.path.join(directory, layout.name + TB_SUFFIX), layout, values)
+        tablebases.add(_MemoryTable(layout, values))
+        counts = {WIN: 0, LOSS: 0}
+        longest = 0
+        for value in values:
+            if value:
+                result, dtm = decode_value(value)
+                counts[result] += 1
+                longest = max(longest, dtm)
+        log(f"{layout.name}: {layout.size} positions, {counts[WIN]} won / {counts[LOSS]} lost "
+            f"for the side to move, longest mate {longest} plies ({time.perf_counter() - start:.1f}s)")
+
+    for name in names:
+        build(name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Xiangqi endgame tablebases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gen = commands.add_parser("generate", help="build tables (and the smaller ones they need)")
+    gen.add_argument("names", nargs="*", default=list(DEFAULT_TABLES),
+                     help="material signatures such as KRvKAA (default: %(default)s)")
+    gen.add_argument("--dir", default=DEFAULT_TABLEBASE_DIR)
+    args = parser.parse_args(argv)
+    generate(args.names, args.dir)
+
+
+if __name__ == "__main__":
+    main()
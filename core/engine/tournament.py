@@ -0,0 +1,408 @@
+"""Self-play tournaments between AI levels or engine builds.
+
+Plays engine configurations against each other headless, in parallel
+across CPU cores, and reports the Elo difference::
+
+    python -m core.engine.tournament 6 5 --games 200 --movetime 300
+    python -m core.engine.tournament 6 "ucci:cd ../old-checkout && python -m core.engine.ucci"
+    python -m core.engine.tournament --calibrate --games 400 --write-elo
+
+A player is an `AI_LEVELS` number (searched in-process with
+`choose_ai_move`, its own transposition table per game and root
+parallelism off, since games already run in parallel) or ``ucci:<shell
+command>`` for any UCCI engine, e.g. another checkout of this repository.
+
+Games start from the opening suite, the first `--opening-plies` plies of
+the game records in ``data/openings``, each played twice with colours
+swapped. A game ends on checkmate, and is adjudicated like the desktop
+game on repetition (the perpetual checker loses, otherwise a draw) and
+insufficient material, and as a draw after `--max-plies` plies or on
+stalemate (as in the search). An illegal move or no move loses.
+
+The match report gives the Elo difference of the first player with a 95%
+error margin. Unless ``--no-sprt``, the match stops as soon as the
+sequential probability ratio test decides between H0 (difference
+`--elo0`) and H1 (`--elo1`) at the error rates `--alpha` / `--beta`.
+``--calibrate`` plays each level against the next one, chains the
+differences from level 1's current rating and prints new `elo` values for
+`AI_LEVELS` (which `profiles_manager.apply_game_result_to_profiles` rates
+players against); ``--write-elo`` stores them in ``data/ai_elo.json``,
+which `AI_LEVELS` loads on import (`ai_engine.load_level_elo`). Ratings
+only mean something at the levels' own time budgets (no `--movetime` or
+`--depth`) and with enough games to separate neighbouring levels;
+ratings that do not rise with the level are never written.
+
+Error margins and the SPRT use the per-game score variance with a prior
+of one win, one draw and one loss added, so a handful of identical
+results (all draws, say) does not read as a precise zero.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core.engine.ai_engine import AI_ELO_PATH, AI_LEVELS, choose_ai_move, resolve_workers
+from core.engine.bitboard import BitboardBoard
+from core.engine.board import START_FEN
+from core.engine.constants import REPETITION_LIMIT
+from core.engine.opening_book import format_iccs, parse_iccs, read_games
+from core.engine.transposition import TranspositionTable
+from core.engine.types import Side, Move
+
+OPENINGS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "openings"
+)
+DEFAULT_OPENING_PLIES = 4
+DEFAULT_MAX_PLIES = 300
+# Time per move given to UCCI players when neither --movetime nor --depth is set.
+DEFAULT_UCCI_MOVETIME = 1000
+
+
+# ----------------------------------------------------------------------
+# Players
+# ----------------------------------------------------------------------
+class LevelPlayer:
+    """An `AI_LEVELS` entry searched in this process."""
+
+    def __init__(self, level: int, movetime=None, depth=None):
+        self.name = f"L{level}"
+        cfg = dict(AI_LEVELS[level - 1])
+        cfg.pop("workers", None)
+        if depth:
+            cfg["depth"] = depth
+            cfg.pop("time_ms", None)
+        elif movetime:
+            cfg["time_ms"] = movetime
+        self.cfg = cfg
+        self.tt = TranspositionTable()
+
+    def move(self, board, side: Side, iccs_moves):
+        return choose_ai_move(board, self.cfg, side, tt=self.tt)
+
+    def close(self):
+        pass
+
+
+class UCCIPlayer:
+    """An external engine speaking UCCI, started with a shell command."""
+
+    def __init__(self, command: str, movetime=None, depth=None):
+        self.name = command
+        self.movetime = movetime or DEFAULT_UCCI_MOVETIME
+        self.depth = depth
+        self.proc = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, text=True, bufsize=1)
+        self._send("ucci")
+        self._read_until("ucciok")
+
+    def _send(self, line: str):
+        self.proc.stdin.write(line + "\n")
+        self.proc.stdin.flush()
+
+    def _read_until(self, *prefixes):
+        for line in self.proc.stdout:
+            if line.startswith(prefixes):
+                return line.split()
+        raise RuntimeError(f"UCCI engine {self.name!r} exited")
+
+    def move(self, board, side: Side, iccs_moves):
+        self._send(f"position fen {START_FEN}" + (" moves " + " ".join(iccs_moves) if iccs_moves else ""))
+        if self.depth:
+            self._send(f"go depth {self.depth}")
+        else:
+            self._send(f"go time {self.movetime + 50} movestogo 1")
+        reply = self._read_until("bestmove", "nobestmove")
+        if reply[0] == "nobestmove" or len(reply) < 2:
+            return None
+        from_pos, to_pos = parse_iccs(reply[1])
+        return Move(from_pos, to_pos, board.get_piece(*from_pos), board.get_piece(*to_pos))
+
+    def close(self):
+        try:
+            self._send("quit")
+            self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+
+
+def make_player(spec: str, movetime=None, depth=None):
+    """Player for a spec: a level number or ``ucci:<command>``."""
+    if spec.startswith("ucci:"):
+        return UCCIPlayer(spec[len("ucci:"):], movetime, depth)
+    level = int(spec)
+    if not 1 <= level <= len(AI_LEVELS):
+        raise ValueError(f"no AI level {spec}")
+    return LevelPlayer(level, movetime, depth)
+
+
+def player_name(spec: str) -> str:
+    return spec if spec.startswith("ucci:") else f"L{spec}"
+
+
+# ----------------------------------------------------------------------
+# Games
+# ----------------------------------------------------------------------
+def load_openings(directory: str = OPENINGS_DIR, plies: int = DEFAULT_OPENING_PLIES):
+    """Distinct, legal `plies`-ply starts of the game records in `directory`."""
+    openings = []
+    seen = set()
+    for _, tokens, _ in read_games(directory):
+        line = tuple(token.replace("-", "").lower() for token in tokens[:plies])
+        if len(line) < plies or line in seen:
+            continue
+        board = BitboardBoard()
+        try:
+            for token in line:
+                from_pos, to_pos = parse_iccs(token)
+                if to_pos not in board.generate_legal_moves(*from_pos, board.side_to_move):
+                    raise ValueError(token)
+                board.move_piece(Move(from_pos, to_pos, board.get_piece(*from_pos), board.get_piece(*to_pos)))
+        except ValueError:
+            continue
+        seen.add(line)
+        openings.append(line)
+    return openings or [()]
+
+
+def _adjudicate(board, side: Side, plies: int, max_plies: int):
+    """``(red score, reason)`` if the game is over with `side` to move, else None."""
+    other_score = 1.0 if side is Side.BLACK else 0.0
+    if not board.has_any_legal_move(side):
+        if board.is_in_check(side):
+            return other_score, "mate"
+        return 0.5, "stalemate"
+    if board.repetition_count() >= REPETITION_LIMIT:
+        checker = board.perpetual_checker()
+        if checker is None:
+            return 0.5, "repetition"
+        return (0.0 if checker is Side.RED else 1.0), "perpetual check"
+    if board.is_insufficient_material():
+        return 0.5, "insufficient material"
+    if plies >= max_plies:
+        return 0.5, "move limit"
+    return None
+
+
+def play_game(opening, red_spec: str, black_spec: str, movetime=None, depth=None,
+              max_plies: int = DEFAULT_MAX_PLIES):
+    """Play one game; return ``(red score, plies, reason)``."""
+    board = BitboardBoard()
+    iccs_moves = []
+    players = {}
+    try:
+        players[Side.RED] = make_player(red_spec, movetime, depth)
+        players[Side.BLACK] = make_player(black_spec, movetime, depth)
+        for token in opening:
+            from_pos, to_pos = parse_iccs(token)
+            board.move_piece(Move(from_pos, to_pos, board.get_piece(*from_pos), board.get_piece(*to_pos)))
+            iccs_moves.append(token)
+        while True:
+            side = board.side_to_move
+            result = _adjudicate(board, side, len(iccs_moves), max_plies)
+            if result is not None:
+                return result[0], len(iccs_moves), result[1]
+            move = players[side].move(board, side, iccs_moves)
+            if move is None or move.to_pos not in board.generate_legal_moves(*move.from_pos, side):
+                return (0.0 if side is Side.RED else 1.0), len(iccs_moves), "illegal move"
+            board.move_piece(move)
+            iccs_moves.append(format_iccs(move.pack()))
+    finally:
+        for player in players.values():
+            player.close()
+
+
+# ----------------------------------------------------------------------
+# Statistics
+# ----------------------------------------------------------------------
+def _expected_score(elo: float) -> float:
+    return 1.0 / (1.0 + 10.0 ** (-elo / 400.0))
+
+
+def _elo(score: float) -> float:
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+# Pseudo-games (wins, draws, losses) added when estimating the variance of
+# a game's score: without them, identical results give a variance of 0.
+VARIANCE_PRIOR = (1, 1, 1)
+
+
+def _score_and_variance(wins: int, draws: int, losses: int):
+    games = wins + draws + losses
+    # Keep the score off 0 and 1, where the Elo difference is infinite.
+    score = min(max((wins + draws / 2) / games, 0.5 / games), 1 - 0.5 / games)
+    prior_wins, prior_draws, prior_losses = VARIANCE_PRIOR
+    wins, draws, losses = wins + prior_wins, draws + prior_draws, losses + prior_losses
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / (wins + draws + losses)
+    return score, variance
+
+
+def elo_difference(wins: int, draws: int, losses: int):
+    """``(Elo difference, 95% error margin)`` for the player with these results."""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, math.inf
+    score, variance = _score_and_variance(wins, draws, losses)
+    spread = 1.96 * math.sqrt(variance / games)
+    low = _elo(max(score - spread, 0.5 / games))
+    high = _elo(min(score + spread, 1 - 0.5 / games))
+    # (+ 0.0 turns the -0.0 of an even score into 0.0.)
+    return _elo(score) + 0.0, (high - low) / 2
+
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    """Log-likelihood ratio of H1 (difference `elo1`) over H0 (`elo0`), normal approximation."""
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    score, variance = _score_and_variance(wins, draws, losses)
+    s0, s1 = _expected_score(elo0), _expected_score(elo1)
+    return games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha: float, beta: float):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# ----------------------------------------------------------------------
+# Matches
+# ----------------------------------------------------------------------
+def run_match(spec_a: str, spec_b: str, games: int, workers: int = 0, movetime=None, depth=None,
+              max_plies: int = DEFAULT_MAX_PLIES, opening_plies: int = DEFAULT_OPENING_PLIES,
+              sprt=None, log=print):
+    """Play up to `games` games of `spec_a` against `spec_b`; return ``(wins, draws, losses)`` of A.
+
+    `sprt` is None or ``(elo0, elo1, alpha, beta)``; the match then stops
+    once the test accepts either hypothesis.
+    """
+    openings = load_openings(plies=opening_plies)
+    schedule = []
+    while len(schedule) < games:
+        for opening in openings:
+            schedule.append((opening, True))
+            schedule.append((opening, False))
+    schedule = schedule[:games]
+    name_a, name_b = player_name(spec_a), player_name(spec_b)
+    wins = draws = losses = 0
+    bounds = sprt_bounds(sprt[2], sprt[3]) if sprt else None
+
+    def record(a_is_red, result):
+        nonlocal wins, draws, losses
+        red_score, plies, reason = result
+        score = red_score if a_is_red else 1.0 - red_score
+        if score == 1.0:
+            wins += 1
+        elif score == 0.0:
+            losses += 1
+        else:
+            draws += 1
+        elo, margin = elo_difference(wins, draws, losses)
+        line = (f"game {wins + draws + losses}/{games}: {name_a} {'red' if a_is_red else 'black'} "
+                f"{score:g} ({reason}, {plies} plies)  +{wins} ={draws} -{losses}  elo {elo:+.1f} ± {margin:.1f}")
+        if bounds:
+            llr = sprt_llr(wins, draws, losses, sprt[0], sprt[1])
+            line += f"  llr {llr:.2f} [{bounds[0]:.2f}, {bounds[1]:.2f}]"
+            log(line)
+            return not bounds[0] < llr < bounds[1]
+        log(line)
+        return False
+
+    def task_args(opening, a_is_red):
+        red, black = (spec_a, spec_b) if a_is_red else (spec_b, spec_a)
+        return opening, red, black, movetime, depth, max_plies
+
+    workers = resolve_workers(workers)
+    if workers <= 1:
+        for opening, a_is_red in schedule:
+            if record(a_is_red, play_game(*task_args(opening, a_is_red))):
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(play_game, *task_args(opening, a_is_red)): a_is_red
+                       for opening, a_is_red in schedule}
+            for future in as_completed(futures):
+                if record(futures[future], future.result()):
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    elo, margin = elo_difference(wins, draws, losses)
+    summary = f"{name_a} vs {name_b}: +{wins} ={draws} -{losses}, Elo difference {elo:+.1f} ± {margin:.1f} (95%)"
+    if bounds:
+        llr = sprt_llr(wins, draws, losses, sprt[0], sprt[1])
+        verdict = "H1 accepted" if llr >= bounds[1] else "H0 accepted" if llr <= bounds[0] else "inconclusive"
+        summary += f", SPRT [{sprt[0]:g}, {sprt[1]:g}] llr {llr:.2f}: {verdict}"
+    log(summary)
+    return wins, draws, losses
+
+
+def calibrate(games: int, log=print, **match_options):
+    """Play every level against the next; return the chained ratings, level 1 keeping its own."""
+    ratings = [AI_LEVELS[0]["elo"]]
+    for level in range(2, len(AI_LEVELS) + 1):
+        wins, draws, losses = run_match(str(level), str(level - 1), games, log=log, **match_options)
+        ratings.append(round(ratings[-1] + elo_difference(wins, draws, losses)[0]))
+    for level, (cfg, rating) in enumerate(zip(AI_LEVELS, ratings), 1):
+        log(f"L{level}: elo {cfg['elo']} -> {rating}")
+    return ratings
+
+
+def write_elo(ratings, path: str = AI_ELO_PATH):
+    """Store `ratings` (level 1 first) where `ai_engine.load_level_elo` reads them.
+
+    Raises ValueError, writing nothing, unless there is one rating per
+    level and each level is rated above the one before.
+    """
+    if len(ratings) != len(AI_LEVELS):
+        raise ValueError(f"got {len(ratings)} ratings for {len(AI_LEVELS)} levels")
+    for level in range(1, len(ratings)):
+        if ratings[level] <= ratings[level - 1]:
+            raise ValueError(f"L{level + 1} is rated {ratings[level]}, not above "
+                             f"L{level} at {ratings[level - 1]}; play more games")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({str(level): int(rating) for level, rating in enumerate(ratings, 1)}, f, indent=2)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine configurations against each other.")
+    parser.add_argument("players", nargs="*", help="two players: AI level numbers or ucci:<command>")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=0, help="parallel games (0 = one per CPU core)")
+    parser.add_argument("--movetime", type=int, help="ms per move, instead of the levels' own budgets")
+    parser.add_argument("--depth", type=int, help="fixed search depth instead of a time budget")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES)
+    parser.add_argument("--opening-plies", type=int, default=DEFAULT_OPENING_PLIES)
+    parser.add_argument("--no-sprt", action="store_true", help="always play all games")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=20.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--calibrate", action="store_true", help="rate every AI level against the next")
+    parser.add_argument("--write-elo", action="store_true", help="with --calibrate: store the ratings in data/ai_elo.json")
+    args = parser.parse_args(argv)
+
+    options = dict(workers=args.workers, movetime=args.movetime, depth=args.depth,
+                   max_plies=args.max_plies, opening_plies=args.opening_plies)
+    if args.calibrate:
+        ratings = calibrate(args.games, **options)
+        if args.write_elo:
+            try:
+                write_elo(ratings)
+            except ValueError as e:
+                raise SystemExit(f"not writing {AI_ELO_PATH}: {e}")
+            print(f"updated {AI_ELO_PATH}")
+        return
+    if len(args.players) != 2:
+        parser.error("give two players, or --calibrate")
+    sprt = None if args.no_sprt else (args.elo0, args.elo1, args.alpha, args.beta)
+    run_match(args.players[0], args.players[1], args.games, sprt=sprt, **options)
+
+
+if __name__ == "__main__":
+    main()
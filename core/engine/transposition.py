@@ -0,0 +1,139 @@
+"""Fixed-size transposition table for the AI search.
+
+Entries live in two flat `array('Q')` buffers (key and packed data), so the
+memory use is fixed by the MB budget given at construction and does not grow
+with the number of positions searched. Every index holds a bucket of two
+slots:
+
+* slot 0 is *depth-preferred*: it is only overwritten by an equal or deeper
+  result, or by anything once the stored entry is from an older search;
+* slot 1 is *always-replace*: it takes whatever did not fit in slot 0.
+
+Scores are stored from the point of view of the side to move, so entries
+stay valid whichever side the AI is playing.
+
+Packed data layout (64 bits)::
+
+    bits  0-13  best move (from_sq | to_sq << 7), 0 when unknown
+    bits 14-15  bound type (EXACT / LOWER / UPPER), 0 marks an empty slot
+    bits 16-23  search depth
+    bits 24-31  search generation (for aging)
+    bits 32-63  score + SCORE_OFFSET
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Optional, Tuple
+
+EXACT = 1
+LOWER = 2  # score is a lower bound (fail high)
+UPPER = 3  # score is an upper bound (fail low)
+
+ENTRY_BYTES = 16  # 8-byte key + 8-byte packed data
+SCORE_OFFSET = 1 << 31
+DEFAULT_SIZE_MB = 16
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: float = DEFAULT_SIZE_MB):
+        self.resize(size_mb)
+
+    def resize(self, size_mb: float):
+        """Reallocate the table for a budget of `size_mb` megabytes (drops all entries)."""
+        self.size_mb = size_mb
+        self.num_buckets = max(1, int(size_mb * 1024 * 1024) // (2 * ENTRY_BYTES))
+        self.keys = array("Q", bytes(8 * 2 * self.num_buckets))
+        self.data = array("Q", bytes(8 * 2 * self.num_buckets))
+        self.generation = 0
+        self.reset_stats()
+
+    def clear(self):
+        """Drop all entries, keeping the allocation (e.g. when a new game starts)."""
+        empty = array("Q", bytes(8 * 2 * self.num_buckets))
+        self.keys[:] = empty
+        self.data[:] = empty
+        self.generation = 0
+        self.reset_stats()
+
+    def new_search(self):
+        """Start a new search generation so stale deep entries can be replaced."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        """Look up `key`; return ``(depth, bound, score, move)`` or None."""
+        i = (key % self.num_buckets) << 1
+        keys = self.keys
+        data = self.data
+        self.probes += 1
+        if keys[i] == key and data[i]:
+            entry = data[i]
+        elif keys[i + 1] == key and data[i + 1]:
+            entry = data[i + 1]
+        else:
+            self.misses += 1
+            if data[i] or data[i + 1]:
+                # The bucket is in use by other positions.
+                self.collisions += 1
+            return None
+        self.hits += 1
+        return (
+            (entry >> 16) & 0xFF,
+            (entry >> 14) & 0x3,
+            (entry >> 32) - SCORE_OFFSET,
+            entry & 0x3FFF,
+        )
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int = 0):
+        i = (key % self.num_buckets) << 1
+        keys = self.keys
+        data = self.data
+        old = data[i]
+        if not (
+            keys[i] == key
+            or not old
+            or depth >= (old >> 16) & 0xFF
+            or (old >> 24) & 0xFF != self.generation
+        ):
+            i += 1
+            old = data[i]
+        if old:
+            if keys[i] != key:
+                self.overwrites += 1
+            elif not move:
+                # Keep the known best move when the new result has none.
+                move = old & 0x3FFF
+        keys[i] = key
+        data[i] = (
+            move
+            | (bound << 14)
+            | (min(depth, 0xFF) << 16)
+            | (self.generation << 24)
+            | ((int(score) + SCORE_OFFSET) << 32)
+        )
+        self.stores += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Counters since the last `clear`/`reset_stats`, for sizing the table."""
+        used = sum(1 for entry in self.data if entry)
+        return {
+            "size_mb": self.size_mb,
+            "slots": 2 * self.num_buckets,
+            "used_slots": used,
+            "fill": used / (2 * self.num_buckets),
+            "probes": self.probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+        }
@@ -1,5 +1,7 @@
 from enum import Enum
 
+from config import BOARD_COLS
+
 class Side(Enum):
     RED = "red"
     BLACK = "black"
@@ -15,21 +17,103 @@ class PieceType(Enum):
     SOLDIER = "soldier"
 
 
+# Integer piece codes used by the engine internals (bitboards, hashing):
+# bit 3 holds the side (0 = red, 1 = black), bits 0-2 the piece type (1-7).
+PIECE_TYPE_ORDER = (
+    PieceType.GENERAL,
+    PieceType.ADVISOR,
+    PieceType.ELEPHANT,
+    PieceType.HORSE,
+    PieceType.ROOK,
+    PieceType.CANNON,
+    PieceType.SOLDIER,
+)
+TYPE_CODES = {ptype: i + 1 for i, ptype in enumerate(PIECE_TYPE_ORDER)}
+SIDE_INDEX = {Side.RED: 0, Side.BLACK: 1}
+
+
 class Piece:
-    def __init__(self, side: Side, ptype: PieceType):
-        self.side = side
-        self.ptype = ptype
+    """A piece kind. Instances are shared flyweights: `Piece(side, ptype)`
+    always returns the same object for the same arguments, so treat pieces as
+    immutable.
+    """
+
+    __slots__ = ("side", "ptype", "code")
+
+    def __new__(cls, side: Side, ptype: PieceType):
+        piece = _PIECE_CACHE.get((side, ptype))
+        if piece is None:
+            piece = object.__new__(cls)
+            piece.side = side
+            piece.ptype = ptype
+            piece.code = (SIDE_INDEX[side] << 3) | TYPE_CODES[ptype]
+            _PIECE_CACHE[(side, ptype)] = piece
+        return piece
+
+    def __reduce__(self):
+        # Unpickling goes through __new__ and so returns the shared instance.
+        return Piece, (self.side, self.ptype)
 
     def __repr__(self):
         return f"{self.side.value[0].upper()}-{self.ptype.value}"
 
 
+_PIECE_CACHE = {}
+
+# PIECES[code] is the shared Piece for an integer piece code (None for 0 and unused codes).
+PIECES = [None] * 16
+for _side in Side:
+    for _ptype in PIECE_TYPE_ORDER:
+        _piece = Piece(_side, _ptype)
+        PIECES[_piece.code] = _piece
+del _side, _ptype, _piece
+
+
+# Packed moves, used on the search path instead of `Move` objects:
+#
+#     bits  0-6   from square (row * BOARD_COLS + col)
+#     bits  7-13  to square
+#     bits 14-17  code of the moving piece
+#     bits 18-21  code of the captured piece, 0 for a quiet move
+#
+# The low 14 bits match the transposition-table move encoding. Xiangqi has
+# no promotions, castling or en passant, so no other flags are needed.
+MOVE_SQUARES_MASK = 0x3FFF
+
+
+def pack_move(from_sq: int, to_sq: int, piece_code: int, captured_code: int = 0) -> int:
+    return from_sq | (to_sq << 7) | (piece_code << 14) | (captured_code << 18)
+
+
 class Move:
+    __slots__ = ("from_pos", "to_pos", "piece", "captured")
+
     def __init__(self, from_pos, to_pos, piece, captured=None):
         self.from_pos = from_pos  # (col,row)
         self.to_pos = to_pos
         self.piece = piece
         self.captured = captured
 
+    def pack(self) -> int:
+        from_c, from_r = self.from_pos
+        to_c, to_r = self.to_pos
+        return pack_move(
+            from_r * BOARD_COLS + from_c,
+            to_r * BOARD_COLS + to_c,
+            self.piece.code,
+            self.captured.code if self.captured is not None else 0,
+        )
+
+    @classmethod
+    def from_packed(cls, move: int) -> "Move":
+        from_sq = move & 0x7F
+        to_sq = (move >> 7) & 0x7F
+        return cls(
+            (from_sq % BOARD_COLS, from_sq // BOARD_COLS),
+            (to_sq % BOARD_COLS, to_sq // BOARD_COLS),
+            PIECES[(move >> 14) & 0xF],
+            PIECES[(move >> 18) & 0xF],
+        )
+
     def __repr__(self):
         return f"{self.piece} {self.from_pos} -> {self.to_pos}"
@@ -0,0 +1,306 @@
+"""Headless UCCI engine on stdin/stdout.
+
+    python -m core.engine.ucci
+
+Speaks the UCCI protocol used by Xiangqi GUIs and tools, on top of
+`BitboardBoard` and `choose_ai_move`:
+
+* ``ucci`` -> ``id ...``, ``option ...``, ``ucciok``; ``isready`` -> ``readyok``
+* ``setoption level 1-8`` picks the `AI_LEVELS` entry whose search
+  features (quiescence, null move, LMR, tablebases) are used; ``setoption
+  usebook false`` turns the opening book off; ``setoption newgame`` clears
+  the transposition table (UCI-style ``setoption name X value Y`` works too)
+* ``position {fen <fen> | startpos} [moves <iccs> ...]``
+* ``go [ponder] [depth <d> | nodes <n> | time <ms> [increment <ms>]
+  [movestogo <n>] | infinite]``; ``stop`` ends the search
+* ``info depth .. score .. nodes .. nps .. time .. pv ..`` after every
+  depth, then ``bestmove <iccs>`` (``nobestmove`` without legal moves);
+  a found mate is reported as ``score mate <moves>`` (negative when the
+  engine is the one mated)
+* ``quit``
+
+``go infinite`` and ``go ponder`` never answer before ``stop`` (or
+``ponderhit``), even when the search ends early, e.g. on a mate. On
+``ponderhit`` the ponder search goes on, now with the time budget the
+``go ponder`` clock gives for a normal move, and answers when it runs out.
+
+The search runs on a thread so ``stop`` is read while it works. Moves are
+ICCS (``h2e2``) with red on the bottom, as is the board. Nothing here
+imports pygame.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+
+from core.engine.ai_engine import (
+    AI_LEVELS,
+    MATE_SCORE,
+    MAX_PLY,
+    TABLEBASE_WIN_SCORE,
+    SearchLimits,
+    choose_ai_move,
+    get_transposition_table,
+)
+from core.engine.bitboard import BitboardBoard
+from core.engine.board import START_FEN
+from core.engine.opening_book import format_iccs, parse_iccs
+from core.engine.types import Move, MOVE_SQUARES_MASK
+
+ENGINE_NAME = "Xiangqi-game"
+ENGINE_AUTHOR = "Black-Magus"
+DEFAULT_LEVEL = 6
+# Depth limit of time, node and infinite searches.
+MAX_DEPTH = MAX_PLY // 2
+# Share of the remaining clock spent on one move when the GUI gives no movestogo.
+DEFAULT_MOVES_TO_GO = 30
+# Tablebase wins score TABLEBASE_WIN_SCORE - dtm, the distance to mate
+# being stored in one byte.
+_TABLEBASE_SCORE_FLOOR = TABLEBASE_WIN_SCORE - 255
+
+
+def _format_score(score, pv_length: int) -> str:
+    """``score <cp>``, or ``score mate <moves>`` for a mate the line leads to.
+
+    Mates score a flat `MATE_SCORE`, so the distance is the length of the
+    principal variation, plus the tablebase distance for a line that ends
+    in a tablebase position.
+    """
+    magnitude = abs(score)
+    if magnitude >= MATE_SCORE:
+        plies = pv_length
+    elif magnitude > _TABLEBASE_SCORE_FLOOR:
+        plies = pv_length + int(TABLEBASE_WIN_SCORE - magnitude)
+    else:
+        return f"score {int(score)}"
+    # The side to move mates on odd plies and is mated on even ones.
+    moves = (plies + 1) // 2 if score > 0 else plies // 2
+    return f"score mate {moves if score > 0 else -moves}"
+
+
+def _parse_go(tokens):
+    """``go`` arguments as a dict of ints, plus ``infinite`` / ``ponder`` flags."""
+    args = {}
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ("infinite", "ponder"):
+            args[token] = True
+        elif i + 1 < len(tokens):
+            if tokens[i + 1] == "infinite":
+                args["infinite"] = True
+            else:
+                try:
+                    args[token] = int(tokens[i + 1])
+                except ValueError:
+                    pass
+            i += 1
+        i += 1
+    return args
+
+
+class UCCIEngine:
+    """Protocol state: the position, the options and the search thread."""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.level = DEFAULT_LEVEL
+        self.use_book = True
+        self.board = BitboardBoard.from_fen(START_FEN)
+        self.stop_flag = threading.Event()
+        # Cleared while ``go infinite`` / ``go ponder`` must hold back bestmove.
+        self.release = threading.Event()
+        # Time budget (ms) a ponder search gets on ``ponderhit``.
+        self.ponder_time_ms = None
+        self.pondering = False
+        self.timer = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def send(self, line: str):
+        with self._lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    # -- commands ------------------------------------------------------
+    def handle(self, line: str) -> bool:
+        """Run one command line; return False on ``quit``."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "ucci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option level type spin min 1 max {len(AI_LEVELS)} default {DEFAULT_LEVEL}")
+            self.send("option usebook type check default true")
+            self.send("option newgame type button")
+            self.send("ucciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.wait()
+            self.set_position(args)
+        elif command == "go":
+            self.wait()
+            self.go(_parse_go(args))
+        elif command == "stop":
+            self.stop_flag.set()
+            self.release.set()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stop_flag.set()
+            self.release.set()
+            self.wait()
+            return False
+        return True
+
+    def set_option(self, args):
+        if args and args[0] == "name":
+            # UCI style: setoption name <name> [value <value>]
+            name = args[1] if len(args) > 1 else ""
+            value = args[3] if len(args) > 3 and args[2] == "value" else ""
+        else:
+            name = args[0] if args else ""
+            value = args[1] if len(args) > 1 else ""
+        name = name.lower()
+        if name == "level":
+            try:
+                self.level = min(max(int(value), 1), len(AI_LEVELS))
+            except ValueError:
+                pass
+        elif name == "usebook":
+            self.use_book = value.lower() in ("true", "on", "1")
+        elif name == "newgame":
+            get_transposition_table().clear()
+
+    def set_position(self, args):
+        if not args:
+            return
+        if args[0] == "startpos":
+            fen, rest = START_FEN, args[1:]
+        elif args[0] == "fen":
+            end = args.index("moves") if "moves" in args else len(args)
+            fen, rest = " ".join(args[1:end]), args[end:]
+        else:
+            return
+        try:
+            board = BitboardBoard.from_fen(fen)
+        except ValueError as exc:
+            self.send(f"info string {exc}")
+            return
+        side = board.side_to_move
+        for token in rest[1:] if rest[:1] == ["moves"] else ():
+            try:
+                from_pos, to_pos = parse_iccs(token)
+            except ValueError as exc:
+                self.send(f"info string {exc}")
+                break
+            if to_pos not in board.generate_legal_moves(*from_pos, side):
+                self.send(f"info string illegal move {token}")
+                break
+            board.move_piece(Move(from_pos, to_pos, board.get_piece(*from_pos), board.get_piece(*to_pos)))
+            side = board.side_to_move
+        self.board = board
+
+    def go(self, args):
+        level_cfg = dict(AI_LEVELS[self.level - 1])
+        level_cfg["randomness"] = 0.0
+        level_cfg["eval_noise"] = 0
+        if not self.use_book:
+            level_cfg["book_plies"] = 0
+        side = self.board.side_to_move
+        time_ms = max_nodes = None
+        if "depth" in args:
+            level_cfg["depth"] = max(1, min(args["depth"], MAX_DEPTH))
+        else:
+            level_cfg["depth"] = MAX_DEPTH
+            if "nodes" in args:
+                max_nodes = args["nodes"]
+            elif "time" in args and not args.get("infinite"):
+                moves_to_go = args.get("movestogo") or DEFAULT_MOVES_TO_GO
+                time_ms = max(10, args["time"] // moves_to_go + args.get("increment", 0) * 3 // 4)
+                time_ms = min(time_ms, max(10, args["time"] - 50))
+        self.pondering = bool(args.get("ponder"))
+        self.ponder_time_ms = None
+        if self.pondering:
+            # The opponent's clock is running: search until ponderhit or stop.
+            self.ponder_time_ms, time_ms = time_ms, None
+        self.stop_flag.clear()
+        if args.get("infinite") or self.pondering:
+            self.release.clear()
+        else:
+            self.release.set()
+        limits = SearchLimits(time_ms, max_nodes, self.stop_flag)
+        self.thread = threading.Thread(
+            target=self._search, args=(self.board, level_cfg, side, limits), daemon=True
+        )
+        self.thread.start()
+
+    def ponderhit(self):
+        """The expected move was played: keep searching, now on the normal clock."""
+        if not self.pondering:
+            return
+        self.pondering = False
+        if self.ponder_time_ms is not None and not self.stop_flag.is_set():
+            self.timer = threading.Timer(self.ponder_time_ms / 1000.0, self.stop_flag.set)
+            self.timer.daemon = True
+            self.timer.start()
+        self.release.set()
+
+    def wait(self):
+        """Wait for the search in flight; an infinite or ponder search is stopped first."""
+        if self.thread is not None:
+            if not self.release.is_set():
+                self.stop_flag.set()
+                self.release.set()
+            self.thread.join()
+            self.thread = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    # -- search thread -------------------------------------------------
+    def _search(self, board, level_cfg, side, limits):
+        start = time.perf_counter()
+        # Principal variation of the deepest completed iteration, as packed moves.
+        last_pv = ()
+
+        def on_depth(depth, score, pv, nodes):
+            nonlocal last_pv
+            last_pv = pv
+            elapsed = max(time.perf_counter() - start, 1e-6)
+            line = " ".join(format_iccs(move) for move in pv)
+            self.send(f"info depth {depth} {_format_score(score, len(pv))} nodes {nodes} "
+                      f"nps {int(nodes / elapsed)} time {int(elapsed * 1000)} pv {line}")
+
+        move = choose_ai_move(board, level_cfg, side, limits=limits, on_depth=on_depth)
+        self.release.wait()
+        if move is None:
+            self.send("nobestmove")
+            return
+        best = format_iccs(move.pack())
+        pv = last_pv
+        if len(pv) > 1 and pv[0] & MOVE_SQUARES_MASK == move.pack() & MOVE_SQUARES_MASK:
+            self.send(f"bestmove {best} ponder {format_iccs(pv[1])}")
+        else:
+            self.send(f"bestmove {best}")
+
+
+def main():
+    engine = UCCIEngine()
+    for line in sys.stdin:
+        if not engine.handle(line.strip()):
+            break
+    engine.stop_flag.set()
+    engine.release.set()
+    engine.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Zobrist hashing for Xiangqi positions.
+
+A position key is the XOR of one 64-bit random number per (piece, square)
+plus `SIDE_TO_MOVE_KEY` when black is to move. Moving a piece therefore
+updates the key in O(1) by XOR-ing out the old square and XOR-ing in the new
+one, which `Board` does on every make/unmake.
+
+The tables come from a fixed seed so keys are stable across runs and can be
+stored on disk (opening books, analysis caches).
+"""
+
+from __future__ import annotations
+
+import random
+
+from config import BOARD_COLS, BOARD_ROWS
+from .types import Side
+
+NUM_SQUARES = BOARD_COLS * BOARD_ROWS
+
+_rng = random.Random(0x58_69_61_6E_67_71_69)
+
+# PIECE_KEYS[piece.code][row * BOARD_COLS + col]; unused codes stay None.
+PIECE_KEYS = [None] * 16
+for _side_bit in (0, 8):
+    for _type_code in range(1, 8):
+        PIECE_KEYS[_side_bit | _type_code] = tuple(_rng.getrandbits(64) for _ in range(NUM_SQUARES))
+
+SIDE_TO_MOVE_KEY = _rng.getrandbits(64)
+
+del _rng
+
+
+def compute_hash(board) -> int:
+    """Compute the key of `board` from scratch (used on setup and for debugging)."""
+    key = 0
+    for r in range(BOARD_ROWS):
+        for c in range(BOARD_COLS):
+            p = board.grid[r][c]
+            if p is not None:
+                key ^= PIECE_KEYS[p.code][r * BOARD_COLS + c]
+    if board.side_to_move == Side.BLACK:
+        key ^= SIDE_TO_MOVE_KEY
+    return key
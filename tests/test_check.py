@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from config import BOARD_COLS, BOARD_ROWS
+from core.engine.bitboard import BitboardBoard
+from core.engine.board import Board
+from core.engine.types import PieceType, Side
+
+
+def _scan_attacked(board, col, row, by_side):
+    """The old check test: any move of a `by_side` piece, or the facing general, reaches (col, row)."""
+    for r in range(BOARD_ROWS):
+        for c in range(BOARD_COLS):
+            p = board.get_piece(c, r)
+            if p is None or p.side != by_side:
+                continue
+            if p.ptype == PieceType.GENERAL:
+                if c == col and all(board.get_piece(c, rr) is None
+                                    for rr in range(min(r, row) + 1, max(r, row))):
+                    return True
+                continue
+            if (col, row) in board.generate_moves_for_square(c, r):
+                return True
+    return False
+
+
+def _scan_in_check(board, side):
+    general = None
+    for r in range(BOARD_ROWS):
+        for c in range(BOARD_COLS):
+            p = board.get_piece(c, r)
+            if p is not None and p.side == side and p.ptype == PieceType.GENERAL:
+                general = (c, r)
+    if general is None:
+        return False
+    enemy = Side.BLACK if side is Side.RED else Side.RED
+    return _scan_attacked(board, general[0], general[1], enemy)
+
+
+@pytest.mark.parametrize("board_cls", [Board, BitboardBoard])
+@pytest.mark.parametrize("red_on_bottom", [True, False])
+def test_check_matches_board_scan(board_cls, red_on_bottom):
+    rng = random.Random(7)
+    positions = checks = 0
+    for _ in range(40):
+        board = board_cls(red_on_bottom=red_on_bottom)
+        side = Side.RED
+        for _ in range(rng.randrange(20, 120)):
+            moves = board.generate_packed_moves(side)
+            if not moves:
+                break
+            board.apply_packed_move(rng.choice(moves))
+            side = Side.BLACK if side is Side.RED else Side.RED
+            positions += 1
+            for who in (Side.RED, Side.BLACK):
+                expected = _scan_in_check(board, who)
+                checks += expected
+                assert board.is_in_check(who) == expected
+                general = board.find_general(who)
+                enemy = Side.BLACK if who is Side.RED else Side.RED
+                assert board.is_square_attacked(general[0], general[1], enemy) == expected
+    # The playouts must actually reach checks for the comparison to mean anything.
+    assert checks > 0 and positions > 1000
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from core.engine.bitboard import BitboardBoard
+from core.engine.board import Board
+from core.engine.evaluation import evaluate_board, evaluate_board_full
+from core.engine.types import Move, Side
+
+
+@pytest.mark.parametrize("board_cls", [Board, BitboardBoard])
+@pytest.mark.parametrize("red_on_bottom", [True, False])
+def test_incremental_score_matches_full_evaluation(board_cls, red_on_bottom):
+    rng = random.Random(6)
+    for _ in range(20):
+        board = board_cls(red_on_bottom=red_on_bottom)
+        side = Side.RED
+        played = []
+        for _ in range(rng.randrange(10, 80)):
+            moves = board.generate_packed_moves(side)
+            if not moves:
+                break
+            if played and rng.random() < 0.2:
+                # Take a move back now and then, so unmake is covered mid-game too.
+                board.undo_packed_move(played.pop())
+                side = Side.BLACK if side is Side.RED else Side.RED
+            else:
+                move = rng.choice(moves)
+                board.apply_packed_move(move)
+                played.append(move)
+                side = Side.BLACK if side is Side.RED else Side.RED
+            assert board.pst_score == evaluate_board_full(board, Side.RED)
+            assert evaluate_board(board, Side.BLACK) == evaluate_board_full(board, Side.BLACK)
+        while played:
+            board.undo_packed_move(played.pop())
+            assert board.pst_score == evaluate_board_full(board, Side.RED)
+        assert board.pst_score == board_cls(red_on_bottom=red_on_bottom).pst_score
+
+
+@pytest.mark.parametrize("board_cls", [Board, BitboardBoard])
+def test_move_objects_keep_score(board_cls):
+    rng = random.Random(60)
+    board = board_cls()
+    side = Side.RED
+    history = []
+    for _ in range(60):
+        moves = board.generate_packed_moves(side)
+        if not moves:
+            break
+        move = Move.from_packed(rng.choice(moves))
+        board.move_piece(move)
+        history.append(move)
+        side = Side.BLACK if side is Side.RED else Side.RED
+        assert board.pst_score == evaluate_board_full(board, Side.RED)
+    for move in reversed(history):
+        board.undo_move(move)
+        assert board.pst_score == evaluate_board_full(board, Side.RED)
@@ -0,0 +1,71 @@
+import pytest
+
+from core.engine.bitboard import BitboardBoard
+from core.engine.board import START_FEN, Board
+
+FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR b - - 0 7"
+# Lopsided, so turning the board round would show in the text.
+MIDGAME_FEN = "2bakab2/9/2n1c1n2/p3p1p1p/2p6/6P2/P1P1P3P/1CN1B1N2/4A4/R1BAK3R w - - 12 30"
+
+BOARDS = [Board, BitboardBoard]
+
+
+@pytest.mark.parametrize("board_cls", BOARDS)
+@pytest.mark.parametrize("red_on_bottom", [True, False])
+@pytest.mark.parametrize("fen", [START_FEN, FEN, MIDGAME_FEN])
+def test_round_trip(board_cls, red_on_bottom, fen):
+    assert board_cls.from_fen(fen, red_on_bottom).to_fen() == fen
+
+
+@pytest.mark.parametrize("board_cls", BOARDS)
+def test_flipped_board_gives_the_same_text(board_cls):
+    bottom = board_cls.from_fen(MIDGAME_FEN, red_on_bottom=True)
+    top = board_cls.from_fen(MIDGAME_FEN, red_on_bottom=False)
+    assert bottom.grid != top.grid
+    move = bottom.generate_packed_moves(bottom.side_to_move)[0]
+    bottom.apply_packed_move(move)
+    # The same move on the turned board: square sq becomes 89 - sq.
+    turned = (89 - (move & 0x7F), 89 - ((move >> 7) & 0x7F))
+    for top_move in top.generate_packed_moves(top.side_to_move):
+        if (top_move & 0x7F, (top_move >> 7) & 0x7F) == turned:
+            top.apply_packed_move(top_move)
+            break
+    assert bottom.to_fen() == top.to_fen() != MIDGAME_FEN
+
+
+@pytest.mark.parametrize("board_cls", BOARDS)
+@pytest.mark.parametrize("red_on_bottom", [True, False])
+def test_move_number_counts_from_the_loaded_fen(board_cls, red_on_bottom):
+    board = board_cls.from_fen(FEN, red_on_bottom)
+    numbers = []
+    for _ in range(4):
+        board.apply_packed_move(board.generate_packed_moves(board.side_to_move)[0])
+        numbers.append(int(board.to_fen().split()[5]))
+    # Black moved first, so every black move starts the next full move.
+    assert numbers == [8, 8, 9, 9]
+
+
+@pytest.mark.parametrize("board_cls", BOARDS)
+def test_halfmove_clock_counts_on_from_the_loaded_fen(board_cls):
+    board = board_cls.from_fen(MIDGAME_FEN)
+    quiet = [m for m in board.generate_packed_moves(board.side_to_move) if not m >> 18]
+    board.apply_packed_move(quiet[0])
+    assert board.to_fen().split()[4] == "13"
+    capture = [m for m in board.generate_packed_moves(board.side_to_move) if m >> 18]
+    board.apply_packed_move(capture[0])
+    assert board.to_fen().split()[4] == "0"
+
+
+@pytest.mark.parametrize("fen", [
+    FEN.replace(" 7", " 0"),
+    FEN.replace(" 0 7", " x 7"),
+    FEN.replace(" b ", " x "),
+    "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/RNBAKABNR w - - 0 1",
+    "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/8/RNBAKABNR w - - 0 1",
+    "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNRR w - - 0 1",
+    "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNX w - - 0 1",
+    "",
+])
+def test_malformed_fen_is_rejected(fen):
+    with pytest.raises(ValueError):
+        Board.from_fen(fen)
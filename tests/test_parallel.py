@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from core.engine.ai_engine import choose_ai_move, search_counters, shutdown_root_pool
+from core.engine.bitboard import BitboardBoard
+from core.engine.transposition import TranspositionTable
+from core.engine.types import Side
+
+
+def _middlegame(seed):
+    rnd = random.Random(seed)
+    while True:
+        board = BitboardBoard()
+        side = Side.RED
+        for _ in range(rnd.randint(10, 30)):
+            moves = board.generate_packed_moves(side)
+            if not moves:
+                break
+            board.apply_packed_move(rnd.choice(moves))
+            side = Side.BLACK if side is Side.RED else Side.RED
+        else:
+            return board, side
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _pool():
+    yield
+    shutdown_root_pool()
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_split_search_result_does_not_depend_on_worker_count(seed):
+    results = []
+    for workers in (1, 2, 3):
+        board, side = _middlegame(seed)
+        level_cfg = {"depth": 3, "randomness": 0.0, "eval_noise": 0, "quiescence": True,
+                     "null_move": True, "lmr": True, "workers": workers}
+        move = choose_ai_move(board, level_cfg, side, tt=TranspositionTable(1))
+        results.append((move.from_pos, move.to_pos, search_counters.score,
+                        [(m.from_pos, m.to_pos) for m in search_counters.pv]))
+    assert results[1] == results[0]
+    assert results[2] == results[0]
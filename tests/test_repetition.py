@@ -0,0 +1,58 @@
+import pytest
+
+from core.engine.ai_engine import SearchContext, TranspositionTable, _is_repetition, negamax_search
+from core.engine.bitboard import BitboardBoard
+from core.engine.board import Board
+from core.engine.opening_book import parse_iccs
+from core.engine.types import Side
+
+# Both horses out and back: the start position again, four plies later.
+SHUFFLE = ["h0g2", "h9g7", "g2h0", "g7h9"]
+
+
+def _play(board, side, token):
+    (from_col, from_row), (to_col, to_row) = parse_iccs(token)
+    from_sq, to_sq = from_row * 9 + from_col, to_row * 9 + to_col
+    for move in board.generate_packed_moves(side):
+        if move & 0x7F == from_sq and (move >> 7) & 0x7F == to_sq:
+            board.apply_packed_move(move)
+            return Side.BLACK if side is Side.RED else Side.RED
+    raise AssertionError(f"{token} is not legal")
+
+
+@pytest.mark.parametrize("board_cls", [Board, BitboardBoard])
+def test_game_repeat_is_not_a_draw_below_the_limit(board_cls):
+    board = board_cls()
+    side = Side.RED
+    for token in SHUFFLE:
+        side = _play(board, side, token)
+    assert board.repetition_count() == 2
+
+    ctx = SearchContext()
+    # Searching from here, the earlier occurrence is game history only.
+    ctx.root_index = len(board.position_history) - 1
+    assert not _is_repetition(board, ctx)
+    # On the searched line, the same repeat ends it.
+    ctx.root_index = 0
+    assert _is_repetition(board, ctx)
+
+    for token in SHUFFLE:
+        side = _play(board, side, token)
+    ctx.root_index = len(board.position_history) - 1
+    assert board.repetition_count() == 3
+    assert _is_repetition(board, ctx)
+
+
+@pytest.mark.parametrize("board_cls", [Board, BitboardBoard])
+def test_repetition_scores_are_not_stored(board_cls):
+    board = board_cls()
+    side = Side.RED
+    for token in SHUFFLE[:3]:
+        side = _play(board, side, token)
+    tt = TranspositionTable(1)
+    ctx = SearchContext(tt=tt)
+    ctx.root_index = 0
+    # Black to move can repeat the start position: the root scores a repetition.
+    negamax_search(board, 2, side, -100000, 100000, ctx)
+    assert ctx.repetitions > 0
+    assert tt.probe(board.zobrist_key) is None
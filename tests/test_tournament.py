@@ -0,0 +1,22 @@
+import json
+
+import pytest
+
+from core.engine.ai_engine import AI_LEVELS
+from core.engine.tournament import write_elo
+
+
+def test_write_elo_stores_rising_ratings(tmp_path):
+    path = tmp_path / "ai_elo.json"
+    ratings = [800 + 150 * level for level in range(len(AI_LEVELS))]
+    write_elo(ratings, str(path))
+    assert json.loads(path.read_text()) == {str(level): r for level, r in enumerate(ratings, 1)}
+
+
+def test_write_elo_refuses_ratings_that_do_not_rise(tmp_path):
+    path = tmp_path / "ai_elo.json"
+    ratings = [800 + 150 * level for level in range(len(AI_LEVELS))]
+    ratings[-1] = ratings[-2]
+    with pytest.raises(ValueError):
+        write_elo(ratings, str(path))
+    assert not path.exists()
@@ -0,0 +1,136 @@
+"""Opt-in profiler for the frames of the desktop game loop.
+
+The loop calls `begin_frame` once per frame, `lap(name)` at the end of
+each part of the frame (event handling, board, side panel, log box,
+modals, present, ...) and `end_frame` when the frame is on screen. A lap
+is charged the time since the previous one; laps of the same name in one
+frame add up. For each section the profiler keeps the last `window`
+frames that ran it, for rolling p50/p95/p99, and the timings of the last
+`trace_frames` frames for `write_chrome_trace`, a file that
+chrome://tracing and Perfetto open.
+
+It starts switched off, unless the environment variable
+``XIANGQI_PROFILE`` is ``1`` (`from_env`); ``XIANGQI_PROFILE_TRACE``
+names the trace file. While off, every call returns after one attribute
+test. This module does not import pygame.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import deque
+
+PROFILE_ENV = "XIANGQI_PROFILE"
+TRACE_PATH_ENV = "XIANGQI_PROFILE_TRACE"
+DEFAULT_TRACE_PATH = "frame_trace.json"
+# Frames kept per section for the percentiles (about 5 s at 60 FPS).
+DEFAULT_WINDOW = 300
+# Frames kept for the Chrome trace (about 20 s at 60 FPS).
+DEFAULT_TRACE_FRAMES = 1200
+FRAME = "frame"
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank `p`-th percentile of an ascending, non-empty sequence."""
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class FrameProfiler:
+    """Section timings of the frames of one loop; see the module docstring."""
+
+    def __init__(self, enabled: bool = False, window: int = DEFAULT_WINDOW,
+                 trace_frames: int = DEFAULT_TRACE_FRAMES, trace_path: str = DEFAULT_TRACE_PATH,
+                 clock=time.perf_counter):
+        self.enabled = enabled
+        self.window = window
+        self.trace_path = trace_path
+        self._clock = clock
+        self._origin = clock()
+        # name -> recent per-frame milliseconds, in the order sections first ran
+        self._samples = {}
+        # per frame: [(name, start, seconds), ...], the whole frame first
+        self._trace = deque(maxlen=trace_frames)
+        # Start of the running lap, None outside a frame or while switched off.
+        self._last = None
+        self._frame_start = None
+        self._laps = []
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> "FrameProfiler":
+        return cls(enabled=environ.get(PROFILE_ENV) == "1",
+                   trace_path=environ.get(TRACE_PATH_ENV) or DEFAULT_TRACE_PATH)
+
+    def toggle(self) -> bool:
+        """Switch on or off (from the next frame on); return the new state."""
+        self.enabled = not self.enabled
+        self._last = None
+        return self.enabled
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self._frame_start = self._last = self._clock()
+        self._laps = []
+
+    def lap(self, name: str):
+        """Charge the time since the previous lap (or the frame start) to section `name`."""
+        if self._last is None:
+            return
+        now = self._clock()
+        self._laps.append((name, self._last, now - self._last))
+        self._last = now
+
+    def end_frame(self):
+        if self._last is None:
+            return
+        now = self._clock()
+        start = self._frame_start
+        self._last = None
+        totals = {FRAME: now - start}
+        for name, _, seconds in self._laps:
+            totals[name] = totals.get(name, 0.0) + seconds
+        for name, seconds in totals.items():
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds * 1000.0)
+        self._trace.append([(FRAME, start, now - start)] + self._laps)
+
+    def percentiles(self, name: str):
+        """``(p50, p95, p99)`` in milliseconds of section `name`, or None if it never ran."""
+        samples = self._samples.get(name)
+        if not samples:
+            return None
+        values = sorted(samples)
+        return percentile(values, 50), percentile(values, 95), percentile(values, 99)
+
+    def summary(self):
+        """``[(name, p50, p95, p99), ...]`` for the whole frame and then each section."""
+        return [(name,) + self.percentiles(name) for name in self._samples]
+
+    def reset(self):
+        """Forget every timing recorded so far."""
+        self._samples.clear()
+        self._trace.clear()
+
+    def write_chrome_trace(self, path: str = None) -> str:
+        """Write the kept frames in the Chrome trace event format; return the path written."""
+        path = path or self.trace_path
+        events = []
+        for frame in self._trace:
+            for name, start, seconds in frame:
+                events.append({
+                    "name": name,
+                    "cat": "frame" if name == FRAME else "section",
+                    "ph": "X",
+                    "ts": round((start - self._origin) * 1e6, 1),
+                    "dur": round(seconds * 1e6, 1),
+                    "pid": os.getpid(),
+                    "tid": 1,
+                })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
@@ -1,7 +1,6 @@
 import os
 import math
 import pygame
-import threading
 import time
 import random
 
@@ -33,8 +32,10 @@ from data.avatar_assets import (
     delete_avatar_file,
 )
 from core.profiles_manager import DEFAULT_ELO, load_profiles, save_profiles, find_player, apply_game_result_to_profiles
-from core.engine.constants import AI_SIDE, HUMAN_SIDE
-from core.engine.ai_engine import AI_LEVELS, choose_ai_move
+from core.engine.constants import AI_SIDE, HUMAN_SIDE, REPETITION_LIMIT
+from core.engine.ai_engine import AI_LEVELS
+from core.engine.ai_worker import AIWorker
+from ui.desktop.frame_profiler import FrameProfiler
 from core.ui_components import Button
 from core.engine.draw_helpers import (
     draw_board,
@@ -54,6 +55,11 @@ from core.engine.draw_helpers import (
 
 
 def run_game():
+    # Start the AI process first so its imports and warm-up overlap with
+    # pygame start-up instead of delaying the first AI move.
+    ai_worker = AIWorker()
+    ai_worker.start()
+
     pygame.init()
 
     settings = load_settings()
@@ -319,6 +325,8 @@ def run_game():
     recompute_render_scale()
 
     clock = pygame.time.Clock()
+    # Frame section timings: XIANGQI_PROFILE=1 or F5 to switch on, F6 to write a Chrome trace
+    profiler = FrameProfiler.from_env()
     def _normalize_lang(code: str) -> str:
         if not code:
             return "en"
@@ -466,11 +474,12 @@ def run_game():
     result_recorded = False
     replay_index = None
     paused = False 
-    # Async AI thinking state
+    # Async AI thinking state (the search itself runs in `ai_worker`)
     ai_thinking = False
-    ai_think_thread = None
-    # holder dict for thread -> main loop communication: {"done": bool, "move": (from_pos, to_pos) or None}
+    # {"done": bool, "move": (from_pos, to_pos) or None, "request": worker request id}
     ai_pending_move_holder = None
+    # Debug overlay with the statistics of the last AI search (toggled with F3)
+    show_search_stats = False
 
     # Log (replay/tabs)
     log_active_tab = "moves"   # Moves or Captured
@@ -1773,6 +1782,9 @@ def run_game():
         if red_on_bottom is None:
             red_on_bottom = board.red_on_bottom
         board.reset(red_on_bottom=red_on_bottom)
+        cancel_ai_search()
+        # Search results are reused across the moves of one game only.
+        ai_worker.new_game()
         human_side = Side.RED if board.red_on_bottom else Side.BLACK
         ai_side = Side.BLACK if board.red_on_bottom else Side.RED
         current_side = Side.RED
@@ -2012,6 +2024,24 @@ def run_game():
             register_result_if_needed(None, True)
             replay_index = len(move_history)
             return
+        # Repetition: perpetual check loses (Asian rules), anything else is a draw.
+        if not game_over and board.repetition_count() >= REPETITION_LIMIT:
+            checker = board.perpetual_checker()
+            game_over = True
+            in_check_side = None
+            selected = None
+            valid_moves = []
+            hovered_move = None
+            if checker is None:
+                winner = None
+                register_result_if_needed(None, True)
+            else:
+                winner_side = Side.RED if checker == Side.BLACK else Side.BLACK
+                winner = winner_side
+                start_loss_badge_animation(checker, last_move=move_history[-1] if move_history else None)
+                register_result_if_needed(winner_side, False)
+            replay_index = len(move_history)
+            return
         if board.is_in_check(current_side):
             in_check_side = current_side
             if not board.has_any_legal_move(current_side):
@@ -2030,6 +2060,7 @@ def run_game():
 
     def switch_to_menu():
         nonlocal state, selected, valid_moves, in_check_side, game_over, winner, result_recorded, ai_match_started, pvp_match_started, hovered_move, background_modal_open, side_panel_modal_open
+        cancel_ai_search()
         state = "menu"
         selected = None
         valid_moves = []
@@ -2105,17 +2136,30 @@ def run_game():
         if animate and getattr(settings, "piece_animation", True):
             start_move_animation(mv)
 
+    def cancel_ai_search():
+        # Drop the AI search in flight (resign, takeback, new game, back to menu).
+        nonlocal ai_thinking, ai_pending_move_holder
+        ai_worker.cancel()
+        ai_thinking = False
+        ai_pending_move_holder = None
+
     def ai_make_move():
-        # Non-blocking AI: start background thread to compute move on a board copy,
-        # then apply the resulting coordinates on the main thread when ready.
+        # Non-blocking AI: the worker process searches a serialized copy of the
+        # board; the resulting coordinates are applied here when ready.
         nonlocal current_side, move_history, redo_stack, game_over, winner
         nonlocal in_check_side, selected, valid_moves, hovered_move
         nonlocal log_follow_latest, human_side, ai_side
-        nonlocal ai_thinking, ai_think_thread, ai_pending_move_holder
+        nonlocal ai_thinking, ai_pending_move_holder
 
         if game_over or current_side != ai_side or not ai_match_started:
             return
 
+        if ai_pending_move_holder is not None and not ai_pending_move_holder.get("done"):
+            result = ai_worker.poll()
+            if result is not None and result[0] == ai_pending_move_holder["request"]:
+                ai_pending_move_holder["move"] = result[1]
+                ai_pending_move_holder["done"] = True
+
         # If a worker result is ready, consume it and apply the move
         if ai_pending_move_holder is not None and ai_pending_move_holder.get("done"):
             # If the worker finished but we haven't scheduled the visual delay yet,
@@ -2180,43 +2224,45 @@ def run_game():
         if ai_thinking:
             return
 
-        # Start background worker
+        # Start background search
         ai_thinking = True
-        ai_pending_move_holder = {"done": False, "move": None}
-
         level_cfg = AI_LEVELS[ai_level_index]
-
-        # create a lightweight deep copy of the board suitable for AI search
-        def _make_board_copy(src_board: Board) -> Board:
-            b = Board(red_on_bottom=src_board.red_on_bottom)
-            b.grid = [[None for _ in range(BOARD_COLS)] for _ in range(BOARD_ROWS)]
-            from core.engine.types import Piece as PieceCls
-            for rr in range(BOARD_ROWS):
-                for cc in range(BOARD_COLS):
-                    p = src_board.get_piece(cc, rr)
-                    if p is not None:
-                        b.grid[rr][cc] = PieceCls(p.side, p.ptype)
-            return b
-
-        def _worker(board_copy, level_cfg, side, holder):
-            try:
-                mv = choose_ai_move(board_copy, level_cfg, side)
-                if mv is None:
-                    holder["move"] = None
-                else:
-                    holder["move"] = (mv.from_pos, mv.to_pos)
-            except Exception:
-                holder["move"] = None
-            finally:
-                holder["done"] = True
-
-        board_copy = _make_board_copy(board)
-        ai_think_thread = threading.Thread(target=_worker, args=(board_copy, level_cfg, ai_side, ai_pending_move_holder), daemon=True)
-        ai_think_thread.start()
+        request_id = ai_worker.request_move(board, level_cfg, ai_side, stats=show_search_stats)
+        ai_pending_move_holder = {"done": False, "move": None, "request": request_id}
+
+    profiler_font = None
+    profiler_lines = []
+    profiler_lines_at = 0.0
+    profiler_note = ""
+
+    def draw_profiler_overlay(surface):
+        # p50/p95/p99 per frame section in the window's top-left corner; the
+        # text is re-rendered twice a second to keep the overlay itself cheap.
+        nonlocal profiler_font, profiler_lines, profiler_lines_at
+        now = time.time()
+        if now - profiler_lines_at >= 0.5:
+            if profiler_font is None:
+                profiler_font = pygame.font.SysFont("Consolas", 14)
+            rows = [f"{'section':<14}{'p50':>7}{'p95':>7}{'p99':>7} ms"]
+            for name, p50, p95, p99 in profiler.summary():
+                rows.append(f"{name:<14}{p50:7.2f}{p95:7.2f}{p99:7.2f}")
+            rows.append("F5 off, F6 trace" + (f" -> {profiler_note}" if profiler_note else ""))
+            profiler_lines = [profiler_font.render(row, True, (200, 255, 200)) for row in rows]
+            profiler_lines_at = now
+        if not profiler_lines:
+            return
+        line_h = profiler_lines[0].get_height()
+        width = max(line.get_width() for line in profiler_lines) + 12
+        back = pygame.Surface((width, line_h * len(profiler_lines) + 8), pygame.SRCALPHA)
+        back.fill((20, 20, 20, 200))
+        surface.blit(back, (4, 4))
+        for i, line in enumerate(profiler_lines):
+            surface.blit(line, (10, 8 + i * line_h))
 
     running = True
     while running:
         dt = clock.tick(60) / 1000.0
+        profiler.begin_frame()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -2249,6 +2295,18 @@ def run_game():
                                 state = settings_return_state
                         elif state in ("pvp", "ai"):
                             paused = not paused
+                elif event.key == pygame.K_F3:
+                    show_search_stats = not show_search_stats
+                elif event.key == pygame.K_F5:
+                    if profiler.toggle():
+                        profiler.reset()
+                    profiler_lines_at = 0.0
+                elif event.key == pygame.K_F6 and profiler.enabled:
+                    try:
+                        profiler_note = profiler.write_chrome_trace()
+                    except OSError as exc:
+                        profiler_note = str(exc)
+                    profiler_lines_at = 0.0
             elif event.type == pygame.VIDEORESIZE and settings.display_mode == "window":
                 # Avoid recreating the window surface on every resize step to reduce flicker.
                 window_mode_size = (event.w, event.h)
@@ -2836,6 +2894,7 @@ def run_game():
                         if match_pending:
                             continue
                         if move_history:
+                            cancel_ai_search()
                             steps = min(2, len(move_history))
                             for _ in range(steps):
                                 last_move = move_history.pop()
@@ -2851,6 +2910,7 @@ def run_game():
                         if match_pending:
                             continue
                         if not game_over:
+                            cancel_ai_search()
                             game_over = True
                             winner_side = Side.RED if current_side == Side.BLACK else Side.BLACK
                             winner = winner_side
@@ -2918,6 +2978,8 @@ def run_game():
                                     valid_moves = []
                                     hovered_move = None
 
+        profiler.lap("events")
+
         if state == "ai" and ai_match_started and not game_over and not paused and current_side == ai_side:
             ai_make_move()
 
@@ -2930,6 +2992,8 @@ def run_game():
                     time_remaining[current_side] = 0
                     handle_timeout(current_side)
 
+        profiler.lap("update")
+
         lang = settings.language
         lang_text = TEXT[lang]
 
@@ -2943,6 +3007,7 @@ def run_game():
             draw_background_layer(screen, dim_alpha=110)
         else:
             screen.fill((40, 40, 60))
+        profiler.lap("background")
 
         # MENU SCREEN
         if state == "menu":
@@ -3002,6 +3067,7 @@ def run_game():
             btn_menu_settings.draw(screen, font_button, enabled=True)
             btn_menu_credits.draw(screen, font_button, enabled=True)
             btn_menu_exit.draw(screen, font_button, enabled=True)
+            profiler.lap("menu")
 
         elif state == "credits":
             panel_rect = pygame.Rect(center_x - 230, start_y - 80, 500, 400)
@@ -3029,6 +3095,7 @@ def run_game():
             btn_credits_back.rect.center = (panel_rect.centerx, panel_rect.bottom - 40)
             btn_credits_back.label = lang_text["btn_back"]
             btn_credits_back.draw(screen, font_button, enabled=True)
+            profiler.lap("credits")
 
         elif state in ("pvp", "ai"):
             board_area = pygame.Rect(MARGIN_X - 16, board_top - 16, (BOARD_COLS - 1) * CELL_SIZE + 32, (BOARD_ROWS - 1) * CELL_SIZE + 32)
@@ -3057,6 +3124,7 @@ def run_game():
                 pygame.draw.rect(panel_surf, (245, 245, 245, 215), panel_surf.get_rect(), border_radius=10)
             screen.blit(panel_surf, panel_rect.topleft)
             pygame.draw.rect(screen, (50, 50, 50), panel_rect, 2, border_radius=10)
+            profiler.lap("side panel")
 
             start_btn_margin = 12
             start_btn_center = (panel_rect.centerx + START_BUTTON_OFFSET_X, panel_rect.top - start_btn_margin)
@@ -3253,6 +3321,7 @@ def run_game():
                     sx, sy = board_to_screen(*slash_anim_pos)
                     dest_pos = (sx - full_w // 2, sy - full_h // 2)
                     screen.blit(img, dest_pos, area=src_rect)
+            profiler.lap("board")
 
             # removed mode and turn display per user request
             y_info = MARGIN_Y + 10
@@ -3434,6 +3503,8 @@ def run_game():
                 btn_replay_prev.draw(screen, font_button, enabled=enabled_prev)
                 btn_replay_next.draw(screen, font_button, enabled=enabled_next)
 
+            profiler.lap("side panel")
+
             # Make the log box expand vertically up to near the in-game settings button
             log_top = panel_log_top + 30
             try:
@@ -3669,6 +3740,36 @@ def run_game():
                 # Duplicate character-based rendering removed; icons and counts are
                 # already drawn above in two vertical columns without text labels.
 
+            # Debug overlay: statistics of the last AI search, over the bottom of the log box
+            if show_search_stats and state == "ai":
+                stats = ai_worker.last_stats
+                if stats:
+                    stat_lines = [
+                        f"AI {stats['source']}: depth {stats['depth']}, score {stats['score']}",
+                        f"nodes {stats['nodes']} + q {stats['qnodes']}",
+                        f"{stats['time_ms']:.0f} ms, {stats['nps']} nps",
+                        f"TT hits {stats['tt_hit_rate']:.1%} of {stats['tt_probes']}",
+                        f"1st-move cutoffs {stats['first_move_cutoff_rate']:.1%}",
+                        f"branching factor {stats['branching_factor']:.2f}",
+                    ]
+                    for it in stats["iterations"][-4:]:
+                        stat_lines.append(f"  d{it['depth']}: {it['nodes']} nodes, {it['time_ms']:.0f} ms")
+                else:
+                    stat_lines = ["AI search: no data yet"]
+                stat_line_h = font_button.get_linesize()
+                stats_h = min(log_box_rect.height, stat_line_h * len(stat_lines) + 12)
+                stats_rect = pygame.Rect(log_box_rect.x, log_box_rect.bottom - stats_h, log_box_rect.width, stats_h)
+                stats_surf = pygame.Surface(stats_rect.size, pygame.SRCALPHA)
+                stats_surf.fill((20, 20, 20, 210))
+                screen.blit(stats_surf, stats_rect.topleft)
+                y_stat = stats_rect.y + 6
+                for line in stat_lines:
+                    if y_stat + stat_line_h > stats_rect.bottom:
+                        break
+                    screen.blit(font_button.render(line, True, (200, 255, 200)), (stats_rect.x + 8, y_stat))
+                    y_stat += stat_line_h
+            profiler.lap("log box")
+
 
             btn_in_game_settings.label = lang_text["btn_settings_in_game"]
             btn_takeback.label = lang_text["btn_takeback"]
@@ -3683,6 +3784,7 @@ def run_game():
             if game_over and move_history:
                 btn_replay_prev.draw(screen, font_button, enabled=enabled_prev)
                 btn_replay_next.draw(screen, font_button, enabled=enabled_next)
+            profiler.lap("side panel")
         # SETTING MENU 
         elif state == "settings":
             settings_panel_rect = get_settings_panel_rect()
@@ -4039,6 +4141,7 @@ def run_game():
                 btn_settings_back.label = t(settings, "btn_back")
                 btn_settings_back.rect.center = (settings_center_x, WINDOW_HEIGHT - 70)
                 btn_settings_back.draw(screen, font_button, enabled=True)
+            profiler.lap("settings")
         # Background modal rendering
         if background_modal_open and BACKGROUNDS:
             overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
@@ -4422,6 +4525,7 @@ def run_game():
         else:
             # reset animation when not paused
             pause_anim_start = None
+        profiler.lap("modals")
 
         bg_frame = load_background_surface((logical_width, base_height))
         fill_color = (0, 0, 0)
@@ -4458,8 +4562,20 @@ def run_game():
             window_surface.fill(fill_color)
         scaled_surface = pygame.transform.smoothscale(frame_surface, render_size)
         window_surface.blit(scaled_surface, render_offset)
+        profiler.lap("present")
+        if profiler.enabled:
+            draw_profiler_overlay(window_surface)
+            profiler.lap("overlay")
         pygame.display.flip()
+        profiler.lap("flip")
+        profiler.end_frame()
 
+    if profiler.enabled:
+        try:
+            profiler.write_chrome_trace()
+        except OSError:
+            pass
+    ai_worker.shutdown()
     save_settings(settings)
     save_profiles(profiles_data)
     pygame.quit()